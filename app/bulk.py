@@ -0,0 +1,260 @@
+"""
+Offline bulk scoring of prompt pairs, without going through the HTTP API.
+
+Pairs are streamed from a JSONL file (one `{"prompt1": ..., "prompt2": ...}` object per line) or a CSV file with
+`prompt1` and `prompt2` columns, sanitized, scored in chunks by a pool of processes that each load the services once,
+and appended in input order to a JSONL output file. Other input fields are copied to the output.
+
+After each written chunk, a checkpoint next to the output records how far the input was consumed, so that an
+interrupted run continues where it stopped with `--resume`:
+
+    python -m app.bulk pairs.jsonl scores.jsonl --metric semantic --workers 4
+    python -m app.bulk pairs.csv scores.jsonl --metric cosine --resume
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import BinaryIO, Iterator, Optional
+
+from app.models import SimilarityMetric
+from app.services.executors import ThreadLayout
+from app.services.sanitization_service import TextSanitizationService
+from app.services.similarity_service import TextSimilarityService
+from app.services.tfidf_model import load_tfidf_model
+from app.utils.config import settings
+
+# Services of a pool process, created once by `_init_worker`
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_sanitization_service: Optional[TextSanitizationService] = None
+_similarity_service: Optional[TextSimilarityService] = None
+_metric: Optional[SimilarityMetric] = None
+
+
+def read_records(path: str, input_format: str, offset: int = 0) -> Iterator[tuple[dict, int]]:
+    """
+    Stream the records of an input file.
+    :param path: JSONL or CSV file
+    :param input_format: `jsonl` or `csv`
+    :param offset: Byte offset to start reading from, at a record boundary (from a checkpoint)
+    :return: Iterator of (record, byte offset right after the record), malformed JSONL lines giving records with an
+        `error` and their `line` number
+    """
+    with open(path, "rb") as file:
+        def lines() -> Iterator[str]:
+            # Lines are read one at a time so that `file.tell()` is the end of the record being parsed
+            for line in iter(file.readline, b""):
+                yield line.decode("utf-8")
+
+        if input_format == "jsonl":
+            for line_number, line in enumerate(iter(file.readline, b""), start=_line_number(file, offset)):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    if not isinstance(record, dict):
+                        raise ValueError("not a JSON object")
+                except ValueError as e:
+                    # A malformed line gets an error record instead of stopping the run
+                    print(f"Malformed record on line {line_number} of {path}: {e}", flush=True)
+                    record = {"line": line_number, "error": f"Malformed record: {e}"}
+                yield record, file.tell()
+            return
+
+        header = next(csv.reader([file.readline().decode("utf-8")]))
+        if offset:
+            file.seek(offset)
+        for row in csv.reader(lines()):
+            if row:
+                yield dict(zip(header, row)), file.tell()
+
+
+def _line_number(file: BinaryIO, offset: int) -> int:
+    """Number of the line starting at a byte offset, leaving the file positioned at the offset."""
+    file.seek(0)
+    newlines = 0
+    while file.tell() < offset:
+        block = file.read(min(offset - file.tell(), 1024 * 1024))
+        if not block:
+            break
+        newlines += block.count(b"\n")
+    file.seek(offset)
+    return newlines + 1
+
+
+def _init_worker(metric: str, workers: int):
+    """Create the services of a pool process, loading the models once, with threads sized for `workers` processes."""
+    global _loop, _sanitization_service, _similarity_service, _metric
+    _loop = asyncio.new_event_loop()
+    _metric = SimilarityMetric(metric)
+    _sanitization_service = TextSanitizationService(memo_max_entries=settings.SANITIZATION_MEMO_MAX_ENTRIES)
+
+    thread_layout = ThreadLayout.from_settings(workers)
+    thread_layout.apply()
+    _similarity_service = TextSimilarityService(tfidf_model=load_tfidf_model(), thread_layout=thread_layout)
+    if _metric == SimilarityMetric.SEMANTIC:
+        _loop.run_until_complete(_similarity_service.model_manager.preload())
+
+
+def score_records(records: list[dict]) -> list[dict]:
+    """
+    Sanitize and score a chunk of records in a pool process.
+
+    Records missing a prompt get an `error` instead of a score. Prompts changed by sanitization are scored
+    sanitized, and flagged with `sanitized`.
+    """
+    prompts, positions, results = [], [], []
+    for record in records:
+        result = dict(record)
+        prompt1, prompt2 = record.get("prompt1"), record.get("prompt2")
+        if not isinstance(prompt1, str) or not isinstance(prompt2, str) or not prompt1.strip() or not prompt2.strip():
+            # Malformed input lines already carry their error
+            result.setdefault("error", "prompt1 and prompt2 must be non-empty strings")
+        else:
+            positions.append(len(results))
+            prompts += [prompt1.strip(), prompt2.strip()]
+        results.append(result)
+
+    # Prompts repeated within the chunk or across chunks, such as a query compared to many candidates, are
+    # sanitized once
+    sanitized = _sanitization_service.sanitize_many(prompts)
+    pairs = list(zip(sanitized[::2], sanitized[1::2]))
+    for position, prompt1, prompt2, (sanitized1, sanitized2) in zip(positions, prompts[::2], prompts[1::2], pairs):
+        results[position]["sanitized"] = sanitized1 != prompt1 or sanitized2 != prompt2
+
+    scores = _loop.run_until_complete(_similarity_service.calculate_similarity_batch(pairs, _metric)) if pairs else []
+    for position, score in zip(positions, scores):
+        results[position]["similarity_score"] = score
+    return results
+
+
+def _read_checkpoint(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {"input_offset": 0, "output_size": 0, "records": 0}
+
+
+def _write_checkpoint(path: str, checkpoint: dict):
+    """Replace the checkpoint atomically, so that a crash leaves either the previous or the new one."""
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        json.dump(checkpoint, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def _chunks(records: Iterator[tuple[dict, int]], chunk_size: int) -> Iterator[tuple[list[dict], int]]:
+    chunk, end_offset = [], 0
+    for record, end_offset in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield chunk, end_offset
+            chunk = []
+    if chunk:
+        yield chunk, end_offset
+
+
+def run(input_path: str, output_path: str, metric: SimilarityMetric, input_format: Optional[str] = None,
+        workers: int = 1, chunk_size: int = 1000, resume: bool = False, progress_interval: float = 10.0) -> int:
+    """
+    Score every pair of an input file into an output file.
+    :param input_path: JSONL or CSV file of prompt pairs
+    :param output_path: JSONL file of the scored records
+    :param metric: Similarity metric to use
+    :param input_format: `jsonl` or `csv`, from the input file extension if None
+    :param workers: Number of scoring processes
+    :param chunk_size: Number of records scored per task, and written between checkpoints
+    :param resume: Continue from the checkpoint of a previous run instead of starting over
+    :param progress_interval: Seconds between progress reports
+    :return: Total number of records in the output
+    """
+    input_format = input_format or ("csv" if input_path.lower().endswith(".csv") else "jsonl")
+    checkpoint_path = f"{output_path}.checkpoint"
+    checkpoint = _read_checkpoint(checkpoint_path) if resume else {"input_offset": 0, "output_size": 0, "records": 0}
+    if checkpoint["records"]:
+        print(f"Resuming after {checkpoint['records']} records (input offset {checkpoint['input_offset']})",
+              flush=True)
+
+    # Drop the records written after the last checkpoint, they are scored again
+    with open(output_path, "ab") as output:
+        output.truncate(checkpoint["output_size"])
+
+    started = last_report = time.monotonic()
+    scored = 0
+    records = read_records(input_path, input_format, checkpoint["input_offset"])
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(metric.value, workers)) as pool, \
+            open(output_path, "ab") as output:
+        # At most two chunks in flight per process, so that memory stays bounded whatever the input size
+        pending: deque[tuple[Future, int]] = deque()
+        chunks = _chunks(records, chunk_size)
+        while True:
+            for chunk, end_offset in chunks:
+                pending.append((pool.submit(score_records, chunk), end_offset))
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                break
+
+            future, end_offset = pending.popleft()
+            results = future.result()
+            buffer = io.StringIO()
+            for result in results:
+                buffer.write(json.dumps(result, ensure_ascii=False))
+                buffer.write("\n")
+            output.write(buffer.getvalue().encode("utf-8"))
+            output.flush()
+            os.fsync(output.fileno())
+
+            scored += len(results)
+            checkpoint = {
+                "input_offset": end_offset,
+                "output_size": output.tell(),
+                "records": checkpoint["records"] + len(results)
+            }
+            _write_checkpoint(checkpoint_path, checkpoint)
+
+            now = time.monotonic()
+            if now - last_report >= progress_interval:
+                last_report = now
+                print(f"Scored {checkpoint['records']} records ({scored / (now - started):.0f} records/s)", flush=True)
+
+    elapsed = time.monotonic() - started
+    print(f"Done: {scored} records scored in {elapsed:.1f} s ({scored / max(elapsed, 1e-9):.0f} records/s), "
+          f"{checkpoint['records']} records in {output_path}")
+    return checkpoint["records"]
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL or CSV file of prompt pairs")
+    parser.add_argument("output", help="JSONL file of the scored records")
+    parser.add_argument("--metric", choices=[metric.value for metric in SimilarityMetric
+                                             if metric != SimilarityMetric.CASCADE],
+                        default=SimilarityMetric.COSINE.value, help="Similarity metric to use")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None,
+                        help="Input format (from the file extension if unset)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of scoring processes")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Number of records per scoring task")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint of a previous run")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress reports")
+    args = parser.parse_args(argv)
+
+    try:
+        run(args.input, args.output, SimilarityMetric(args.metric), input_format=args.format, workers=args.workers,
+            chunk_size=args.chunk_size, resume=args.resume, progress_interval=args.progress_interval)
+    except KeyboardInterrupt:
+        print("Interrupted, continue with --resume")
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
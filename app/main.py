@@ -1,14 +1,32 @@
+import asyncio
+import json
+import os
 from contextlib import asynccontextmanager
+from functools import partial
+from typing import Optional
 
+import numpy as np
 from fastapi import FastAPI, HTTPException, Depends
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 
-from app.models import SimilarityResponse, SimilarityRequest, HealthResponse, SimilarityMetric
+from app.models import SimilarityResponse, SimilarityRequest, HealthResponse, SimilarityMetric, BatchSimilarityRequest, \
+    BatchSimilarityResponse, BatchSimilarityResult, CorpusDocumentsRequest, CorpusDocumentsResponse, SearchRequest, \
+    SearchResponse, SearchResult, DeduplicationRequest, DeduplicationResponse, SimilarityMatrixRequest, \
+    SimilarityMatrixFormat, LLMResponseSource, JobResponse, ReadinessResponse, ModelState
+from app.services.cache_backends import RedisCacheBackend
 from app.services.cache_service import CacheService
-from app.services.llm_service import LLMService
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.executors import ExecutorBusy, ThreadLayout
+from app.services.job_queue import LLMJobQueue
+from app.services.llm_service import LLMService, LLMStreamInterrupted
+from app.services.minhash_service import find_near_duplicates
 from app.services.sanitization_service import TextSanitizationService
+from app.services.search_service import CorpusSearchService
+from app.services.semantic_cache import SemanticResponseCache
 from app.services.similarity_service import TextSimilarityService
+from app.services.tfidf_model import load_tfidf_model
 from app.utils.config import settings
 
 # Global service instances
@@ -16,26 +34,109 @@ cache_service = None
 llm_service = None
 sanitization_service = None
 similarity_service = None
+search_service = None
+semantic_cache = None
+job_queue = None
+# Whether the services were preloaded by `preload_services`, in a pre-fork master process
+preloaded = False
+
+
+def preload_services(workers: int = settings.WEB_CONCURRENCY):
+    """
+    Create the services holding large read-only state, the sanitization engine, the TF-IDF model and the semantic
+    model, ahead of the lifespan. A pre-fork master process preloads them once, and its forked workers share them
+    copy-on-write instead of each loading its own copy. The semantic model is loaded but not warmed up: the workers
+    warm it up, as running it before forking is not fork-safe.
+    :param workers: Number of worker processes sharing the cores, which sizes the threads of each worker
+    """
+    global sanitization_service, similarity_service, preloaded
+
+    sanitization_service = TextSanitizationService(memo_max_entries=settings.SANITIZATION_MEMO_MAX_ENTRIES)
+    similarity_service = TextSimilarityService(
+        tfidf_model=load_tfidf_model(), thread_layout=ThreadLayout.from_settings(workers))
+    asyncio.run(similarity_service.model_manager.preload(warm_up=False))
+    preloaded = True
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize services on startup and cleanup on shutdown."""
-    global cache_service, llm_service, sanitization_service, similarity_service
+    global cache_service, llm_service, sanitization_service, similarity_service, search_service, semantic_cache, \
+        job_queue
 
     print("Starting up text similarity service...")
 
     # Initialize services
-    cache_service = CacheService()
+    cache_backend = RedisCacheBackend.from_url(
+        settings.CACHE_REDIS_URL,
+        socket_timeout=settings.CACHE_REDIS_SOCKET_TIMEOUT,
+        ttl_seconds=settings.CACHE_REDIS_TTL_SECONDS or None,
+        retry_after_seconds=settings.CACHE_REDIS_RETRY_AFTER_SECONDS
+    ) if settings.CACHE_REDIS_URL else None
+    cache_service = CacheService(
+        max_entries=settings.CACHE_MAX_ENTRIES,
+        max_bytes=settings.CACHE_MAX_BYTES or None,
+        ttl_seconds=settings.CACHE_TTL_SECONDS or None,
+        backend=cache_backend
+    )
+    if settings.CACHE_SNAPSHOT_PATH and os.path.exists(settings.CACHE_SNAPSHOT_PATH):
+        try:
+            count = cache_service.load_snapshot(settings.CACHE_SNAPSHOT_PATH)
+            print(f"Loaded {count} cached similarities from {settings.CACHE_SNAPSHOT_PATH}")
+        except Exception as e:
+            print(f"Failed to load cache snapshot: {e}")
     llm_service = LLMService(
         base_url=settings.LLM_BASE_URL,
         model=settings.LLM_MODEL,
         timeout=settings.LLM_TIMEOUT,
         max_retries=settings.LLM_MAX_RETRIES,
-        temperature=settings.LLM_TEMPERATURE
+        temperature=settings.LLM_TEMPERATURE,
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        max_concurrent_generations=settings.LLM_MAX_CONCURRENT_GENERATIONS,
+        response_cache_entries=settings.LLM_RESPONSE_CACHE_MAX_ENTRIES,
+        response_cache_ttl_seconds=settings.LLM_RESPONSE_CACHE_TTL_SECONDS or None,
+        circuit_breaker=CircuitBreaker(
+            failure_rate=settings.LLM_CIRCUIT_FAILURE_RATE,
+            minimum_calls=settings.LLM_CIRCUIT_MINIMUM_CALLS,
+            window=settings.LLM_CIRCUIT_WINDOW,
+            open_seconds=settings.LLM_CIRCUIT_OPEN_SECONDS
+        ),
+        probe_interval_seconds=settings.LLM_PROBE_INTERVAL_SECONDS
+    )
+    await llm_service.start()
+    if preloaded:
+        # Services shared with the other workers of a pre-fork master process, with a cache of this worker
+        similarity_service.cache_service = cache_service
+    else:
+        sanitization_service = TextSanitizationService(memo_max_entries=settings.SANITIZATION_MEMO_MAX_ENTRIES)
+        similarity_service = TextSimilarityService(cache_service, load_tfidf_model())
+    # Threads of this worker, so that the workers together do not run more threads than there are cores
+    similarity_service.thread_layout.apply()
+    search_service = CorpusSearchService(
+        similarity_service,
+        block_size=settings.SEARCH_BLOCK_SIZE,
+        ivf_n_lists=settings.SEARCH_IVF_N_LISTS or None,
+        ivf_n_probe=settings.SEARCH_IVF_N_PROBE,
+        lsh_threshold=settings.MINHASH_LSH_THRESHOLD
+    )
+    semantic_cache = SemanticResponseCache(
+        similarity_service,
+        threshold=settings.LLM_SEMANTIC_CACHE_THRESHOLD,
+        max_entries=settings.LLM_SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.LLM_RESPONSE_CACHE_TTL_SECONDS or None
+    ) if settings.LLM_SEMANTIC_CACHE_MAX_ENTRIES else None
+    job_queue = LLMJobQueue(
+        workers=settings.LLM_JOB_WORKERS,
+        max_size=settings.LLM_JOB_QUEUE_MAX_SIZE,
+        result_ttl_seconds=settings.LLM_JOB_RESULT_TTL_SECONDS
     )
-    sanitization_service = TextSanitizationService()
-    similarity_service = TextSimilarityService(cache_service)
+    await job_queue.start()
+
+    # Load the semantic model before accepting traffic, rather than on the first request
+    if settings.SEMANTIC_MODEL_PRELOAD:
+        await similarity_service.model_manager.preload()
 
     # Check LLM availability
     _ = await llm_service.is_available()
@@ -46,6 +147,17 @@ async def lifespan(app: FastAPI):
 
     print("Shutting down text similarity service...")
 
+    if settings.CACHE_SNAPSHOT_PATH:
+        try:
+            count = cache_service.save_snapshot(settings.CACHE_SNAPSHOT_PATH)
+            print(f"Saved {count} cached similarities to {settings.CACHE_SNAPSHOT_PATH}")
+        except Exception as e:
+            print(f"Failed to save cache snapshot: {e}")
+    await job_queue.close()
+    similarity_service.close()
+    cache_service.close()
+    await llm_service.close()
+
 
 # Create FastAPI app
 app = FastAPI(
@@ -75,21 +187,44 @@ def get_sanitization_service() -> TextSanitizationService:
     return sanitization_service
 
 
+def get_search_service() -> CorpusSearchService:
+    if search_service is None:
+        raise HTTPException(status_code=503, detail="Search service not initialized")
+    return search_service
+
+
 def get_llm_service() -> LLMService:
     if llm_service is None:
         raise HTTPException(status_code=503, detail="LLM service not initialized")
     return llm_service
 
 
+def get_job_queue() -> LLMJobQueue:
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="LLM job queue not initialized")
+    return job_queue
+
+
+def get_optional_job_queue() -> Optional[LLMJobQueue]:
+    # Optional: None until started, for endpoints only needing it for some requests
+    return job_queue
+
+
+def get_semantic_cache() -> Optional[SemanticResponseCache]:
+    # Optional: None when disabled
+    return semantic_cache
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check(
         llm_svc: LLMService = Depends(get_llm_service)
 ) -> HealthResponse:
-    """Health check endpoint."""
+    """Health check endpoint, answered from the last background probe of the LLM."""
     is_llm_available = await llm_svc.is_available()
     return HealthResponse(
         environment=settings.ENVIRONMENT,
         is_llm_available=is_llm_available,
+        llm_circuit_state=llm_svc.circuit_state,
         llm_model=settings.LLM_MODEL,
         service=settings.SERVICE_NAME,
         status="healthy",
@@ -97,6 +232,20 @@ async def health_check(
     )
 
 
+@app.get("/ready", response_model=ReadinessResponse)
+async def readiness_check():
+    """
+    Readiness check endpoint: ready once the services are initialized and, when preloaded, the semantic model is
+    loaded and warmed up. Not ready answers 503, so that load balancers keep traffic away.
+    """
+    model_state = similarity_service.model_manager.state if similarity_service is not None else ModelState.NOT_LOADED
+    ready = similarity_service is not None and (not settings.SEMANTIC_MODEL_PRELOAD or model_state == ModelState.READY)
+    response = ReadinessResponse(ready=ready, semantic_model_state=model_state)
+    if not ready:
+        return JSONResponse(status_code=503, content=response.model_dump(mode="json"))
+    return response
+
+
 @app.get("/metrics")
 async def get_available_metrics():
     """Get list of available similarity metrics."""
@@ -105,17 +254,97 @@ async def get_available_metrics():
         "descriptions": {
             "cosine": "Cosine similarity using TF-IDF vectors",
             "jaccard": "Jaccard similarity based on word overlap",
-            "semantic": "Semantic similarity using sentence transformers"
+            "minhash": "Jaccard similarity estimated from MinHash signatures",
+            "semantic": "Semantic similarity using sentence transformers",
+            "cascade": "Cheap metrics first, the next one only for the pairs close to the similarity threshold"
         }
     }
 
 
+@app.get("/stats")
+async def get_stats(
+        cache_svc: CacheService = Depends(get_cache_service),
+        job_queue_svc: LLMJobQueue = Depends(get_job_queue),
+        llm_svc: LLMService = Depends(get_llm_service),
+        sanitization_svc: TextSanitizationService = Depends(get_sanitization_service),
+        search_svc: CorpusSearchService = Depends(get_search_service),
+        semantic_cache_svc: Optional[SemanticResponseCache] = Depends(get_semantic_cache),
+        similarity_svc: TextSimilarityService = Depends(get_similarity_service)
+):
+    """Get runtime statistics of the services."""
+    return {
+        "cache": cache_svc.stats(),
+        "jobs": job_queue_svc.stats(),
+        "llm": llm_svc.stats(),
+        "sanitization": sanitization_svc.stats(),
+        "search": search_svc.stats(),
+        "semantic_cache": semantic_cache_svc.stats() if semantic_cache_svc else None,
+        "similarity": similarity_svc.stats()
+    }
+
+
+async def stream_llm_response(response: SimilarityResponse, prompt: str, llm_svc: LLMService,
+                              sanitization_svc: TextSanitizationService):
+    """
+    Stream a similarity response as NDJSON: the similarity line first, then one `{"llm_response_chunk": ...}` line per
+    sanitized chunk of the LLM response, forwarded as soon as the incremental sanitizer releases it, and last
+    `{"done": true}`, or `{"error": ...}` if the LLM failed mid-response, so that a cut-off response can be told apart.
+    """
+    yield response.model_dump_json() + "\n"
+
+    sanitizer = sanitization_svc.streaming(window=settings.LLM_STREAM_SANITIZE_WINDOW)
+    generated = False
+    error = None
+    try:
+        async for chunk in llm_svc.generate_response_stream(prompt):
+            generated = True
+            sanitized = sanitizer.feed(chunk)
+            if sanitized:
+                yield json.dumps({"llm_response_chunk": sanitized}) + "\n"
+    except LLMStreamInterrupted as e:
+        print(f"LLM response interrupted: {e}")
+        error = "LLM response interrupted"
+
+    sanitized = sanitizer.flush() if generated else "LLM service unavailable or failed to generate response"
+    if not generated:
+        print("LLM failed to generate response")
+    if sanitized:
+        yield json.dumps({"llm_response_chunk": sanitized}) + "\n"
+    yield json.dumps({"error": error} if error else {"done": True}) + "\n"
+
+
+async def generate_llm_response(prompt: str, cache_llm_response: bool, llm_svc: LLMService,
+                                sanitization_svc: TextSanitizationService,
+                                semantic_cache_svc: Optional[SemanticResponseCache]) -> tuple[str, LLMResponseSource]:
+    """
+    Get the sanitized LLM response to a prompt, from the response caches if allowed.
+    :return: Sanitized response, or a failure message, and where the response comes from
+    """
+    cache_hit = await semantic_cache_svc.get(prompt) if cache_llm_response and semantic_cache_svc else None
+    if cache_hit is not None:
+        llm_response, source = cache_hit.response, LLMResponseSource.SEMANTIC_CACHE
+    elif cache_llm_response:
+        llm_response, source = await llm_svc.generate_response_cached(prompt)
+        if llm_response and semantic_cache_svc and source == LLMResponseSource.LLM:
+            await semantic_cache_svc.set(prompt, llm_response)
+    else:
+        llm_response = await llm_svc.generate_response_with_retry(prompt)
+        source = LLMResponseSource.LLM
+    if not llm_response:
+        print("LLM failed to generate response")
+        llm_response = "LLM service unavailable or failed to generate response"
+
+    return sanitization_svc.sanitize_text(llm_response), source
+
+
 @app.post("/similarity", response_model=SimilarityResponse)
 async def calculate_similarity(
         request: SimilarityRequest,
         llm_svc: LLMService = Depends(get_llm_service),
         sanitization_svc: TextSanitizationService = Depends(get_sanitization_service),
-        similarity_svc: TextSimilarityService = Depends(get_similarity_service)
+        semantic_cache_svc: Optional[SemanticResponseCache] = Depends(get_semantic_cache),
+        similarity_svc: TextSimilarityService = Depends(get_similarity_service),
+        job_queue_svc: Optional[LLMJobQueue] = Depends(get_optional_job_queue)
 ) -> SimilarityResponse:
     """
     Calculate text similarity between two prompts.
@@ -123,42 +352,282 @@ async def calculate_similarity(
     This endpoint:
     1. Sanitizes input prompts
     2. Calculates similarity using specified metric
-    3. If prompts are similar enough, sends one to LLM
+    3. If prompts are similar enough, sends one to LLM, or with `cache_llm_response`, reuses the response of the same
+       or of a close enough prompt
     4. Sanitized and returns the response
+
+    With `stream`, the response is NDJSON and the LLM response is forwarded chunk by chunk, sanitized incrementally.
+    With `llm_job`, the response is returned right away with the id of a queued job generating the LLM response.
+    With the `cascade` metric, the score is that of the cheapest stage that decided, reported in `decided_by`.
+    With `similarity_metrics`, every listed metric is scored from one pass over each prompt, in `similarity_scores`.
     """
     try:
-        prompt1 = sanitization_svc.sanitize_text(request.prompt1)
-        prompt2 = sanitization_svc.sanitize_text(request.prompt2)
-        if prompt1 != request.prompt1 or prompt2 != request.prompt2:
-            raise ValueError(f"Input sanitized: prompt1='{prompt1}', prompt2='{prompt2}'")
-
-        similarity_score = await similarity_svc.calculate_similarity(
-            prompt1,
-            prompt2,
-            request.similarity_metric
-        )
+        prompt1, prompt2 = request.prompt1, request.prompt2
+        if sanitization_svc.contains_violations(prompt1) or sanitization_svc.contains_violations(prompt2):
+            raise ValueError(f"Input sanitized: prompt1='{sanitization_svc.sanitize_text(prompt1)}', "
+                             f"prompt2='{sanitization_svc.sanitize_text(prompt2)}'")
+
+        decided_by, similarity_scores = None, None
+        if request.similarity_metrics:
+            similarity_scores = await similarity_svc.calculate_similarities(
+                prompt1, prompt2, request.similarity_metrics)
+            similarity_score = similarity_scores[request.similarity_metric]
+        elif request.similarity_metric == SimilarityMetric.CASCADE:
+            similarity_score, decided_by = await similarity_svc.cascade_similarity(
+                prompt1, prompt2, request.similarity_threshold)
+        else:
+            similarity_score = await similarity_svc.calculate_similarity(
+                prompt1,
+                prompt2,
+                request.similarity_metric
+            )
         success = similarity_score >= request.similarity_threshold
         response = SimilarityResponse(
             are_similar=success,
             similarity_metric=request.similarity_metric,
-            similarity_score=similarity_score
+            similarity_score=similarity_score,
+            decided_by=decided_by,
+            similarity_scores=similarity_scores
         )
 
         if not request.use_llm or not success:
+            return StreamingResponse(iter([response.model_dump_json() + "\n"]), media_type="application/x-ndjson") \
+                if request.stream else response
+
+        if request.stream:
+            response.llm_response_source = LLMResponseSource.LLM
+            return StreamingResponse(
+                stream_llm_response(response, request.prompt1, llm_svc, sanitization_svc),
+                media_type="application/x-ndjson"
+            )
+
+        if request.llm_job:
+            if job_queue_svc is None:
+                raise HTTPException(status_code=503, detail="LLM job queue not initialized")
+            try:
+                job = job_queue_svc.submit(
+                    partial(generate_llm_response, request.prompt1, request.cache_llm_response, llm_svc,
+                            sanitization_svc, semantic_cache_svc),
+                    priority=request.llm_job_priority
+                )
+            except asyncio.QueueFull:
+                raise HTTPException(status_code=429, detail="LLM job queue is full, retry later")
+            response.llm_job_id = job.id
             return response
 
-        llm_response = await llm_svc.generate_response_with_retry(request.prompt1)
-        if not llm_response:
-            print("LLM failed to generate response")
-            llm_response = "LLM service unavailable or failed to generate response"
-
-        response.llm_response = sanitization_svc.sanitize_text(llm_response)
+        response.llm_response, response.llm_response_source = await generate_llm_response(
+            request.prompt1, request.cache_llm_response, llm_svc, sanitization_svc, semantic_cache_svc)
         return response
     except HTTPException:
         raise
     # Let ValueError and other exceptions propagate to global handlers
 
 
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+        job_id: str,
+        job_queue_svc: LLMJobQueue = Depends(get_job_queue)
+) -> JobResponse:
+    """Get the status of an LLM job, and its response once it succeeded."""
+    job = job_queue_svc.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return JobResponse(
+        id=job.id,
+        status=job.status,
+        llm_response=job.result,
+        llm_response_source=job.source,
+        error=job.error,
+        queue_wait_ms=(job.started_at - job.created_at) * 1000 if job.started_at is not None else None,
+        run_ms=(job.finished_at - job.started_at) * 1000 if job.finished_at is not None else None
+    )
+
+
+@app.post("/similarity/batch", response_model=BatchSimilarityResponse)
+async def calculate_similarity_batch(
+        request: BatchSimilarityRequest,
+        sanitization_svc: TextSanitizationService = Depends(get_sanitization_service),
+        similarity_svc: TextSimilarityService = Depends(get_similarity_service)
+) -> BatchSimilarityResponse:
+    """
+    Calculate text similarity for many prompt pairs, or for one query against many candidates.
+
+    This endpoint:
+    1. Sanitizes every distinct input prompt once
+    2. Calculates the similarity of all pairs together using specified metric
+    3. Returns the results in request order
+    """
+    pairs = request.to_pairs()
+    prompts = list({prompt for pair in pairs for prompt in pair})
+    for prompt, sanitized in zip(prompts, sanitization_svc.sanitize_many(prompts)):
+        if sanitized != prompt:
+            raise ValueError(f"Input sanitized: prompt='{sanitized}'")
+
+    if request.similarity_metric == SimilarityMetric.CASCADE:
+        similarity_scores, decided_by = await similarity_svc.cascade_similarity_batch(
+            pairs, request.similarity_threshold)
+    else:
+        similarity_scores = await similarity_svc.calculate_similarity_batch(pairs, request.similarity_metric)
+        decided_by = [None] * len(pairs)
+    return BatchSimilarityResponse(
+        similarity_metric=request.similarity_metric,
+        results=[
+            BatchSimilarityResult(
+                prompt1=prompt1,
+                prompt2=prompt2,
+                are_similar=similarity_score >= request.similarity_threshold,
+                similarity_score=similarity_score,
+                decided_by=stage
+            )
+            for (prompt1, prompt2), similarity_score, stage in zip(pairs, similarity_scores, decided_by)
+        ]
+    )
+
+
+@app.post("/similarity/matrix")
+async def calculate_similarity_matrix(
+        request: SimilarityMatrixRequest,
+        sanitization_svc: TextSanitizationService = Depends(get_sanitization_service),
+        similarity_svc: TextSimilarityService = Depends(get_similarity_service)
+) -> StreamingResponse:
+    """
+    Calculate the pairwise similarity matrix of many prompts, streamed one row at a time.
+
+    Formats:
+    - ndjson: one `{"row": i, "scores": [...]}` line per row, or `{"row": i, "columns": [...], "scores": [...]}`
+      with only the pairs above the threshold (rows without any are skipped)
+    - binary: little-endian float32 values, row-major
+    In upper-triangular mode, row i only holds the columns j > i.
+    """
+    for text, sanitized in zip(request.texts, sanitization_svc.sanitize_many(request.texts)):
+        if sanitized != text:
+            raise ValueError(f"Input sanitized: text='{sanitized}'")
+
+    size = len(request.texts)
+    blocks = similarity_svc.similarity_matrix(
+        request.texts,
+        request.similarity_metric,
+        upper_triangular=request.upper_triangular,
+        block_rows=max(1, settings.MATRIX_BLOCK_MAX_BYTES // (4 * size)),
+        tile_size=settings.MATRIX_TILE_SIZE
+    )
+    # The first block is computed before streaming, so that a busy executor is answered with a 429, not a cut stream
+    first_block = await anext(blocks, None)
+
+    async def all_blocks():
+        if first_block is not None:
+            yield first_block
+        async for block in blocks:
+            yield block
+
+    async def stream_rows():
+        async for start, block in all_blocks():
+            if request.format == SimilarityMatrixFormat.BINARY:
+                if request.upper_triangular:
+                    yield b"".join(block[r, r:].astype("<f4").tobytes() for r in range(block.shape[0]))
+                else:
+                    yield block.astype("<f4").tobytes()
+                continue
+
+            lines = []
+            for r, scores in enumerate(block):
+                row = start + r
+                first_column = row + 1 if request.upper_triangular else 0
+                scores = scores[r:] if request.upper_triangular else scores
+                if request.threshold is None:
+                    lines.append(json.dumps({"row": row, "scores": scores.tolist()}))
+                    continue
+                columns = np.flatnonzero(scores >= request.threshold)
+                if columns.size:
+                    lines.append(json.dumps({
+                        "row": row,
+                        "columns": (columns + first_column).tolist(),
+                        "scores": scores[columns].tolist()
+                    }))
+            if lines:
+                yield "\n".join(lines) + "\n"
+
+    media_type = "application/octet-stream" if request.format == SimilarityMatrixFormat.BINARY \
+        else "application/x-ndjson"
+    return StreamingResponse(stream_rows(), media_type=media_type, headers={"X-Matrix-Size": str(size)})
+
+
+@app.post("/corpus/documents", response_model=CorpusDocumentsResponse)
+async def add_corpus_documents(
+        request: CorpusDocumentsRequest,
+        sanitization_svc: TextSanitizationService = Depends(get_sanitization_service),
+        search_svc: CorpusSearchService = Depends(get_search_service)
+) -> CorpusDocumentsResponse:
+    """Add documents to the searchable corpus, replacing those with the same id."""
+    texts = [document.text for document in request.documents]
+    for text, sanitized in zip(texts, sanitization_svc.sanitize_many(texts)):
+        if sanitized != text:
+            raise ValueError(f"Input sanitized: text='{sanitized}'")
+
+    ids = await search_svc.add_documents([(document.id, document.text) for document in request.documents])
+    return CorpusDocumentsResponse(ids=ids, corpus_size=len(search_svc))
+
+
+@app.delete("/corpus/documents/{document_id}")
+async def remove_corpus_document(
+        document_id: str,
+        search_svc: CorpusSearchService = Depends(get_search_service)
+):
+    """Remove a document from the searchable corpus."""
+    if not await search_svc.remove_document(document_id):
+        raise HTTPException(status_code=404, detail=f"Document not found: {document_id}")
+    return {"id": document_id, "corpus_size": len(search_svc)}
+
+
+@app.post("/search", response_model=SearchResponse)
+async def search_corpus(
+        request: SearchRequest,
+        sanitization_svc: TextSanitizationService = Depends(get_sanitization_service),
+        search_svc: CorpusSearchService = Depends(get_search_service)
+) -> SearchResponse:
+    """
+    Find the known prompts most similar to a query.
+
+    This endpoint:
+    1. Sanitizes the query
+    2. Scores the corpus using specified metric, exactly or with the approximate index
+    3. Returns the top-k documents, most similar first
+    """
+    query = request.query
+    if sanitization_svc.contains_violations(query):
+        raise ValueError(f"Input sanitized: query='{sanitization_svc.sanitize_text(query)}'")
+
+    matches = await search_svc.search(query, request.similarity_metric, request.top_k, request.approximate)
+    return SearchResponse(
+        similarity_metric=request.similarity_metric,
+        results=[SearchResult(id=match.id, text=match.text, similarity_score=match.score) for match in matches]
+    )
+
+
+@app.post("/dedup", response_model=DeduplicationResponse)
+async def deduplicate(
+        request: DeduplicationRequest,
+        sanitization_svc: TextSanitizationService = Depends(get_sanitization_service),
+        similarity_svc: TextSimilarityService = Depends(get_similarity_service)
+) -> DeduplicationResponse:
+    """
+    Group near-duplicate texts.
+
+    Texts are near-duplicates when the Jaccard similarity estimated from their MinHash signatures reaches the
+    threshold; candidates are found with an LSH index instead of comparing every pair, on the lexical executor.
+    """
+    for text, sanitized in zip(request.texts, sanitization_svc.sanitize_many(request.texts)):
+        if sanitized != text:
+            raise ValueError(f"Input sanitized: text='{sanitized}'")
+
+    groups = await similarity_svc.lexical_executor.run(
+        find_near_duplicates, similarity_svc.minhasher, request.texts, request.threshold)
+    return DeduplicationResponse(
+        groups=groups,
+        unique_count=len(request.texts) - sum(len(group) - 1 for group in groups)
+    )
+
+
 # Error handlers
 
 @app.exception_handler(ValueError)
@@ -170,12 +639,21 @@ async def handle_value_error(request, exception: Exception) -> JSONResponse:
     )
 
 
+@app.exception_handler(ExecutorBusy)
+async def handle_executor_busy(request, exception: ExecutorBusy) -> JSONResponse:
+    print(f"Request refused, error={exception}")
+    return JSONResponse(
+        status_code=429,
+        content={"error": "Too many requests", "detail": str(exception)}
+    )
+
+
 @app.exception_handler(RequestValidationError)
 async def handle_validation_error(request, exc: RequestValidationError) -> JSONResponse:
     print(f"Validation error in request: {exc.errors()}")
     return JSONResponse(
         status_code=422,
-        content={"error": "Validation failed", "detail": exc.errors()}
+        content={"error": "Validation failed", "detail": jsonable_encoder(exc.errors())}
     )
 
 
@@ -1,22 +1,45 @@
 from enum import Enum
 from typing import Optional
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class ModelState(str, Enum):
+    NOT_LOADED = "not_loaded"
+    LOADING = "loading"
+    LOADED = "loaded"
+    WARMING_UP = "warming_up"
+    READY = "ready"
+    FAILED = "failed"
 
 
 class HealthResponse(BaseModel):
     environment: str
     is_llm_available: bool
+    llm_circuit_state: CircuitState
     llm_model: str
     service: str
     status: str
     version: str
 
 
+class ReadinessResponse(BaseModel):
+    ready: bool
+    semantic_model_state: ModelState
+
+
 class SimilarityMetric(str, Enum):
     COSINE = "cosine"
     JACCARD = "jaccard"
+    MINHASH = "minhash"
     SEMANTIC = "semantic"
+    CASCADE = "cascade"
 
 
 class SimilarityRequest(BaseModel):
@@ -26,6 +49,12 @@ class SimilarityRequest(BaseModel):
         default=SimilarityMetric.COSINE,
         description="Similarity metric to use"
     )
+    similarity_metrics: Optional[list[SimilarityMetric]] = Field(
+        default=None,
+        min_length=1,
+        description="Metrics to score in one request, each text being processed once for all of them; the first "
+                    "one is the similarity metric, its score deciding whether the prompts are similar"
+    )
     similarity_threshold: float = Field(
         default=0.7,
         ge=0.0,
@@ -36,6 +65,19 @@ class SimilarityRequest(BaseModel):
         default=False,
         description="Whether to use LLM for generating response if prompts are similar"
     )
+    cache_llm_response: bool = Field(
+        default=False,
+        description="Whether the LLM response may be served from, and stored in, the response cache"
+    )
+    stream: bool = Field(
+        default=False,
+        description="Whether to stream the response as NDJSON: the similarity, then the LLM response chunks"
+    )
+    llm_job: bool = Field(
+        default=False,
+        description="Whether to return right away with a job id to poll for the LLM response, instead of waiting"
+    )
+    llm_job_priority: int = Field(default=0, ge=0, le=9, description="Priority of the LLM job, higher runs first")
 
     @field_validator("prompt1", "prompt2")
     @classmethod
@@ -45,9 +87,295 @@ class SimilarityRequest(BaseModel):
             raise ValueError("Prompts cannot be empty or whitespace only")
         return value
 
+    @field_validator("similarity_metrics")
+    @classmethod
+    def validate_metrics(cls, value: Optional[list[SimilarityMetric]]) -> Optional[list[SimilarityMetric]]:
+        if value is None:
+            return value
+        if SimilarityMetric.CASCADE in value:
+            raise ValueError("The cascade metric decides pairs against a threshold, it cannot be one of several")
+        if len(set(value)) != len(value):
+            raise ValueError("Similarity metrics must be unique")
+        return value
+
+    @model_validator(mode="after")
+    def validate_similarity_metrics(self) -> "SimilarityRequest":
+        if self.similarity_metrics:
+            if "similarity_metric" in self.model_fields_set and self.similarity_metric != self.similarity_metrics[0]:
+                raise ValueError("similarity_metric must be the first of similarity_metrics when both are set")
+            self.similarity_metric = self.similarity_metrics[0]
+        return self
+
+    @model_validator(mode="after")
+    def validate_stream(self) -> "SimilarityRequest":
+        if self.stream and self.cache_llm_response:
+            raise ValueError("Streamed LLM responses are not cached")
+        if self.stream and self.llm_job:
+            raise ValueError("An LLM response is either streamed or generated as a job")
+        return self
+
+
+class LLMResponseSource(str, Enum):
+    LLM = "llm"
+    CACHE = "cache"
+    COALESCED = "coalesced"
+    SEMANTIC_CACHE = "semantic_cache"
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
 
 class SimilarityResponse(BaseModel):
     are_similar: bool = Field(..., description="Whether the two prompts are similar")
     llm_response: Optional[str] = Field(None, description="Response if the two prompts are similar")
+    llm_response_source: Optional[LLMResponseSource] = Field(
+        None,
+        description="Whether the response was generated, served from the cache (exact or semantic), "
+                    "or shared with a concurrent request"
+    )
+    llm_job_id: Optional[str] = Field(None, description="Id of the LLM job to poll at /jobs/{id}")
+    similarity_metric: SimilarityMetric = Field(..., description="Metric used for similarity calculation")
+    similarity_score: float = Field(..., description="Calculated similarity score")
+    decided_by: Optional[SimilarityMetric] = Field(
+        None,
+        description="Stage of the cascade metric that decided, whose score is returned (cascade metric only)"
+    )
+    similarity_scores: Optional[dict[SimilarityMetric, float]] = Field(
+        None,
+        description="Score of each requested metric (requests with similarity_metrics only)"
+    )
+
+
+class JobResponse(BaseModel):
+    id: str = Field(..., description="Job id")
+    status: JobStatus = Field(..., description="Job status")
+    llm_response: Optional[str] = Field(None, description="LLM response, once the job succeeded")
+    llm_response_source: Optional[LLMResponseSource] = Field(None, description="Where the LLM response comes from")
+    error: Optional[str] = Field(None, description="Error, if the job failed")
+    queue_wait_ms: Optional[float] = Field(None, description="Time spent waiting for a worker")
+    run_ms: Optional[float] = Field(None, description="Time spent generating the response")
+
+
+class PromptPair(BaseModel):
+    prompt1: str = Field(..., min_length=1, max_length=1000, description="First text prompt")
+    prompt2: str = Field(..., min_length=1, max_length=1000, description="Second text prompt")
+
+    @field_validator("prompt1", "prompt2")
+    @classmethod
+    def validate_prompts(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("Prompts cannot be empty or whitespace only")
+        return value
+
+
+class BatchSimilarityRequest(BaseModel):
+    pairs: list[PromptPair] = Field(
+        default_factory=list,
+        max_length=1000,
+        description="Prompt pairs to compare"
+    )
+    query: Optional[str] = Field(None, min_length=1, max_length=1000, description="Prompt to compare to candidates")
+    candidates: list[str] = Field(
+        default_factory=list,
+        max_length=1000,
+        description="Candidate prompts to compare to the query"
+    )
+    similarity_metric: SimilarityMetric = Field(
+        default=SimilarityMetric.COSINE,
+        description="Similarity metric to use"
+    )
+    similarity_threshold: float = Field(
+        default=0.7,
+        ge=0.0,
+        le=1.0,
+        description="Minimum similarity score for a pair to be considered similar"
+    )
+
+    @field_validator("query")
+    @classmethod
+    def validate_query(cls, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return value
+        value = value.strip()
+        if not value:
+            raise ValueError("Query cannot be empty or whitespace only")
+        return value
+
+    @field_validator("candidates")
+    @classmethod
+    def validate_candidates(cls, values: list[str]) -> list[str]:
+        values = [value.strip() for value in values]
+        if any(not value or len(value) > 1000 for value in values):
+            raise ValueError("Candidates must be non-empty and at most 1000 characters")
+        return values
+
+    @model_validator(mode="after")
+    def validate_batch(self) -> "BatchSimilarityRequest":
+        if self.pairs and (self.query is not None or self.candidates):
+            raise ValueError("Provide either pairs or query with candidates, not both")
+        if self.query is not None and not self.candidates:
+            raise ValueError("A query requires at least one candidate")
+        if self.query is None and self.candidates:
+            raise ValueError("Candidates require a query")
+        if not self.pairs and self.query is None:
+            raise ValueError("Provide either pairs or query with candidates")
+        return self
+
+    def to_pairs(self) -> list[tuple[str, str]]:
+        """Flatten the request into (prompt1, prompt2) pairs, in request order."""
+        if self.query is not None:
+            return [(self.query, candidate) for candidate in self.candidates]
+        return [(pair.prompt1, pair.prompt2) for pair in self.pairs]
+
+
+class BatchSimilarityResult(BaseModel):
+    prompt1: str = Field(..., description="First text prompt")
+    prompt2: str = Field(..., description="Second text prompt")
+    are_similar: bool = Field(..., description="Whether the two prompts are similar")
+    similarity_score: float = Field(..., description="Calculated similarity score")
+    decided_by: Optional[SimilarityMetric] = Field(
+        None,
+        description="Stage of the cascade metric that decided, whose score is returned (cascade metric only)"
+    )
+
+
+class BatchSimilarityResponse(BaseModel):
     similarity_metric: SimilarityMetric = Field(..., description="Metric used for similarity calculation")
+    results: list[BatchSimilarityResult] = Field(..., description="Results in request order")
+
+
+class CorpusDocument(BaseModel):
+    id: Optional[str] = Field(None, min_length=1, max_length=200, description="Document id, generated if missing")
+    text: str = Field(..., min_length=1, max_length=1000, description="Document text")
+
+    @field_validator("text")
+    @classmethod
+    def validate_text(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("Documents cannot be empty or whitespace only")
+        return value
+
+
+class CorpusDocumentsRequest(BaseModel):
+    documents: list[CorpusDocument] = Field(..., min_length=1, max_length=1000, description="Documents to add")
+
+
+class CorpusDocumentsResponse(BaseModel):
+    ids: list[str] = Field(..., description="Ids of the added documents, in request order")
+    corpus_size: int = Field(..., description="Number of documents in the corpus")
+
+
+class SearchRequest(BaseModel):
+    query: str = Field(..., min_length=1, max_length=1000, description="Text prompt to search for")
+    similarity_metric: SimilarityMetric = Field(
+        default=SimilarityMetric.SEMANTIC,
+        description="Similarity metric to use"
+    )
+    top_k: int = Field(default=10, ge=1, le=100, description="Number of results")
+    approximate: bool = Field(
+        default=False,
+        description="Whether to use the approximate index (semantic metric only)"
+    )
+
+    @field_validator("similarity_metric")
+    @classmethod
+    def validate_metric(cls, value: SimilarityMetric) -> SimilarityMetric:
+        if value == SimilarityMetric.CASCADE:
+            raise ValueError("The cascade metric decides pairs against a threshold, it cannot rank documents")
+        return value
+
+    @field_validator("query")
+    @classmethod
+    def validate_query(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("Query cannot be empty or whitespace only")
+        return value
+
+
+class SearchResult(BaseModel):
+    id: str = Field(..., description="Document id")
+    text: str = Field(..., description="Document text")
     similarity_score: float = Field(..., description="Calculated similarity score")
+
+
+class SearchResponse(BaseModel):
+    similarity_metric: SimilarityMetric = Field(..., description="Metric used for similarity calculation")
+    results: list[SearchResult] = Field(..., description="Most similar documents first")
+
+
+class SimilarityMatrixFormat(str, Enum):
+    NDJSON = "ndjson"
+    BINARY = "binary"
+
+
+class SimilarityMatrixRequest(BaseModel):
+    texts: list[str] = Field(..., min_length=2, max_length=50000, description="Text prompts to compare pairwise")
+    similarity_metric: SimilarityMetric = Field(
+        default=SimilarityMetric.COSINE,
+        description="Similarity metric to use"
+    )
+    upper_triangular: bool = Field(
+        default=False,
+        description="Only compute the pairs (i, j) with i < j instead of the full matrix"
+    )
+    threshold: Optional[float] = Field(
+        default=None,
+        ge=-1.0,
+        le=1.0,
+        description="Only return the pairs scoring at least this value (NDJSON only)"
+    )
+    format: SimilarityMatrixFormat = Field(
+        default=SimilarityMatrixFormat.NDJSON,
+        description="NDJSON rows, or row-major little-endian float32 values"
+    )
+
+    @field_validator("texts")
+    @classmethod
+    def validate_texts(cls, values: list[str]) -> list[str]:
+        values = [value.strip() for value in values]
+        if any(not value or len(value) > 1000 for value in values):
+            raise ValueError("Texts must be non-empty and at most 1000 characters")
+        return values
+
+    @field_validator("similarity_metric")
+    @classmethod
+    def validate_metric(cls, value: SimilarityMetric) -> SimilarityMetric:
+        if value == SimilarityMetric.CASCADE:
+            raise ValueError("The cascade metric decides pairs against a threshold, it cannot score a matrix")
+        return value
+
+    @model_validator(mode="after")
+    def validate_threshold(self) -> "SimilarityMatrixRequest":
+        if self.threshold is not None and self.format == SimilarityMatrixFormat.BINARY:
+            raise ValueError("A threshold can only be used with the NDJSON format")
+        return self
+
+
+class DeduplicationRequest(BaseModel):
+    texts: list[str] = Field(..., min_length=2, max_length=10000, description="Text prompts to deduplicate")
+    threshold: float = Field(
+        default=0.8,
+        gt=0.0,
+        le=1.0,
+        description="Minimum estimated Jaccard similarity of near-duplicates"
+    )
+
+    @field_validator("texts")
+    @classmethod
+    def validate_texts(cls, values: list[str]) -> list[str]:
+        values = [value.strip() for value in values]
+        if any(not value or len(value) > 1000 for value in values):
+            raise ValueError("Texts must be non-empty and at most 1000 characters")
+        return values
+
+
+class DeduplicationResponse(BaseModel):
+    groups: list[list[int]] = Field(..., description="Indices of near-duplicate texts, one list per group")
+    unique_count: int = Field(..., description="Number of texts once each group is reduced to one text")
@@ -0,0 +1,181 @@
+"""
+Pre-fork serving: a master process loads the services once, then forks the workers, which share the loaded state
+copy-on-write instead of each loading its own copy.
+
+The master preloads the sanitization engine, the TF-IDF model and the semantic model (see
+`app.main.preload_services`), then freezes every object it holds with `gc.freeze()`: the garbage collector no longer
+scans them, so that the workers' collections do not write to their headers and copy the shared pages. The master
+binds the listening socket, forks the workers, each serving the app with uvicorn on the shared socket, replaces the
+workers that die, and stops them on SIGTERM or SIGINT.
+
+A memory report of each worker's RSS against its PSS (proportional set size: shared pages are divided among the
+processes sharing them) is printed once the workers are up, and on SIGUSR1. The sum of the PSS is what the workers
+actually use, while the sum of the RSS is about what independently started workers would use:
+
+    python -m app.prefork --workers 4
+    kill -USR1 <master pid>
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+from typing import Optional
+
+import uvicorn
+
+from app import main as api
+from app.utils.config import settings
+
+
+def memory_usage(pid: int) -> dict[str, int]:
+    """
+    Get the memory usage of a process, from `/proc/<pid>/smaps_rollup` (Linux 4.14+).
+    :param pid: Process id
+    :return: RSS, PSS, shared and private memory, in bytes
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    }
+
+
+def memory_report(pids: dict[str, int]) -> str:
+    """
+    Format the memory usage of processes, and of all of them.
+    :param pids: Process ids by name
+    :return: One line per process, and a line of totals
+    """
+    mib = 1024 * 1024
+    lines = [f"{'process':<12} {'pid':>8} {'RSS MiB':>9} {'PSS MiB':>9} {'shared MiB':>11} {'private MiB':>12}"]
+    totals = {"rss": 0, "pss": 0}
+    for name, pid in pids.items():
+        try:
+            usage = memory_usage(pid)
+        except OSError:
+            continue
+        totals["rss"] += usage["rss"]
+        totals["pss"] += usage["pss"]
+        lines.append(f"{name:<12} {pid:>8} {usage['rss'] / mib:>9.1f} {usage['pss'] / mib:>9.1f} "
+                     f"{usage['shared'] / mib:>11.1f} {usage['private'] / mib:>12.1f}")
+    saved = 1 - totals["pss"] / totals["rss"] if totals["rss"] else 0.0
+    lines.append(f"{'total':<12} {'':>8} {totals['rss'] / mib:>9.1f} {totals['pss'] / mib:>9.1f}   "
+                 f"PSS is {saved:.0%} less than RSS")
+    return "\n".join(lines)
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Bind the listening socket shared by the workers."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, log_level: str):
+    """Serve the app on the shared socket, in a forked worker."""
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1):
+        signal.signal(signum, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(api.app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def _fork_worker(sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock, log_level)
+        except BaseException as e:
+            print(f"Worker {os.getpid()} failed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve(workers: int, host: str, port: int, report_after_seconds: Optional[float] = 30.0,
+          log_level: str = "info"):
+    """
+    Preload the services, fork the workers and supervise them until SIGTERM or SIGINT.
+    :param workers: Number of worker processes
+    :param host: Host to bind
+    :param port: Port to bind
+    :param report_after_seconds: Seconds after which the memory report is printed, None to only print it on SIGUSR1
+    :param log_level: Uvicorn log level of the workers
+    """
+    started = time.perf_counter()
+    api.preload_services(workers)
+    print(f"Preloaded the services in {time.perf_counter() - started:.1f} s")
+
+    sock = bind_socket(host, port)
+    # Collect before freezing, so that the garbage is freed rather than frozen
+    gc.collect()
+    gc.freeze()
+    print(f"Froze {gc.get_freeze_count()} objects")
+
+    children = {_fork_worker(sock, log_level) for _ in range(workers)}
+    print(f"Serving on {host}:{port} with {workers} workers")
+    stopping = False
+
+    def report():
+        pids = {"master": os.getpid()} | {f"worker {index}": pid for index, pid in enumerate(sorted(children))}
+        print(memory_report(pids), flush=True)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for child in children:
+            os.kill(child, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, lambda signum, frame: report())
+
+    report_at = time.monotonic() + report_after_seconds if report_after_seconds is not None else None
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.5)
+            if report_at is not None and time.monotonic() >= report_at:
+                report_at = None
+                report()
+            continue
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting it")
+            children.add(_fork_worker(sock, log_level))
+    sock.close()
+    print("All workers stopped")
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=settings.WEB_CONCURRENCY, help="Number of worker processes")
+    parser.add_argument("--host", default=settings.API_HOST)
+    parser.add_argument("--port", type=int, default=settings.API_PORT)
+    parser.add_argument("--report-after", type=float, default=30.0,
+                        help="Seconds after which the memory report is printed, 0 to only print it on SIGUSR1")
+    parser.add_argument("--log-level", default="info", help="Uvicorn log level of the workers")
+    args = parser.parse_args(argv)
+
+    serve(args.workers, args.host, args.port, args.report_after or None, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import redis
+
+
+class CacheBackend(ABC):
+    """
+    A shared tier of the similarity cache, reachable from every worker.
+
+    Calls are batched: one round-trip gets or sets many keys.
+    """
+
+    @abstractmethod
+    def get_many(self, keys: list[str]) -> list[Optional[float]]:
+        """Retrieve the scores of the keys, None for the missing ones."""
+
+    @abstractmethod
+    def set_many(self, items: dict[str, float]):
+        """Store scores by key."""
+
+    def stats(self) -> dict:
+        """Get backend statistics."""
+        return {}
+
+    def close(self):
+        """Release the backend resources."""
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    A cache backend speaking the Redis protocol.
+
+    Reads are batched with MGET, writes are pipelined in one round-trip.
+    When the server is unreachable, the backend reports misses and drops writes for `retry_after_seconds`
+    instead of failing the request, so the cache falls back to its in-process tier.
+    """
+
+    def __init__(self, client: redis.Redis, ttl_seconds: Optional[float] = None, retry_after_seconds: float = 30.0):
+        """
+        :param client: Redis client, e.g. `redis.Redis.from_url(...)` or `fakeredis.FakeRedis()`
+        :param ttl_seconds: Time to live of the stored scores in seconds (no expiry if None)
+        :param retry_after_seconds: Time to wait before contacting the server again after an error
+        """
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.retry_after_seconds = retry_after_seconds
+
+        self._unavailable_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @classmethod
+    def from_url(cls, url: str, socket_timeout: float = 0.1, **kwargs) -> "RedisCacheBackend":
+        """Create a backend connected to the server at the given URL, e.g. `redis://localhost:6379/0`."""
+        client = redis.Redis.from_url(url, socket_timeout=socket_timeout, socket_connect_timeout=socket_timeout)
+        return cls(client, **kwargs)
+
+    @property
+    def is_available(self) -> bool:
+        return time.monotonic() >= self._unavailable_until
+
+    def _mark_unavailable(self, error: Exception):
+        print(f"Cache backend not available, using local cache only: {error}")
+        self.errors += 1
+        self._unavailable_until = time.monotonic() + self.retry_after_seconds
+
+    def get_many(self, keys: list[str]) -> list[Optional[float]]:
+        if not keys or not self.is_available:
+            return [None] * len(keys)
+
+        try:
+            values = self.client.mget(keys)
+        except (redis.RedisError, OSError) as e:
+            self._mark_unavailable(e)
+            return [None] * len(keys)
+
+        scores = [None if value is None else float(value) for value in values]
+        hits = sum(score is not None for score in scores)
+        self.hits += hits
+        self.misses += len(scores) - hits
+        return scores
+
+    def set_many(self, items: dict[str, float]):
+        if not items or not self.is_available:
+            return
+
+        expiry = int(self.ttl_seconds * 1000) if self.ttl_seconds else None
+        try:
+            with self.client.pipeline(transaction=False) as pipeline:
+                for key, score in items.items():
+                    pipeline.set(key, repr(float(score)), px=expiry)
+                pipeline.execute()
+        except (redis.RedisError, OSError) as e:
+            self._mark_unavailable(e)
+
+    def stats(self) -> dict:
+        return {
+            "type": "redis",
+            "available": self.is_available,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors
+        }
+
+    def close(self):
+        self.client.close()
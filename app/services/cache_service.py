@@ -1,6 +1,23 @@
+import asyncio
+import os
+import struct
+from pathlib import Path
 from typing import Optional
 
 from app.models import SimilarityMetric
+from app.services.cache_backends import CacheBackend
+from app.utils.hashing import DIGEST_SIZE, text_digest
+from app.utils.lru_cache import LRUCache
+
+# Snapshot file layout (little-endian):
+# - header: magic, format version, number of metric names, then each name as (length, UTF-8 bytes)
+# - entry count, then per entry: metric name index, both text digests, score
+_SNAPSHOT_MAGIC = b"SIMC"
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct("<4sHB")
+_SNAPSHOT_NAME_LENGTH = struct.Struct("<B")
+_SNAPSHOT_COUNT = struct.Struct("<I")
+_SNAPSHOT_ENTRY = struct.Struct(f"<B{DIGEST_SIZE}s{DIGEST_SIZE}sd")
 
 
 class CacheService:
@@ -8,29 +25,177 @@ class CacheService:
     A caching service for similarity calculations.
 
     Cache strategy:
-    - Similarity: (metric, text1 hash, text2 hash) -> similarity score
-
-    TODO: Redis integration for persistent caching.
+    - Similarity: (metric, text1 digest, text2 digest) -> similarity score, digests are stable across processes
+    - L1: in-process cache, bounded by entry count and approximate size, least recently used entries are evicted first
+    - L2: optional shared backend (e.g. Redis) in front of which L1 sits, L2 hits are promoted to L1
+    - Optional time to live per entry
+    - L1 can be snapshotted to a compact binary file and restored, e.g. across a restart
     """
 
-    def __init__(self):
-        self.similarity_cache = {}
+    def __init__(self, max_entries: int = 100_000, max_bytes: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None, backend: Optional[CacheBackend] = None):
+        """
+        :param max_entries: Maximum number of similarities cached in process
+        :param max_bytes: Maximum approximate size of the in-process cache in bytes (unbounded if None)
+        :param ttl_seconds: Time to live of a similarity cached in process in seconds (no expiry if None)
+        :param backend: Shared cache tier (in-process only if None)
+        """
+        self.similarity_cache = LRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+        self.backend = backend
+
+    @staticmethod
+    def _format_similarity_key(metric: str, digest1: bytes, digest2: bytes) -> str:
+        if digest1 > digest2:
+            digest1, digest2 = digest2, digest1  # Ensure consistent ordering
+        # Use a consistent format for the key
+        return f"sim:{metric}:{digest1.hex()}:{digest2.hex()}"
 
     @staticmethod
     def _generate_similarity_key(metric: SimilarityMetric, text1: str, text2: str) -> str:
         """Generate a unique key for similarity based on texts and metric."""
-        hash1, hash2 = hash(text1), hash(text2)
-        if hash1 > hash2:
-            hash1, hash2 = hash2, hash1  # Ensure consistent ordering
-        # Use a consistent format for the key
-        return f"sim:{metric}:{hash1}:{hash2}"
+        return CacheService._format_similarity_key(metric, text_digest(text1), text_digest(text2))
 
     def get_similarity(self, metric: str, text1: str, text2: str) -> Optional[float]:
         """Retrieve similarity score from cache or return None if not found."""
-        key = self._generate_similarity_key(metric, text1, text2)
-        return self.similarity_cache.get(key)
+        return self.get_similarities(metric, [(text1, text2)])[0]
 
     def set_similarity(self, metric: str, text1: str, text2: str, score: float):
         """Store similarity score in cache."""
-        key = self._generate_similarity_key(metric, text1, text2)
-        self.similarity_cache[key] = score
+        self.set_similarities(metric, [(text1, text2, score)])
+
+    async def get_similarity_async(self, metric: str, text1: str, text2: str) -> Optional[float]:
+        """Retrieve similarity score from cache, querying the shared tier off the event loop."""
+        return (await self.get_similarities_async(metric, [(text1, text2)]))[0]
+
+    async def set_similarity_async(self, metric: str, text1: str, text2: str, score: float):
+        """Store similarity score in cache, writing to the shared tier off the event loop."""
+        await self.set_similarities_async(metric, [(text1, text2, score)])
+
+    def _get_local(self, metric: str, pairs: list[tuple[str, str]]) -> tuple[list[str], list[Optional[float]]]:
+        """Get the keys of the pairs and their L1 scores, None if not found."""
+        keys = [self._generate_similarity_key(metric, text1, text2) for text1, text2 in pairs]
+        return keys, [self.similarity_cache.get(key, tag=metric) for key in keys]
+
+    def _promote(self, metric: str, keys: list[str], scores: list[Optional[float]], missing: list[int],
+                 found: list[Optional[float]]):
+        """Fill in the L2 scores of the L1 misses, and copy them to L1."""
+        for index, score in zip(missing, found):
+            if score is not None:
+                scores[index] = score
+                self.similarity_cache.set(keys[index], score, tag=metric)
+
+    def get_similarities(self, metric: str, pairs: list[tuple[str, str]]) -> list[Optional[float]]:
+        """
+        Retrieve the similarity scores of many pairs, with one round-trip to the shared tier for the L1 misses.
+
+        The round-trip blocks: from the event loop, use `get_similarities_async`.
+        :param metric: Similarity metric of the scores
+        :param pairs: (text1, text2) pairs
+        :return: Score of each pair, None if not found
+        """
+        metric = SimilarityMetric(metric).value
+        keys, scores = self._get_local(metric, pairs)
+        missing = [index for index, score in enumerate(scores) if score is None]
+        if missing and self.backend is not None:
+            self._promote(metric, keys, scores, missing, self.backend.get_many([keys[index] for index in missing]))
+        return scores
+
+    async def get_similarities_async(self, metric: str, pairs: list[tuple[str, str]]) -> list[Optional[float]]:
+        """Same as `get_similarities`, with the round-trip to the shared tier run in a thread."""
+        metric = SimilarityMetric(metric).value
+        keys, scores = self._get_local(metric, pairs)
+        missing = [index for index, score in enumerate(scores) if score is None]
+        if missing and self.backend is not None:
+            found = await asyncio.to_thread(self.backend.get_many, [keys[index] for index in missing])
+            self._promote(metric, keys, scores, missing, found)
+        return scores
+
+    def _set_local(self, metric: str, items: list[tuple[str, str, float]]) -> dict[str, float]:
+        """Store the scores in L1, and return them by key."""
+        scores = {self._generate_similarity_key(metric, text1, text2): float(score) for text1, text2, score in items}
+        for key, score in scores.items():
+            self.similarity_cache.set(key, score, tag=metric)
+        return scores
+
+    def set_similarities(self, metric: str, items: list[tuple[str, str, float]]):
+        """
+        Store the similarity scores of many pairs, with one round-trip to the shared tier.
+
+        The round-trip blocks: from the event loop, use `set_similarities_async`.
+        :param metric: Similarity metric of the scores
+        :param items: (text1, text2, score) triples
+        """
+        scores = self._set_local(SimilarityMetric(metric).value, items)
+        if self.backend is not None:
+            self.backend.set_many(scores)
+
+    async def set_similarities_async(self, metric: str, items: list[tuple[str, str, float]]):
+        """Same as `set_similarities`, with the round-trip to the shared tier run in a thread."""
+        scores = self._set_local(SimilarityMetric(metric).value, items)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.set_many, scores)
+
+    def stats(self) -> dict:
+        """Get hits, misses, evictions, and resident size of the cache, in total and per metric."""
+        stats = self.similarity_cache.stats()
+        stats["backend"] = self.backend.stats() if self.backend else None
+        return stats
+
+    def save_snapshot(self, path: str) -> int:
+        """
+        Write the unexpired L1 entries to a binary snapshot file, atomically replacing the previous one.
+        :param path: Snapshot file path
+        :return: Number of entries written
+        """
+        metrics = [metric.value for metric in SimilarityMetric]
+        entries = []
+        for key, score, _ in self.similarity_cache.items():
+            _, metric, hex1, hex2 = key.split(":")
+            entries.append(_SNAPSHOT_ENTRY.pack(metrics.index(metric), bytes.fromhex(hex1), bytes.fromhex(hex2), score))
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temporary_path, "wb") as file:
+            file.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, len(metrics)))
+            for metric in metrics:
+                name = metric.encode("utf-8")
+                file.write(_SNAPSHOT_NAME_LENGTH.pack(len(name)) + name)
+            file.write(_SNAPSHOT_COUNT.pack(len(entries)))
+            file.write(b"".join(entries))
+        os.replace(temporary_path, path)
+        return len(entries)
+
+    def load_snapshot(self, path: str) -> int:
+        """
+        Load the entries of a binary snapshot file into L1, keeping their recency order.
+        :param path: Snapshot file path
+        :return: Number of entries loaded
+        """
+        with open(path, "rb") as file:
+            data = file.read()
+
+        magic, version, metric_count = _SNAPSHOT_HEADER.unpack_from(data)
+        if magic != _SNAPSHOT_MAGIC or version != _SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported cache snapshot: magic={magic!r}, version={version}")
+
+        offset = _SNAPSHOT_HEADER.size
+        metrics = []
+        for _ in range(metric_count):
+            (length,) = _SNAPSHOT_NAME_LENGTH.unpack_from(data, offset)
+            offset += _SNAPSHOT_NAME_LENGTH.size
+            metrics.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+
+        (count,) = _SNAPSHOT_COUNT.unpack_from(data, offset)
+        offset += _SNAPSHOT_COUNT.size
+        for metric_index, digest1, digest2, score in _SNAPSHOT_ENTRY.iter_unpack(
+                data[offset:offset + count * _SNAPSHOT_ENTRY.size]):
+            metric = metrics[metric_index]
+            self.similarity_cache.set(self._format_similarity_key(metric, digest1, digest2), score, tag=metric)
+        return count
+
+    def close(self):
+        """Release the shared tier."""
+        if self.backend is not None:
+            self.backend.close()
@@ -0,0 +1,108 @@
+import time
+from collections import deque
+
+from app.models import CircuitState
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker refuses a call."""
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker over the recent outcomes of calls to a dependency.
+
+    - Closed: calls go through; when the failure rate of the last `window` calls reaches `failure_rate`
+      (over at least `minimum_calls` calls), the circuit opens
+    - Open: calls are refused immediately for `open_seconds`, then the circuit becomes half-open
+    - Half-open: up to `half_open_max_calls` trial calls go through; a success closes the circuit, a failure opens it.
+      Trials that never report an outcome (e.g. cancelled calls) are given up after `open_seconds`
+    """
+
+    def __init__(self, failure_rate: float = 0.5, minimum_calls: int = 5, window: int = 20, open_seconds: float = 30.0,
+                 half_open_max_calls: int = 1):
+        """
+        :param failure_rate: Failure rate of the recent calls that opens the circuit
+        :param minimum_calls: Minimum number of recent calls before the failure rate is considered
+        :param window: Number of recent calls the failure rate is computed on
+        :param open_seconds: Seconds calls are refused once the circuit opens
+        :param half_open_max_calls: Number of concurrent trial calls allowed in the half-open state
+        """
+        self.failure_rate = failure_rate
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = CircuitState.CLOSED
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._trial_started_at = 0.0
+
+        self.rejected_count = 0
+        self.opened_count = 0
+
+    @property
+    def state(self) -> CircuitState:
+        """Current state, an open circuit becoming half-open once `open_seconds` have passed."""
+        if self._state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self.half_open()
+        return self._state
+
+    def _open(self):
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_calls = 0
+        self.opened_count += 1
+
+    def half_open(self):
+        """Allow trial calls, e.g. when the dependency answers again before `open_seconds` have passed."""
+        if self._state == CircuitState.OPEN:
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_calls = 0
+
+    def allow_request(self) -> bool:
+        """Whether a call may go through now. An allowed call must then report `record_success` or `record_failure`."""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN:
+            now = time.monotonic()
+            if self._half_open_calls >= self.half_open_max_calls and now - self._trial_started_at >= self.open_seconds:
+                self._half_open_calls = 0
+            if self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                self._trial_started_at = now
+                return True
+        self.rejected_count += 1
+        return False
+
+    def record_success(self):
+        """Record a successful call."""
+        if self._state == CircuitState.HALF_OPEN:
+            self._state = CircuitState.CLOSED
+            self._outcomes.clear()
+        self._outcomes.append(True)
+
+    def record_failure(self):
+        """Record a failed call."""
+        if self._state == CircuitState.HALF_OPEN:
+            self._open()
+            return
+
+        self._outcomes.append(False)
+        failures = self._outcomes.count(False)
+        if (self._state == CircuitState.CLOSED and len(self._outcomes) >= self.minimum_calls
+                and failures / len(self._outcomes) >= self.failure_rate):
+            self._outcomes.clear()
+            self._open()
+
+    def stats(self) -> dict:
+        """Get the state, the recent failure rate, and the open / rejected counters."""
+        return {
+            "state": self.state.value,
+            "recent_calls": len(self._outcomes),
+            "recent_failure_rate": self._outcomes.count(False) / len(self._outcomes) if self._outcomes else None,
+            "opened": self.opened_count,
+            "rejected": self.rejected_count
+        }
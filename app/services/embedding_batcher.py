@@ -0,0 +1,119 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.services.executors import BoundedExecutor
+from app.utils.stats import RollingStats
+
+
+@dataclass
+class _PendingRequest:
+    texts: list[str]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class EmbeddingBatcher:
+    """
+    A micro-batching scheduler for sentence embeddings.
+
+    Texts submitted by concurrent coroutines are queued and encoded together in a single call.
+    The queue is flushed as soon as it holds `max_batch_size` texts, or when its oldest text has waited `max_wait_ms`.
+    """
+
+    def __init__(self, encode: Callable[[list[str]], np.ndarray], max_batch_size: int = 64, max_wait_ms: float = 5.0,
+                 executor: Optional[BoundedExecutor] = None):
+        """
+        :param encode: Blocking function embedding a list of texts, run in a worker thread
+        :param max_batch_size: Number of queued texts that triggers an immediate flush
+        :param max_wait_ms: Maximum time a text waits in the queue before a flush
+        :param executor: Executor running the encodes, the default thread pool of the event loop if None
+        """
+        self._encode = encode
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._pending: list[_PendingRequest] = []
+        self._pending_texts = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+
+        self.batch_sizes = RollingStats()
+        self.queue_waits = RollingStats()
+        self.encode_times = RollingStats()
+
+    async def encode(self, texts: list[str]) -> np.ndarray:
+        """
+        Embed texts as part of the next batch.
+        :param texts: Texts to embed
+        :return: One embedding row per text, in the order of the texts
+        """
+        loop = asyncio.get_running_loop()
+        request = _PendingRequest(list(texts), loop.create_future())
+        self._pending.append(request)
+        self._pending_texts += len(request.texts)
+
+        if self._pending_texts >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await request.future
+
+    def _flush(self):
+        """Hand the queued requests over to a single encode."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if not self._pending:
+            return
+
+        batch, self._pending, self._pending_texts = self._pending, [], 0
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[_PendingRequest]):
+        """Encode the texts of a batch once and dispatch the embeddings to the waiting coroutines."""
+        started = time.perf_counter()
+        for request in batch:
+            self.queue_waits.add(started - request.enqueued_at)
+
+        # Texts shared by several requests are encoded once
+        positions: dict[str, int] = {}
+        for request in batch:
+            for text in request.texts:
+                positions.setdefault(text, len(positions))
+        self.batch_sizes.add(len(positions))
+
+        try:
+            texts = list(positions)
+            embeddings = np.asarray(await self.executor.run(self._encode, texts) if self.executor is not None
+                                    else await asyncio.to_thread(self._encode, texts))
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        finally:
+            self.encode_times.add(time.perf_counter() - started)
+
+        for request in batch:
+            if not request.future.done():
+                request.future.set_result(embeddings[[positions[text] for text in request.texts]])
+
+    def stats(self) -> dict:
+        """Get batch-size, queue-wait, and encode-time statistics."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "pending_texts": self._pending_texts,
+            "batch_size": self.batch_sizes.summary(),
+            "queue_wait_ms": self.queue_waits.summary(scale=1000),
+            "encode_ms": self.encode_times.summary(scale=1000)
+        }
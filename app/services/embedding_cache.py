@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    An LRU memo of text embeddings, keyed by text digest.
+
+    Vectors live in one preallocated arena (a 2D NumPy array) and the memo only maps digests to arena rows,
+    so the memory footprint is fixed by the budget and no Python object is kept per vector.
+    """
+
+    def __init__(self, dimension: int, max_bytes: int, dtype: str = "float32"):
+        """
+        :param dimension: Embedding dimension
+        :param max_bytes: Memory budget of the arena in bytes
+        :param dtype: Storage type of the vectors, `float32` or `float16` to halve the footprint
+        """
+        self.dtype = np.dtype(dtype)
+        self.capacity = max(1, max_bytes // (dimension * self.dtype.itemsize))
+        self._arena = np.zeros((self.capacity, dimension), dtype=self.dtype)
+        self._slots: OrderedDict[bytes, int] = OrderedDict()
+        self._free_slots = list(range(self.capacity - 1, -1, -1))
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def dimension(self) -> int:
+        return self._arena.shape[1]
+
+    def get_many(self, digests: list[bytes]) -> tuple[np.ndarray, list[int]]:
+        """
+        Retrieve the embeddings of many texts.
+        :param digests: Text digests
+        :return: float32 embeddings (rows of the misses are zero) and the indices of the misses
+        """
+        embeddings = np.zeros((len(digests), self.dimension), dtype=np.float32)
+        missing = []
+        with self._lock:
+            for index, digest in enumerate(digests):
+                slot = self._slots.get(digest)
+                if slot is None:
+                    missing.append(index)
+                    continue
+                self._slots.move_to_end(digest)
+                embeddings[index] = self._arena[slot]
+
+            self.hits += len(digests) - len(missing)
+            self.misses += len(missing)
+        return embeddings, missing
+
+    def put_many(self, digests: list[bytes], embeddings: np.ndarray):
+        """Store the embeddings of many texts, evicting the least recently used ones when the arena is full."""
+        with self._lock:
+            for digest, embedding in zip(digests, embeddings):
+                slot = self._slots.get(digest)
+                if slot is None:
+                    if self._free_slots:
+                        slot = self._free_slots.pop()
+                    else:
+                        _, slot = self._slots.popitem(last=False)
+                        self.evictions += 1
+                    self._slots[digest] = slot
+                else:
+                    self._slots.move_to_end(digest)
+                self._arena[slot] = embedding
+
+    def stats(self) -> dict:
+        """Get the arena size and hit / miss / eviction counters."""
+        with self._lock:
+            return {
+                "dtype": self.dtype.name,
+                "dimension": self.dimension,
+                "capacity": self.capacity,
+                "entries": len(self._slots),
+                "bytes": self._arena.nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / (self.hits + self.misses) if self.hits + self.misses else None
+            }
@@ -0,0 +1,220 @@
+import argparse
+import fcntl
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.utils.hashing import DIGEST_SIZE
+
+# Index file layout (little-endian): header (magic, format version, dimension), then append-only records
+# (text digest, row of the vectors file)
+_INDEX_MAGIC = b"EMBS"
+_INDEX_VERSION = 1
+_INDEX_HEADER = struct.Struct("<4sHI")
+_INDEX_RECORD = struct.Struct(f"<{DIGEST_SIZE}sQ")
+
+_INDEX_FILE = "index.bin"
+_VECTORS_FILE = "vectors.f32"
+_LOCK_FILE = "store.lock"
+
+
+class EmbeddingStore:
+    """
+    An append-only on-disk store of float32 embeddings, shared by all the workers of a host.
+
+    Vectors are rows of a flat matrix file read through `numpy.memmap`, so every process reads them zero-copy from the
+    page cache. A digest -> row index is kept in an append-only log. Writers append under an exclusive file lock,
+    readers refresh under a shared one. The store only grows: `compact()` rewrites it with the most recently appended
+    rows, the only retention policy, since the in-process memo of a worker evicts entries other workers still use.
+    """
+
+    def __init__(self, directory: str, dimension: Optional[int] = None):
+        """
+        :param directory: Directory of the store files, created if missing
+        :param dimension: Embedding dimension, required to create a new store, checked against an existing one
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._index_path = self.directory / _INDEX_FILE
+        self._vectors_path = self.directory / _VECTORS_FILE
+        self._lock_path = self.directory / _LOCK_FILE
+
+        self._lock = threading.Lock()
+        self._rows: dict[bytes, int] = {}
+        self._index_inode: Optional[int] = None
+        self._index_offset = 0
+        self._vectors: Optional[np.memmap] = None
+
+        with self._file_lock(fcntl.LOCK_EX):
+            if not self._index_path.exists():
+                if dimension is None:
+                    raise ValueError(f"Embedding store not found in {directory} and no dimension to create it")
+                with open(self._index_path, "wb") as file:
+                    file.write(_INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, dimension))
+                self._vectors_path.touch()
+
+            self.dimension = self._read_dimension()
+            if dimension is not None and dimension != self.dimension:
+                raise ValueError(f"Embedding store dimension is {self.dimension}, expected {dimension}")
+            self._refresh()
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return (Path(directory) / _INDEX_FILE).exists()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @contextmanager
+    def _file_lock(self, operation: int):
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_dimension(self) -> int:
+        with open(self._index_path, "rb") as file:
+            magic, version, dimension = _INDEX_HEADER.unpack(file.read(_INDEX_HEADER.size))
+        if magic != _INDEX_MAGIC or version != _INDEX_VERSION:
+            raise ValueError(f"Unsupported embedding store: magic={magic!r}, version={version}")
+        return dimension
+
+    def _refresh(self):
+        """Apply the index records appended by any process since the last refresh and remap the vectors."""
+        inode = os.stat(self._index_path).st_ino
+        if inode != self._index_inode:
+            # The files were rewritten by a compaction
+            self._rows, self._index_inode, self._index_offset = {}, inode, _INDEX_HEADER.size
+            self._vectors = None
+
+        with open(self._index_path, "rb") as file:
+            file.seek(self._index_offset)
+            data = file.read()
+        data = data[:len(data) - len(data) % _INDEX_RECORD.size]
+        for digest, row in _INDEX_RECORD.iter_unpack(data):
+            self._rows[digest] = row
+        self._index_offset += len(data)
+
+        row_count = os.path.getsize(self._vectors_path) // (self.dimension * 4)
+        if row_count and (self._vectors is None or self._vectors.shape[0] != row_count):
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(row_count, self.dimension))
+
+    def _lookup(self, digests: list[bytes], indices: list[int], embeddings: np.ndarray) -> list[int]:
+        """Copy the stored rows of the digests at `indices` into `embeddings`, returning the indices not found."""
+        missing = []
+        for index in indices:
+            row = self._rows.get(digests[index])
+            if row is None or self._vectors is None or row >= self._vectors.shape[0]:
+                missing.append(index)
+            else:
+                embeddings[index] = self._vectors[row]
+        return missing
+
+    def get_many(self, digests: list[bytes]) -> tuple[np.ndarray, list[int]]:
+        """
+        Retrieve the embeddings of many texts.
+        :param digests: Text digests
+        :return: float32 embeddings (rows of the misses are zero) and the indices of the misses
+        """
+        embeddings = np.zeros((len(digests), self.dimension), dtype=np.float32)
+        with self._lock:
+            missing = self._lookup(digests, list(range(len(digests))), embeddings)
+            if missing:
+                # Other workers may have appended them since the last refresh
+                with self._file_lock(fcntl.LOCK_SH):
+                    self._refresh()
+                missing = self._lookup(digests, missing, embeddings)
+        return embeddings, missing
+
+    def append_many(self, digests: list[bytes], embeddings: np.ndarray) -> int:
+        """
+        Append the embeddings of texts not stored yet.
+        :param digests: Text digests
+        :param embeddings: Embeddings, one row per digest
+        :return: Number of rows appended
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._refresh()
+            positions = {}
+            for index, digest in enumerate(digests):
+                if digest not in self._rows:
+                    positions.setdefault(digest, index)
+            if not positions:
+                return 0
+
+            first_row = os.path.getsize(self._vectors_path) // (self.dimension * 4)
+            # Vectors first, so that no index record ever points past the end of the vectors file
+            with open(self._vectors_path, "ab") as file:
+                file.write(embeddings[list(positions.values())].tobytes())
+            with open(self._index_path, "ab") as file:
+                file.write(b"".join(
+                    _INDEX_RECORD.pack(digest, first_row + offset) for offset, digest in enumerate(positions)
+                ))
+            self._refresh()
+            return len(positions)
+
+    def compact(self, max_rows: int) -> int:
+        """
+        Rewrite the store with its most recently appended rows only.
+        :param max_rows: Number of rows kept
+        :return: Number of rows reclaimed
+        """
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._refresh()
+            total_rows = self._vectors.shape[0] if self._vectors is not None else 0
+            live = sorted(self._rows.items(), key=lambda item: item[1])
+            live = live[max(0, len(live) - max_rows):]
+
+            vectors_path = self._vectors_path.with_name(f"{_VECTORS_FILE}.tmp")
+            index_path = self._index_path.with_name(f"{_INDEX_FILE}.tmp")
+            with open(vectors_path, "wb") as file:
+                if live:
+                    file.write(np.ascontiguousarray(self._vectors[[row for _, row in live]]).tobytes())
+            with open(index_path, "wb") as file:
+                file.write(_INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, self.dimension))
+                file.write(b"".join(_INDEX_RECORD.pack(digest, row) for row, (digest, _) in enumerate(live)))
+
+            # Readers hold a shared lock while refreshing, and remap the vectors when the index is replaced
+            os.replace(vectors_path, self._vectors_path)
+            os.replace(index_path, self._index_path)
+            self._refresh()
+            return total_rows - len(live)
+
+    def stats(self) -> dict:
+        """Get the entry and row counts of the store."""
+        with self._lock:
+            rows = self._vectors.shape[0] if self._vectors is not None else 0
+            return {
+                "directory": str(self.directory),
+                "dimension": self.dimension,
+                "entries": len(self._rows),
+                "rows": rows,
+                "bytes": rows * self.dimension * 4
+            }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain an embedding store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="Keep the most recently appended rows only")
+    compact_parser.add_argument("directory", help="Directory of the embedding store")
+    compact_parser.add_argument("--max-rows", type=int, required=True,
+                                help="Keep at most this many rows, the most recently appended ones")
+    subparsers.add_parser("stats", help="Show the entry and row counts").add_argument(
+        "directory", help="Directory of the embedding store")
+    args = parser.parse_args()
+
+    store = EmbeddingStore(args.directory)
+    if args.command == "compact":
+        reclaimed = store.compact(max_rows=args.max_rows)
+        print(f"Reclaimed {reclaimed} rows, {len(store)} entries left")
+    else:
+        print(store.stats())
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional, TypeVar
+
+import torch
+from threadpoolctl import threadpool_limits
+
+from app.utils.config import settings
+from app.utils.stats import RollingStats
+
+Result = TypeVar("Result")
+
+
+class ExecutorBusy(Exception):
+    """Raised when an executor already has its maximum of waiting tasks."""
+
+
+@dataclass(frozen=True)
+class ThreadLayout:
+    """
+    Threads of a worker process: executor threads per metric class, torch intra-op threads and BLAS threads.
+
+    The CPU cores are divided among the worker processes, then between the lexical pool (executor threads times BLAS
+    threads) and the semantic pool (executor threads times torch threads) of a worker, so that the workers together
+    run about one thread per core with both pools busy, instead of each running one thread per core in every pool.
+    """
+    lexical_threads: int
+    semantic_threads: int
+    torch_threads: int
+    blas_threads: int
+
+    @classmethod
+    def for_workers(cls, workers: int, lexical_threads: int = 0, semantic_threads: int = 1, torch_threads: int = 0,
+                    blas_threads: int = 0, cpu_count: Optional[int] = None) -> "ThreadLayout":
+        """
+        Derive the threads of each of `workers` processes, 0 meaning derived from the cores of a worker.
+
+        Half the cores of a worker go to the semantic pool, the others to the lexical pool. With fewer than two cores
+        per worker, each pool still gets one thread.
+        :param workers: Number of worker processes, e.g. WEB_CONCURRENCY
+        :param lexical_threads: Threads of the TF-IDF, Jaccard and MinHash executor (default: the lexical cores)
+        :param semantic_threads: Threads of the semantic model executor (default: 1, torch parallelizes each batch)
+        :param torch_threads: Torch intra-op threads (default: the semantic cores per semantic thread)
+        :param blas_threads: BLAS and OpenMP threads (default: the lexical cores per lexical thread)
+        :param cpu_count: Number of cores (default: `os.cpu_count()`)
+        """
+        cores = max(1, (cpu_count or os.cpu_count() or 1) // max(1, workers))
+        semantic_cores = max(1, cores // 2)
+        lexical_cores = max(1, cores - semantic_cores)
+        lexical_threads = lexical_threads or lexical_cores
+        semantic_threads = semantic_threads or 1
+        return cls(
+            lexical_threads=lexical_threads,
+            semantic_threads=semantic_threads,
+            torch_threads=torch_threads or max(1, semantic_cores // semantic_threads),
+            blas_threads=blas_threads or max(1, lexical_cores // lexical_threads)
+        )
+
+    @classmethod
+    def from_settings(cls, workers: int) -> "ThreadLayout":
+        """Derive the threads of each of `workers` processes from the executor, torch and BLAS thread settings."""
+        return cls.for_workers(
+            workers,
+            lexical_threads=settings.SIMILARITY_EXECUTOR_THREADS,
+            semantic_threads=settings.SEMANTIC_EXECUTOR_THREADS,
+            torch_threads=settings.TORCH_NUM_THREADS,
+            blas_threads=settings.BLAS_NUM_THREADS
+        )
+
+    def apply(self):
+        """Set the torch and BLAS thread counts of this process, e.g. in each worker after forking."""
+        torch.set_num_threads(self.torch_threads)
+        threadpool_limits(limits=self.blas_threads)
+
+
+class BoundedExecutor:
+    """
+    A thread pool with a bounded queue, for the CPU-bound work of a class of metrics.
+
+    Work runs off the event loop, on a fixed number of threads. When the threads are busy and `max_queue` tasks are
+    already waiting, new tasks are refused with `ExecutorBusy` rather than queued behind an ever-growing backlog.
+    """
+
+    def __init__(self, name: str, threads: int, max_queue: int = 64):
+        """
+        :param name: Executor name, for thread names and logs
+        :param threads: Number of tasks run at once
+        :param max_queue: Maximum number of waiting tasks
+        """
+        self.name = name
+        self.threads = threads
+        self.max_queue = max_queue
+        # Threads are started on the first tasks, so that an executor created before forking is fork-safe
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"{name}-executor")
+        self._pending = 0
+
+        self.queue_waits = RollingStats()
+        self.run_times = RollingStats()
+        self.submitted_count = 0
+        self.rejected_count = 0
+
+    async def run(self, function: Callable[..., Result], *args, admitted: bool = False) -> Result:
+        """
+        Run a blocking function on the executor.
+        :param function: Function to run
+        :param args: Arguments of the function
+        :param admitted: Whether the task continues work already admitted, e.g. the next block of a streamed
+            response: it is queued even when the executor is busy, rather than failing half-way through
+        :return: The result of the function
+        :raises ExecutorBusy: If `max_queue` tasks are already waiting
+        """
+        if not admitted and self._pending >= self.threads + self.max_queue:
+            self.rejected_count += 1
+            raise ExecutorBusy(f"The {self.name} executor is busy, retry later")
+
+        self._pending += 1
+        self.submitted_count += 1
+        submitted = time.perf_counter()
+        started = None
+
+        def call() -> Result:
+            nonlocal started
+            started = time.perf_counter()
+            return function(*args)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            self._pending -= 1
+            if started is not None:
+                self.queue_waits.add(started - submitted)
+                self.run_times.add(time.perf_counter() - started)
+
+    def close(self):
+        """Stop the threads once the running tasks are done."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        """Get queue depth, wait and run times, and task counters."""
+        return {
+            "threads": self.threads,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "queue_wait_ms": self.queue_waits.summary(scale=1000),
+            "run_ms": self.run_times.summary(scale=1000),
+            "submitted": self.submitted_count,
+            "rejected": self.rejected_count
+        }
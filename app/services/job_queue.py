@@ -0,0 +1,161 @@
+import asyncio
+import itertools
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from app.models import JobStatus, LLMResponseSource
+from app.utils.stats import RollingStats
+
+# A job produces the LLM response and where it comes from
+JobFunction = Callable[[], Awaitable[tuple[Optional[str], Optional[LLMResponseSource]]]]
+
+
+@dataclass
+class Job:
+    id: str
+    priority: int
+    function: Optional[JobFunction]
+    status: JobStatus = JobStatus.QUEUED
+    created_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[str] = None
+    source: Optional[LLMResponseSource] = None
+    error: Optional[str] = None
+
+
+class LLMJobQueue:
+    """
+    A bounded priority queue of LLM generations, run by a fixed pool of asyncio workers.
+
+    Requests get a job id right away instead of holding their connection during the generation, and poll for the
+    result. Higher priorities run first, in submission order within a priority. When `max_size` jobs are waiting,
+    new jobs are refused (backpressure) rather than queued behind an ever-growing backlog.
+    """
+
+    def __init__(self, workers: int = 4, max_size: int = 1000, result_ttl_seconds: float = 3600.0,
+                 max_retained_jobs: int = 100_000):
+        """
+        :param workers: Number of jobs run at once
+        :param max_size: Maximum number of waiting jobs
+        :param result_ttl_seconds: Seconds a finished job can be polled
+        :param max_retained_jobs: Maximum number of jobs kept for polling, the oldest finished ones are dropped first
+        """
+        self.workers = workers
+        self.max_size = max_size
+        self.result_ttl_seconds = result_ttl_seconds
+        self.max_retained_jobs = max_retained_jobs
+
+        self._queue: asyncio.PriorityQueue[tuple[int, int, str]] = asyncio.PriorityQueue(maxsize=max_size)
+        self._sequence = itertools.count()
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._tasks: list[asyncio.Task] = []
+        self._started_at: Optional[float] = None
+        self._busy = 0
+        self._busy_seconds = 0.0
+        self._pruned_at = 0.0
+
+        self.queue_waits = RollingStats()
+        self.run_times = RollingStats()
+        self.submitted_count = 0
+        self.rejected_count = 0
+        self.failed_count = 0
+
+    async def start(self):
+        """Start the workers."""
+        if not self._tasks:
+            self._started_at = time.monotonic()
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Stop the workers, abandoning the running and waiting jobs."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _prune(self):
+        """Drop the finished jobs past their TTL, and the oldest finished jobs beyond `max_retained_jobs`."""
+        now = time.monotonic()
+        excess = len(self._jobs) - self.max_retained_jobs
+        # Scanning the jobs is linear, so it is done at most once per second unless there are too many jobs
+        if excess <= 0 and now - self._pruned_at < 1.0:
+            return
+        self._pruned_at = now
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and (excess > 0 or now - job.finished_at >= self.result_ttl_seconds):
+                del self._jobs[job_id]
+                excess -= 1
+
+    def submit(self, function: JobFunction, priority: int = 0) -> Job:
+        """
+        Queue a generation.
+        :param function: Coroutine function generating the response
+        :param priority: Higher priorities run first
+        :return: The queued job
+        :raises asyncio.QueueFull: If `max_size` jobs are already waiting
+        """
+        self._prune()
+        job = Job(id=uuid.uuid4().hex, priority=priority, function=function)
+        try:
+            self._queue.put_nowait((-priority, next(self._sequence), job.id))
+        except asyncio.QueueFull:
+            self.rejected_count += 1
+            raise
+        self._jobs[job.id] = job
+        self.submitted_count += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Get a job by id, or None if unknown or expired."""
+        job = self._jobs.get(job_id)
+        if job is not None and job.finished_at is not None \
+                and time.monotonic() - job.finished_at >= self.result_ttl_seconds:
+            return None
+        return job
+
+    async def _work(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None:
+                self._queue.task_done()
+                continue
+
+            job.status, job.started_at = JobStatus.RUNNING, time.monotonic()
+            self.queue_waits.add(job.started_at - job.created_at)
+            self._busy += 1
+            try:
+                job.result, job.source = await job.function()
+                job.status = JobStatus.SUCCEEDED
+            except Exception as e:
+                print(f"LLM job {job.id} failed: {e}")
+                job.status, job.error = JobStatus.FAILED, str(e)
+                self.failed_count += 1
+            finally:
+                job.finished_at = time.monotonic()
+                job.function = None
+                self._busy -= 1
+                self._busy_seconds += job.finished_at - job.started_at
+                self.run_times.add(job.finished_at - job.started_at)
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        """Get queue depth, worker utilization, wait and run times, and job counters."""
+        uptime = time.monotonic() - self._started_at if self._started_at is not None else 0.0
+        return {
+            "depth": self._queue.qsize(),
+            "max_size": self.max_size,
+            "workers": self.workers,
+            "busy_workers": self._busy,
+            "utilization": self._busy_seconds / (self.workers * uptime) if uptime else None,
+            "queue_wait_ms": self.queue_waits.summary(scale=1000),
+            "run_ms": self.run_times.summary(scale=1000),
+            "submitted": self.submitted_count,
+            "rejected": self.rejected_count,
+            "failed": self.failed_count,
+            "retained_jobs": len(self._jobs)
+        }
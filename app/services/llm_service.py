@@ -1,65 +1,259 @@
 import asyncio
-from typing import Optional
+import json
+import time
+from typing import AsyncIterator, Optional
 
 import httpx
 
+from app.models import CircuitState, LLMResponseSource
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.hashing import text_digest
+from app.utils.lru_cache import LRUCache
+from app.utils.stats import RollingStats
+
+
+class LLMStreamInterrupted(Exception):
+    """Raised when a streamed generation fails after its first chunk, leaving the response incomplete."""
+
 
 class LLMService:
-    def __init__(self, base_url: str, model: str, timeout: float, max_retries: int, temperature: float):
+    def __init__(self, base_url: str, model: str, timeout: float, max_retries: int, temperature: float,
+                 max_connections: int = 10, max_keepalive_connections: int = 10, keepalive_expiry: float = 30.0,
+                 max_concurrent_generations: int = 4, response_cache_entries: int = 1000,
+                 response_cache_ttl_seconds: Optional[float] = 3600.0, circuit_breaker: Optional[CircuitBreaker] = None,
+                 probe_interval_seconds: float = 10.0):
+        """
+        :param max_connections: Maximum number of connections of the HTTP client pool
+        :param max_keepalive_connections: Maximum number of idle connections kept alive
+        :param keepalive_expiry: Seconds an idle connection is kept alive
+        :param max_concurrent_generations: Maximum number of generations sent to the LLM at once, the others wait
+        :param response_cache_entries: Maximum number of cached responses
+        :param response_cache_ttl_seconds: Lifetime of a cached response (no expiry if None)
+        :param circuit_breaker: Circuit breaker of the generations (default thresholds if None)
+        :param probe_interval_seconds: Seconds between background availability probes once started (0 disables them)
+        """
         self.base_url = base_url
         self.model = model
         self.timeout = timeout
         self.max_retries = max_retries
         self.temperature = temperature
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.max_concurrent_generations = max_concurrent_generations
 
-    async def is_available(self) -> bool:
-        """Check if LLM service is available."""
+        self._client: Optional[httpx.AsyncClient] = None
+        self._generation_slots = asyncio.Semaphore(max_concurrent_generations)
+        self._in_flight = 0
+        self._waiting = 0
+        self.slot_waits = RollingStats()
+        self.generation_times = RollingStats()
+
+        self.response_cache = LRUCache(max_entries=response_cache_entries, ttl_seconds=response_cache_ttl_seconds)
+        self._generations: dict[str, asyncio.Task] = {}
+        self.coalesced_count = 0
+
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.probe_interval_seconds = probe_interval_seconds
+        self._prober: Optional[asyncio.Task] = None
+        self._available: Optional[bool] = None
+        self._checked_at: Optional[float] = None
+
+    async def start(self):
+        """
+        Open the HTTP client shared by all requests, keeping connections to the LLM alive between them,
+        and start probing the availability of the LLM in the background.
+        """
+        await self._get_client()
+        if self._prober is None and self.probe_interval_seconds:
+            self._prober = asyncio.create_task(self._probe_periodically())
+
+    async def close(self):
+        """Stop the availability prober, and close the HTTP client and its connections."""
+        if self._prober is not None:
+            self._prober.cancel()
+            try:
+                await self._prober
+            except asyncio.CancelledError:
+                pass
+            self._prober = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    @property
+    def circuit_state(self) -> CircuitState:
+        return self.circuit_breaker.state
+
+    async def _acquire_generation_slot(self):
+        """Wait for a generation slot, so that at most `max_concurrent_generations` requests reach the LLM."""
+        waiting_since = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._generation_slots.acquire()
+        finally:
+            self._waiting -= 1
+        self.slot_waits.add(time.perf_counter() - waiting_since)
+        self._in_flight += 1
+
+    def _release_generation_slot(self, started: float):
+        self._in_flight -= 1
+        self._generation_slots.release()
+        self.generation_times.add(time.perf_counter() - started)
+
+    async def _probe(self) -> bool:
+        """Check if LLM service is available, and remember the result."""
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{self.base_url}/api/tags")
-                return response.status_code == 200
+            client = await self._get_client()
+            response = await client.get("/api/tags", timeout=5.0)
+            available = response.status_code == 200
         except Exception as e:
             print(f"LLM service not available: {e}")
-            return False
+            available = False
+
+        self._available, self._checked_at = available, time.monotonic()
+        # The LLM answers again: let trial generations through without waiting for the end of the open period
+        if available and self.circuit_breaker.state == CircuitState.OPEN:
+            self.circuit_breaker.half_open()
+        return available
+
+    async def _probe_periodically(self):
+        while True:
+            await self._probe()
+            await asyncio.sleep(self.probe_interval_seconds)
+
+    async def is_available(self) -> bool:
+        """Check if LLM service is available, from the last background probe when the prober runs."""
+        if self._prober is not None and self._available is not None:
+            return self._available
+        return await self._probe()
 
     async def generate_response(self, prompt: str) -> Optional[str]:
         """
         Generate response from LLM for the given prompt.
         :param prompt: The input prompt for LLM
-        :return: Generated response or None if failed
+        :return: Generated response or None if failed, immediately if the circuit is open
         """
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                payload = {
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": self.temperature
-                    }
+            return await self._generate(prompt)
+        except CircuitOpenError:
+            return None
+
+    async def _generate(self, prompt: str) -> Optional[str]:
+        """
+        Generate response from LLM for the given prompt, telling a refusal of the circuit breaker from a failure.
+        :raises CircuitOpenError: If the circuit breaker refuses the call, open or with its half-open trials taken
+        """
+        if not self.circuit_breaker.allow_request():
+            print("LLM circuit open, not calling LLM")
+            raise CircuitOpenError("LLM circuit open")
+
+        try:
+            client = await self._get_client()
+            payload = {
+                "model": self.model,
+                "prompt": prompt,
+                "stream": False,
+                "options": {
+                    "temperature": self.temperature
                 }
+            }
 
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json=payload
-                )
+            await self._acquire_generation_slot()
+            started = time.perf_counter()
+            try:
+                response = await client.post("/api/generate", json=payload)
+            finally:
+                self._release_generation_slot(started)
 
-                if response.status_code != 200:
-                    print(f"LLM API error: {response.status_code} - {response.text}")
-                    return None
+            if response.status_code != 200:
+                print(f"LLM API error: {response.status_code} - {response.text}")
+                self.circuit_breaker.record_failure()
+                return None
 
-                result = response.json()
-                return result.get("response", "").strip();
-        except TimeoutError:
+            result = response.json()
+            self.circuit_breaker.record_success()
+            return result.get("response", "").strip()
+        except (TimeoutError, httpx.TimeoutException):
             print("LLM request timeout")
+            self.circuit_breaker.record_failure()
             return None
         except Exception as e:
             print(f"Error calling LLM: {e}")
+            self.circuit_breaker.record_failure()
             return None
 
+    async def generate_response_stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Generate response from LLM for the given prompt, yielding the text chunks as the LLM produces them.
+
+        Uses the streaming API of the LLM (one JSON object per line) over the shared client's connections.
+        :param prompt: The input prompt for LLM
+        :return: Async iterator of response chunks, empty if failed before the first chunk or if the circuit is open
+        :raises LLMStreamInterrupted: If the generation fails after the first chunk
+        """
+        if not self.circuit_breaker.allow_request():
+            print("LLM circuit open, not calling LLM")
+            return
+
+        streamed = False
+        try:
+            client = await self._get_client()
+            payload = {
+                "model": self.model,
+                "prompt": prompt,
+                "stream": True,
+                "options": {
+                    "temperature": self.temperature
+                }
+            }
+
+            await self._acquire_generation_slot()
+            started = time.perf_counter()
+            try:
+                async with client.stream("POST", "/api/generate", json=payload) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        print(f"LLM API error: {response.status_code} - {response.text}")
+                        self.circuit_breaker.record_failure()
+                        return
+
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("response"):
+                            yield chunk["response"]
+                            streamed = True
+                        if chunk.get("done"):
+                            break
+                    self.circuit_breaker.record_success()
+            finally:
+                self._release_generation_slot(started)
+        except (TimeoutError, httpx.TimeoutException) as e:
+            print("LLM request timeout")
+            self.circuit_breaker.record_failure()
+            if streamed:
+                raise LLMStreamInterrupted("LLM request timeout") from e
+        except Exception as e:
+            print(f"Error calling LLM: {e}")
+            self.circuit_breaker.record_failure()
+            if streamed:
+                raise LLMStreamInterrupted(f"Error calling LLM: {e}") from e
+
     async def generate_response_with_retry(self, prompt: str, retries: Optional[int] = None) -> Optional[str]:
         """
         Generate response with retry logic.
+
+        Gives up without waiting for the next attempt when the circuit is open or refuses the call (half-open with
+        its trials taken), instead of holding the request in backoff sleeps while the LLM is down.
         :param prompt: The input prompt for LLM
         :param retries: Number of retries on failure (uses service default if None)
         :return: Generated response or None if failed
@@ -69,15 +263,69 @@ class LLMService:
 
         for attempt in range(retries):
             try:
-                response = await self.generate_response(prompt)
+                response = await self._generate(prompt)
                 if response:
                     return response
-
-                if attempt < retries:
-                    print(f"Retrying... Attempt {attempt + 1}/{retries}")
-                    await asyncio.sleep(2 ** attempt)  # exponential backoff
+            except CircuitOpenError:
+                return None
             except Exception as e:
                 print(f"Attempt {attempt + 1} failed: {e}")
-                if attempt < retries:
-                    await asyncio.sleep(2 ** attempt)  # exponential backoff
+
+            if attempt + 1 >= retries or self.circuit_breaker.state == CircuitState.OPEN:
+                break
+            print(f"Retrying... Attempt {attempt + 1}/{retries}")
+            await asyncio.sleep(2 ** attempt)  # exponential backoff
         return None
+
+    def _response_key(self, prompt: str) -> str:
+        """Cache key of a response: the model and temperature change the response as much as the prompt."""
+        return f"llm:{self.model}:{self.temperature}:{text_digest(prompt).hex()}"
+
+    async def _generate_and_cache(self, key: str, prompt: str, retries: Optional[int]) -> Optional[str]:
+        response = await self.generate_response_with_retry(prompt, retries)
+        if response:
+            self.response_cache.set(key, response, tag="llm")
+        return response
+
+    async def generate_response_cached(self, prompt: str,
+                                       retries: Optional[int] = None) -> tuple[Optional[str], LLMResponseSource]:
+        """
+        Generate response from LLM with retry logic, reusing cached and in-flight responses for the same prompt.
+
+        Concurrent calls with the same prompt share one generation, which runs in its own task so that it completes
+        for the others even if the caller that started it is cancelled. Failed generations are not cached.
+        :param prompt: The input prompt for LLM
+        :param retries: Number of retries on failure (uses service default if None)
+        :return: Generated response or None if failed, and where the response comes from
+        """
+        key = self._response_key(prompt)
+        response = self.response_cache.get(key, tag="llm")
+        if response is not None:
+            return response, LLMResponseSource.CACHE
+
+        generation = self._generations.get(key)
+        if generation is not None:
+            self.coalesced_count += 1
+            return await asyncio.shield(generation), LLMResponseSource.COALESCED
+
+        generation = asyncio.create_task(self._generate_and_cache(key, prompt, retries))
+        self._generations[key] = generation
+        generation.add_done_callback(lambda _: self._generations.pop(key, None))
+        return await asyncio.shield(generation), LLMResponseSource.LLM
+
+    def stats(self) -> dict:
+        """Get connection-pool limits, in-flight and waiting generations, timings, cache, and circuit statistics."""
+        return {
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "max_concurrent_generations": self.max_concurrent_generations,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "slot_wait_ms": self.slot_waits.summary(scale=1000),
+            "generation_ms": self.generation_times.summary(scale=1000),
+            "response_cache": self.response_cache.stats(),
+            "coalesced": self.coalesced_count,
+            "circuit_breaker": self.circuit_breaker.stats(),
+            "available": self._available,
+            "checked_seconds_ago": time.monotonic() - self._checked_at if self._checked_at is not None else None
+        }
@@ -0,0 +1,219 @@
+import zlib
+from collections import defaultdict
+from typing import Hashable, Optional
+
+import numpy as np
+
+from app.utils.hashing import text_digest
+from app.utils.lru_cache import LRUCache
+
+# Signature of a text without shingles, never equal to a signature of a non-empty text in practice
+_EMPTY_VALUE = np.uint32(2 ** 32 - 1)
+
+
+class MinHasher:
+    """
+    MinHash signatures approximating the Jaccard similarity of shingle sets.
+
+    Each shingle is hashed once to 32 bits (CRC32, stable across processes), then all the permutations are applied
+    at once with NumPy as multiply-shift hashes `(a * h + b) mod 2^64 >> 32`. A signature is the fixed-size uint32
+    vector of the per-permutation minima, and the fraction of equal components estimates the Jaccard similarity.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle: str = "word", shingle_size: int = 1, seed: int = 1,
+                 cache_entries: int = 10_000, chunk_size: int = 65536):
+        """
+        :param num_perm: Number of permutations, i.e. signature length (estimation error ~ 1 / sqrt(num_perm))
+        :param shingle: `word` for word n-grams (1-grams give the sets of `jaccard_similarity`), `char` for character
+            n-grams, more robust to punctuation and typos
+        :param shingle_size: Number of words or characters per shingle
+        :param seed: Random seed of the permutations, signatures are only comparable with the same seed
+        :param cache_entries: Maximum number of signatures cached per text
+        :param chunk_size: Maximum number of shingles hashed at once
+        """
+        if shingle not in ("word", "char"):
+            raise ValueError(f"Unknown shingle type: {shingle}")
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self.shingle_size = shingle_size
+        self.chunk_size = chunk_size
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._signatures = LRUCache(max_entries=cache_entries)
+
+    def shingles(self, text: str) -> set[str]:
+        """Get the shingle set of a text."""
+        if self.shingle == "word":
+            words = text.lower().split()
+            if self.shingle_size == 1:
+                return set(words)
+            return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+        text = " ".join(text.lower().split())
+        if len(text) <= self.shingle_size:
+            return {text} if text else set()
+        return {text[i:i + self.shingle_size] for i in range(len(text) - self.shingle_size + 1)}
+
+    def _compute_signatures(self, texts: list[str]) -> np.ndarray:
+        signatures = np.full((len(texts), self.num_perm), _EMPTY_VALUE, dtype=np.uint32)
+        hashes = [
+            np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in self.shingles(text)), dtype=np.uint64)
+            for text in texts
+        ]
+
+        # Hash the shingles of many texts at once, in bounded chunks, then reduce per text
+        start = 0
+        while start < len(texts):
+            stop, total = start, 0
+            while stop < len(texts) and (stop == start or total + hashes[stop].shape[0] <= self.chunk_size):
+                total += hashes[stop].shape[0]
+                stop += 1
+
+            lengths = np.array([hashes[index].shape[0] for index in range(start, stop)])
+            if total:
+                values = (self._a[:, None] * np.concatenate(hashes[start:stop])[None, :] + self._b[:, None]) >> 32
+                non_empty = np.flatnonzero(lengths)
+                offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))[non_empty]
+                signatures[start + non_empty] = np.minimum.reduceat(values, offsets, axis=1).T.astype(np.uint32)
+            start = stop
+
+        return signatures
+
+    def signatures(self, texts: list[str]) -> np.ndarray:
+        """
+        Get the MinHash signatures of texts, from the cache when possible.
+        :param texts: Texts to sign
+        :return: uint32 signatures, one row per text
+        """
+        digests = [text_digest(text) for text in texts]
+        rows = [self._signatures.get(digest, tag="minhash") for digest in digests]
+        missing = [index for index, row in enumerate(rows) if row is None]
+        if missing:
+            for index, signature in zip(missing, self._compute_signatures([texts[index] for index in missing])):
+                rows[index] = signature
+                self._signatures.set(digests[index], signature, tag="minhash")
+        return np.stack(rows) if rows else np.empty((0, self.num_perm), dtype=np.uint32)
+
+    @staticmethod
+    def estimate_jaccard(signatures1: np.ndarray, signatures2: np.ndarray) -> np.ndarray:
+        """
+        Estimate the Jaccard similarity of signature pairs (rows of the same index).
+
+        As in `jaccard_similarity`, a text without shingles is 0.0 similar to any text.
+        """
+        signatures1, signatures2 = np.atleast_2d(signatures1), np.atleast_2d(signatures2)
+        estimate = (signatures1 == signatures2).mean(axis=1)
+        empty = (signatures1 == _EMPTY_VALUE).all(axis=1) | (signatures2 == _EMPTY_VALUE).all(axis=1)
+        return np.where(empty, 0.0, estimate)
+
+
+def lsh_bands_for_threshold(num_perm: int, threshold: float) -> int:
+    """
+    Choose the number of LSH bands whose S-curve threshold (1 / bands) ^ (rows / num_perm) is closest to `threshold`.
+
+    Only bands dividing `num_perm` are considered, so that every signature component is used.
+    """
+    candidates = [bands for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(candidates, key=lambda bands: abs((1 / bands) ** (bands / num_perm) - threshold))
+
+
+class LSHIndex:
+    """
+    A locality-sensitive hashing index over MinHash signatures, for approximate Jaccard queries in sublinear time.
+
+    Signatures are cut into `bands` bands of `num_perm / bands` components, and each band is a bucket key.
+    Two texts become candidates when at least one band is identical, which happens with probability
+    1 - (1 - s^rows)^bands for a Jaccard similarity s.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32):
+        if num_perm % bands:
+            raise ValueError(f"Number of bands ({bands}) must divide the signature length ({num_perm})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        self._buckets: list[defaultdict[bytes, set[Hashable]]] = [defaultdict(set) for _ in range(bands)]
+        self._signatures: dict[Hashable, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def add(self, key: Hashable, signature: np.ndarray):
+        """Index a signature, replacing the previous one of the key."""
+        self.remove(key)
+        self._signatures[key] = signature
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            buckets[band_key].add(key)
+
+    def remove(self, key: Hashable) -> bool:
+        """Remove a signature, returning whether it was present."""
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return False
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket = buckets[band_key]
+            bucket.discard(key)
+            if not bucket:
+                del buckets[band_key]
+        return True
+
+    def candidates(self, signature: np.ndarray) -> set[Hashable]:
+        """Get the keys sharing at least one band with the signature."""
+        keys = set()
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            keys.update(buckets.get(band_key, ()))
+        return keys
+
+    def query(self, signature: np.ndarray, threshold: float = 0.0,
+              k: Optional[int] = None) -> list[tuple[Hashable, float]]:
+        """
+        Find the indexed signatures similar to a signature.
+        :param signature: Query signature
+        :param threshold: Minimum estimated Jaccard similarity
+        :param k: Maximum number of results (all if None)
+        :return: (key, estimated Jaccard similarity) pairs, most similar first
+        """
+        keys = list(self.candidates(signature))
+        if not keys:
+            return []
+        estimates = MinHasher.estimate_jaccard(np.stack([self._signatures[key] for key in keys]), signature[None, :])
+        results = sorted(
+            ((key, float(estimate)) for key, estimate in zip(keys, estimates) if estimate >= threshold),
+            key=lambda result: -result[1]
+        )
+        return results[:k] if k is not None else results
+
+
+def find_near_duplicates(minhasher: MinHasher, texts: list[str], threshold: float) -> list[list[int]]:
+    """
+    Group near-duplicate texts: texts whose estimated Jaccard similarity is at least `threshold`, transitively.
+    :param minhasher: MinHasher signing the texts
+    :param texts: Texts to deduplicate
+    :param threshold: Minimum estimated Jaccard similarity of duplicates
+    :return: Groups of at least two text indices, each sorted, ordered by first index
+    """
+    signatures = minhasher.signatures(texts)
+    index = LSHIndex(minhasher.num_perm, lsh_bands_for_threshold(minhasher.num_perm, threshold))
+    parents = list(range(len(texts)))
+
+    def find(node: int) -> int:
+        while parents[node] != node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+
+    for position, signature in enumerate(signatures):
+        for other, _ in index.query(signature, threshold):
+            parents[find(position)] = find(other)
+        index.add(position, signature)
+
+    groups: defaultdict[int, list[int]] = defaultdict(list)
+    for position in range(len(texts)):
+        groups[find(position)].append(position)
+    return sorted((group for group in groups.values() if len(group) > 1), key=lambda group: group[0])
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from typing import Callable, Generic, Optional, TypeVar
+
+from app.models import ModelState
+
+Model = TypeVar("Model")
+
+
+class ModelManager(Generic[Model]):
+    """
+    The lifecycle of a model: loaded once, on first use or preloaded at startup, then warmed up.
+
+    Loading and warm-up run in a worker thread, so that the event loop keeps serving other requests, behind a lock,
+    so that concurrent first uses load the model once: they all wait for the same load. Uses wait until the model is
+    ready, i.e. until the warm-up is done when preloading.
+    """
+
+    def __init__(self, name: str, load: Callable[[], Model], warm_up: Optional[Callable[[Model], None]] = None):
+        """
+        :param name: Model name, for logs
+        :param load: Blocking function loading the model
+        :param warm_up: Blocking function running the model on representative inputs, after a preload
+        """
+        self.name = name
+        self._load = load
+        self._warm_up = warm_up
+        self._model: Optional[Model] = None
+        self._lock = asyncio.Lock()
+
+        self.state = ModelState.NOT_LOADED
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warm_up_seconds: Optional[float] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == ModelState.READY
+
+    async def _load_model(self):
+        self.state = ModelState.LOADING
+        started = time.perf_counter()
+        try:
+            self._model = await asyncio.to_thread(self._load)
+        except Exception as e:
+            print(f"Failed to load {self.name}: {e}")
+            self.state, self.error = ModelState.FAILED, str(e)
+            return
+        self.load_seconds = time.perf_counter() - started
+        self.error = None
+        print(f"Loaded {self.name} in {self.load_seconds:.1f} s")
+
+    async def get(self) -> Optional[Model]:
+        """
+        Get the model, loading it if needed.
+        :return: The model, or None if it failed to load (loading is tried again on the next use)
+        """
+        if self.state == ModelState.READY:
+            return self._model
+
+        async with self._lock:
+            if self._model is None:
+                await self._load_model()
+            if self._model is not None:
+                self.state = ModelState.READY
+        return self._model
+
+    async def preload(self, warm_up: bool = True) -> bool:
+        """
+        Load the model and warm it up, e.g. at startup before accepting traffic.
+        :param warm_up: Whether to warm the model up. Without, the model is only loaded (`LOADED` state), and a later
+            preload warms it up, e.g. a pre-fork master process loads the model, and the forked workers warm it up
+        :return: Whether the model is loaded
+        """
+        async with self._lock:
+            if self._model is None:
+                await self._load_model()
+            if self._model is None:
+                return False
+            if not warm_up:
+                if self.state != ModelState.READY:
+                    self.state = ModelState.LOADED
+                return True
+
+            if self.state != ModelState.READY and self._warm_up is not None:
+                self.state = ModelState.WARMING_UP
+                started = time.perf_counter()
+                try:
+                    await asyncio.to_thread(self._warm_up, self._model)
+                    self.warm_up_seconds = time.perf_counter() - started
+                    print(f"Warmed up {self.name} in {self.warm_up_seconds:.1f} s")
+                except Exception as e:
+                    # The model works without warm-up, only the first uses are slower
+                    print(f"Failed to warm up {self.name}: {e}")
+            self.state = ModelState.READY
+        return True
+
+    def stats(self) -> dict:
+        """Get the state, and the load and warm-up durations."""
+        return {
+            "state": self.state.value,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "warm_up_seconds": self.warm_up_seconds
+        }
@@ -0,0 +1,350 @@
+import re
+from bisect import bisect_right
+from typing import Iterable, Iterator, Optional
+
+from better_profanity.constants import ALLOWED_CHARACTERS
+
+
+class AhoCorasick:
+    """
+    An Aho-Corasick automaton over a set of patterns, optionally with character variants.
+
+    The trie of the patterns is determinized lazily: a state is the set of trie nodes the text read so far can lead
+    to, the root being always included unless `anchored`, which plays the role of the failure links. Variants make a
+    text character stand for several pattern characters (e.g. `@` for `a` or `o`), and simply add nodes to the set.
+    Transitions are computed on first use then cached, so that reading a character costs one dict lookup whatever
+    the number of patterns.
+    """
+
+    def __init__(self, patterns: Iterable[str], variants: Optional[dict[str, tuple[str, ...]]] = None,
+                 anchored: bool = False):
+        """
+        :param patterns: Patterns to match
+        :param variants: Text characters each pattern character also matches, itself included (all characters match
+            themselves by default)
+        :param anchored: Only match whole texts (`match`), instead of occurrences anywhere in a text (`finditer`)
+        """
+        self.anchored = anchored
+        self.patterns: list[str] = []
+        self._children: list[dict[str, int]] = [{}]
+        self._terminals: list[tuple[int, ...]] = [()]
+        for index, pattern in enumerate(patterns):
+            node = 0
+            for char in pattern:
+                child = self._children[node].get(char)
+                if child is None:
+                    child = self._children[node][char] = len(self._children)
+                    self._children.append({})
+                    self._terminals.append(())
+                node = child
+            self._terminals[node] += (index,)
+            self.patterns.append(pattern)
+
+        # Pattern characters each text character stands for
+        self._canonical: dict[str, tuple[str, ...]] = {}
+        if variants:
+            sources: dict[str, set[str]] = {}
+            for char, options in variants.items():
+                for option in options:
+                    if len(option) != 1:
+                        raise ValueError(f"Variants must be single characters, got {option!r} for {char!r}")
+                    sources.setdefault(option, set()).add(char)
+            for char in variants:
+                self._canonical[char] = tuple(sources.get(char, ()))
+            for option, chars in sources.items():
+                if option not in variants:
+                    self._canonical[option] = tuple(chars | {option})
+
+        self._state_ids: dict[frozenset[int], int] = {}
+        self._states: list[frozenset[int]] = []
+        self._outputs: list[tuple[int, ...]] = []
+        self._transitions: list[dict[str, int]] = []
+        self.start = self._state(frozenset((0,)))
+        self.dead = self._state(frozenset())
+
+    def _state(self, nodes: frozenset[int]) -> int:
+        state = self._state_ids.get(nodes)
+        if state is None:
+            state = self._state_ids[nodes] = len(self._states)
+            self._states.append(nodes)
+            self._outputs.append(tuple(sorted(index for node in nodes for index in self._terminals[node])))
+            self._transitions.append({})
+        return state
+
+    def _transition(self, state: int, char: str) -> int:
+        nodes = set() if self.anchored else {0}
+        for node in self._states[state]:
+            children = self._children[node]
+            for canonical in self._canonical.get(char, (char,)):
+                child = children.get(canonical)
+                if child is not None:
+                    nodes.add(child)
+        next_state = self._transitions[state][char] = self._state(frozenset(nodes))
+        return next_state
+
+    def advance(self, state: int, text: str) -> int:
+        """
+        Read a text from a state.
+        :param state: State to start from, e.g. `start`
+        :param text: Text to read
+        :return: The state reached, `dead` once no pattern can match anymore in anchored mode
+        """
+        transitions = self._transitions
+        for char in text:
+            next_state = transitions[state].get(char)
+            state = next_state if next_state is not None else self._transition(state, char)
+            if state == self.dead:
+                break
+        return state
+
+    def outputs(self, state: int) -> tuple[int, ...]:
+        """Indices of the patterns ending at a state."""
+        return self._outputs[state]
+
+    def match(self, text: str) -> bool:
+        """Whether a whole text is one of the patterns (anchored mode)."""
+        return bool(self._outputs[self.advance(self.start, text)])
+
+    def finditer(self, text: str) -> Iterator[tuple[int, int, int]]:
+        """
+        Find every occurrence of the patterns in a text, overlapping ones included.
+        :param text: Text to scan
+        :return: Iterator of (start, end, pattern index), by end position
+        """
+        transitions, outputs = self._transitions, self._outputs
+        state = self.start
+        for position, char in enumerate(text):
+            next_state = transitions[state].get(char)
+            state = next_state if next_state is not None else self._transition(state, char)
+            for index in outputs[state]:
+                yield position + 1 - len(self.patterns[index]), position + 1, index
+
+
+def _can_overlap(phrase: str, replacement: str) -> bool:
+    """Whether a phrase can match across or inside a replacement once inserted in a text."""
+    for offset in range(1 - len(phrase), len(replacement)):
+        low, high = max(0, offset), min(len(replacement), offset + len(phrase))
+        if replacement[low:high] == phrase[low - offset:high - offset]:
+            return True
+    return False
+
+
+class SanitizationEngine:
+    """
+    Compiled sanitization, with the output of `better_profanity.censor` followed by one `str.replace` per disallowed
+    phrase and one `re.sub` per harmful then sensitive pattern, but one pass per stage whatever the list sizes:
+
+    - Profanity: the words of the text are read once, each through an anchored automaton of all the censored words
+      and their character variants. The look-ahead of better_profanity (a word followed by up to
+      `max_combinations` words, with or without their separators, forming a censored word) reads on from the state
+      of the word instead of comparing every concatenation to every censored word
+    - Disallowed phrases: one Aho-Corasick scan finds all their occurrences, replaced as successive `str.replace`
+      calls would
+    - Patterns: one alternation of all the patterns, with a named group per pattern, finds whether any matches.
+      Only texts with a match are rewritten pattern by pattern, since successive substitutions differ from a single
+      leftmost alternation when matches of different patterns overlap
+    """
+
+    def __init__(self, profanity_words: Iterable[str], disallowed_phrases: Iterable[str] = (),
+                 harmful_patterns: Iterable[str] = (), sensitive_patterns: Iterable[str] = (),
+                 char_map: Optional[dict[str, tuple[str, ...]]] = None, max_combinations: int = 1,
+                 censor_char: str = "*"):
+        """
+        :param profanity_words: Censored words, as loaded by better_profanity
+        :param disallowed_phrases: Phrases replaced with `[*FORBIDDEN*]`
+        :param harmful_patterns: Regular expressions replaced with `[*HARMFUL*]`
+        :param sensitive_patterns: Regular expressions replaced with `[*SENSITIVE*]`, after the harmful ones
+        :param char_map: Characters each censored word character also matches (`Profanity.CHARS_MAPPING`)
+        :param max_combinations: Number of following words looked ahead (`Profanity.MAX_NUMBER_COMBINATIONS`)
+        :param censor_char: Character the censored words are replaced with, 4 times
+        """
+        self.censorship = censor_char * 4
+        self.max_combinations = max_combinations
+        self._words = AhoCorasick({word.lower() for word in profanity_words}, variants=char_map, anchored=True)
+        self._word_regex = re.compile(f"[{''.join(re.escape(char) for char in sorted(ALLOWED_CHARACTERS))}]+")
+
+        self.forbidden_replacement = "[*FORBIDDEN*]"
+        self.disallowed_phrases = list(disallowed_phrases)
+        # A phrase matching inside or across a replacement would make the phrase order matter beyond what the scan
+        # sees, such phrase lists keep the successive replacements
+        self._phrases: Optional[AhoCorasick] = None
+        if not any(not phrase or _can_overlap(phrase, self.forbidden_replacement)
+                   for phrase in self.disallowed_phrases):
+            self._phrases = AhoCorasick(self.disallowed_phrases)
+
+        harmful_patterns, sensitive_patterns = list(harmful_patterns), list(sensitive_patterns)
+        self.pattern_replacements = [(re.compile(pattern), "[*HARMFUL*]") for pattern in harmful_patterns] + \
+            [(re.compile(pattern), "[*SENSITIVE*]") for pattern in sensitive_patterns]
+        self.pattern_names = [f"harmful_{index}" for index in range(len(harmful_patterns))] + \
+            [f"sensitive_{index}" for index in range(len(sensitive_patterns))]
+        # Patterns with their own groups cannot be nested in the alternation without breaking their backreferences
+        self._patterns: Optional[re.Pattern] = None
+        if self.pattern_replacements and all(pattern.groups == 0 for pattern, _ in self.pattern_replacements):
+            self._patterns = re.compile("|".join(
+                f"(?P<{name}>{pattern.pattern})"
+                for name, (pattern, _) in zip(self.pattern_names, self.pattern_replacements)))
+
+    @classmethod
+    def from_profanity(cls, profanity, disallowed_phrases: Iterable[str] = (), harmful_patterns: Iterable[str] = (),
+                       sensitive_patterns: Iterable[str] = ()) -> "SanitizationEngine":
+        """Create an engine censoring the words loaded in a `better_profanity.Profanity`."""
+        return cls([str(word) for word in profanity.CENSOR_WORDSET], disallowed_phrases, harmful_patterns,
+                   sensitive_patterns, char_map=profanity.CHARS_MAPPING,
+                   max_combinations=profanity.MAX_NUMBER_COMBINATIONS)
+
+    def sanitize(self, text: str) -> str:
+        """Censor profanity, then replace disallowed phrases, then harmful and sensitive patterns."""
+        return self.replace_patterns(self.replace_phrases(self.censor(text)))
+
+    def _look_ahead(self, spans: list[tuple[int, int]], length: int, first: int, count: int) -> list[Optional[int]]:
+        """Indices of the `count` words from `first`, ending with None past the last word (better_profanity
+        ignores a last word of one character)."""
+        words: list[Optional[int]] = []
+        for index in range(first, first + count):
+            if index >= len(spans) or spans[index][0] >= length - 1:
+                words.append(None)
+                break
+            words.append(index)
+        return words
+
+    def _censored_words(self, text: str, spans: list[tuple[int, int]]) -> Iterator[tuple[int, int]]:
+        """
+        Find the censored words of a text, as `better_profanity.censor` does.
+        :param text: Text to censor
+        :param spans: Spans of the words of the text
+        :return: Iterator of the (first, last) word indices of each censored run of words, in order
+        """
+        length = len(text)
+        if not spans or spans[0][0] >= length - 1:
+            return
+
+        words = self._words
+        # better_profanity keeps a sliding window of the following words, refilled one word at a time, which it
+        # empties after a match: it is reproduced as is since it decides which words are looked ahead
+        look_ahead: list[Optional[int]] = []
+        skip_until = -1
+        for index, (start, end) in enumerate(spans):
+            if index <= skip_until:
+                continue
+            state = words.advance(words.start, text[start:end].lower())
+            if end == length:
+                # The last word of the text is only compared alone
+                if words.outputs(state):
+                    yield index, index
+                return
+
+            if not look_ahead:
+                look_ahead = self._look_ahead(spans, length, index + 1, self.max_combinations)
+            else:
+                del look_ahead[0]
+                if look_ahead and look_ahead[-1] is not None:
+                    look_ahead += self._look_ahead(spans, length, look_ahead[-1] + 1, 1)
+
+            # The following words are appended to the word both without and with their separators
+            joined = joined_with_separators = state
+            for following in look_ahead:
+                if joined == joined_with_separators == words.dead:
+                    break
+                if following is None:
+                    continue
+                following_start, following_end = spans[following]
+                joined = words.advance(joined, text[following_start:following_end].lower())
+                joined_with_separators = words.advance(
+                    joined_with_separators, text[spans[following - 1][1]:following_end].lower())
+                if words.outputs(joined) or words.outputs(joined_with_separators):
+                    skip_until = following
+                    look_ahead = []
+                    break
+            if skip_until > index:
+                yield index, skip_until
+            elif words.outputs(state):
+                yield index, index
+
+    def word_spans(self, text: str) -> list[tuple[int, int]]:
+        """Spans of the words of a text, as better_profanity splits it."""
+        return [match.span() for match in self._word_regex.finditer(text)]
+
+    def censor(self, text: str) -> str:
+        """Replace the censored words of a text with the censorship, as `better_profanity.censor` does."""
+        spans = self.word_spans(text)
+        parts, position = [], 0
+        for first, last in self._censored_words(text, spans):
+            # The separators between joined words are dropped, and those after the last joined word kept
+            parts.append(text[position:spans[first][0]])
+            parts.append(self.censorship)
+            position = spans[last][1]
+        if not parts:
+            return text
+        parts.append(text[position:])
+        return "".join(parts)
+
+    def contains_profanity(self, text: str) -> bool:
+        """Whether a text has a censored word, stopping at the first one."""
+        spans = self.word_spans(text)
+        return next(self._censored_words(text, spans), None) is not None
+
+    def contains_phrase(self, text: str) -> bool:
+        """Whether a text has a disallowed phrase, stopping at the first one."""
+        if self._phrases is None:
+            return any(phrase in text for phrase in self.disallowed_phrases)
+        return next(self._phrases.finditer(text), None) is not None
+
+    def contains_pattern(self, text: str) -> bool:
+        """Whether a text matches a harmful or sensitive pattern, stopping at the first match."""
+        if self._patterns is None:
+            return any(pattern.search(text) for pattern, _ in self.pattern_replacements)
+        return self._patterns.search(text) is not None
+
+    def contains_violations(self, text: str) -> bool:
+        """
+        Whether sanitization would change a text, without building the sanitized text.
+
+        Each stage leaves a text without any of its matches as is, so a text is only changed when one of the stages
+        matches it; stages stop at their first match.
+        """
+        return self.contains_profanity(text) or self.contains_phrase(text) or self.contains_pattern(text)
+
+    def replace_phrases(self, text: str) -> str:
+        """Replace the disallowed phrases, as successive `str.replace` calls in the phrase order do."""
+        if self._phrases is None:
+            for phrase in self.disallowed_phrases:
+                text = text.replace(phrase, self.forbidden_replacement)
+            return text
+
+        occurrences = sorted(self._phrases.finditer(text), key=lambda occurrence: (occurrence[2], occurrence[0]))
+        if not occurrences:
+            return text
+
+        # Each phrase takes its leftmost non-overlapping occurrences that do not overlap a previous phrase's
+        replaced: list[tuple[int, int]] = []
+        chosen: list[tuple[int, int]] = []
+        phrase, phrase_end = -1, -1
+        for start, end, index in occurrences:
+            if index != phrase:
+                replaced = sorted(replaced + chosen)
+                chosen, phrase, phrase_end = [], index, -1
+            if start < phrase_end:
+                continue
+            position = bisect_right(replaced, (start, end))
+            if (position and replaced[position - 1][1] > start) or \
+                    (position < len(replaced) and replaced[position][0] < end):
+                continue
+            chosen.append((start, end))
+            phrase_end = end
+        replaced = sorted(replaced + chosen)
+
+        parts, position = [], 0
+        for start, end in replaced:
+            parts.append(text[position:start])
+            parts.append(self.forbidden_replacement)
+            position = end
+        parts.append(text[position:])
+        return "".join(parts)
+
+    def replace_patterns(self, text: str) -> str:
+        """Replace the harmful then the sensitive patterns, as successive `re.sub` calls do."""
+        if not self.contains_pattern(text):
+            return text
+        for pattern, replacement in self.pattern_replacements:
+            text = pattern.sub(replacement, text)
+        return text
@@ -1,10 +1,20 @@
 import re
+import time
+from typing import Callable, Optional
 
 from better_profanity import profanity
 
+from app.services.sanitization_engine import SanitizationEngine
+from app.utils.hashing import text_digest
+from app.utils.lru_cache import LRUCache
+from app.utils.stats import RollingStats
+
 
 class TextSanitizationService:
-    def __init__(self):
+    def __init__(self, memo_max_entries: int = 10_000):
+        """
+        :param memo_max_entries: Maximum number of memoized sanitization results (0 disables the memo)
+        """
         # Initialize profanity filter
         profanity.load_censor_words()
 
@@ -35,12 +45,72 @@ class TextSanitizationService:
         self.harmful_regex = [re.compile(pattern) for pattern in self.harmful_patterns]
         self.sensitive_regex = [re.compile(pattern) for pattern in self.sensitive_patterns]
 
+        # Same output as `_sanitize_sequential`, in one pass per stage
+        self.engine = SanitizationEngine.from_profanity(profanity, self.disallowed_phases, self.harmful_patterns,
+                                                        self.sensitive_patterns)
+
+        # Sanitized texts by exact text digest: repeated prompts are sanitized once
+        self.memo = LRUCache(memo_max_entries) if memo_max_entries else None
+        self.stage_times = {stage: RollingStats() for stage in ("detection", "profanity", "phrases", "patterns")}
+
+    def _timed(self, stage: str, function: Callable, text: str):
+        started = time.perf_counter()
+        result = function(text)
+        self.stage_times[stage].add(time.perf_counter() - started)
+        return result
+
     def sanitize_text(self, text: str) -> str:
         """
         Sanitize text by removing profanity, disallowed phrases, harmful content, and sensitive information.
         :param text: Input text to sanitize
         :return: Sanitized text
         """
+        return self._sanitize_memoized(text).strip()
+
+    def sanitize_many(self, texts: list[str]) -> list[str]:
+        """
+        Sanitize many texts, each distinct text once.
+        :param texts: Input texts to sanitize
+        :return: Sanitized texts, in input order
+        """
+        sanitized = {text: self._sanitize_memoized(text).strip() for text in set(texts)}
+        return [sanitized[text] for text in texts]
+
+    def contains_violations(self, text: str) -> bool:
+        """
+        Whether sanitization would change a text (surrounding whitespace aside), without building the sanitized text.
+        :param text: Input text to check
+        :return: True if the text has profanity, a disallowed phrase, harmful content, or sensitive information
+        """
+        key = text_digest(text, normalize=False) if self.memo is not None else None
+        sanitized = self.memo.get(key) if key is not None else None
+        if sanitized is not None:
+            return sanitized != text
+
+        violation = self._timed("detection", self.engine.contains_violations, text)
+        if not violation and key is not None:
+            self.memo.set(key, text)
+        return violation
+
+    def _sanitize_memoized(self, text: str) -> str:
+        # Exact digests (not normalized): the sanitization of texts differing only by normalization can differ
+        key = text_digest(text, normalize=False) if self.memo is not None else None
+        sanitized = self.memo.get(key) if key is not None else None
+        if sanitized is None:
+            # Most texts are clean: detection stops at the first match and builds no copy of the text
+            sanitized = self._sanitize(text) if self._timed("detection", self.engine.contains_violations, text) \
+                else text
+            if key is not None:
+                self.memo.set(key, sanitized)
+        return sanitized
+
+    def _sanitize(self, text: str) -> str:
+        text = self._timed("profanity", self.engine.censor, text)
+        text = self._timed("phrases", self.engine.replace_phrases, text)
+        return self._timed("patterns", self.engine.replace_patterns, text)
+
+    def _sanitize_sequential(self, text: str) -> str:
+        """Reference sanitization, one pass per censored word, disallowed phrase and pattern."""
         # Remove profanity
         text = profanity.censor(text)
 
@@ -56,4 +126,104 @@ class TextSanitizationService:
         for pattern in self.sensitive_regex:
             text = pattern.sub('[*SENSITIVE*]', text)
 
-        return text.strip()
+        return text
+
+    def stats(self) -> dict:
+        """Get the memo hit rate and the time spent per sanitization stage."""
+        return {
+            "memo": self.memo.stats() if self.memo is not None else None,
+            "stages_ms": {stage: times.summary(scale=1000) for stage, times in self.stage_times.items()}
+        }
+
+    def streaming(self, window: int = 128) -> "StreamingSanitizer":
+        """Create a sanitizer of text arriving in chunks, e.g. a streamed LLM response."""
+        return StreamingSanitizer(self, window)
+
+
+class StreamingSanitizer:
+    """
+    Incremental sanitization of text arriving in chunks.
+
+    The last `window` characters are held back, since a pattern may continue in the next chunk, and so are the last
+    `max_combinations` complete words, since profanity may join a word with the words following it. The text before
+    them is released at a whitespace boundary, once sanitizing it and the rest of the buffer separately gives the
+    sanitized buffer, i.e. no match crosses the boundary. As long as matches are shorter than the window, the
+    concatenated output equals `sanitize_text` of the whole text.
+
+    A buffer without any such boundary, e.g. text without whitespace, is cut at `max_buffer` characters regardless,
+    the only case where the output may differ.
+    """
+
+    def __init__(self, sanitization_service: TextSanitizationService, window: int = 128,
+                 max_buffer: Optional[int] = None):
+        """
+        :param sanitization_service: Service sanitizing the text
+        :param window: Number of characters held back
+        :param max_buffer: Buffer size at which text is released without a safe boundary (default: 16 windows)
+        """
+        self.sanitization_service = sanitization_service
+        self.window = window
+        self.max_buffer = max_buffer or 16 * window
+        self._buffer = ""
+        self._next_check = 2 * window
+        self._started = False
+        self._trailing_whitespace = ""
+
+    def _emit(self, text: str) -> str:
+        # Leading and trailing whitespace of the whole text is stripped, as in `sanitize_text`: trailing whitespace
+        # is only released with the next non-blank text
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        text = self._trailing_whitespace + text
+        stripped = text.rstrip()
+        self._trailing_whitespace = text[len(stripped):]
+        return stripped
+
+    def _release(self, cut: int, head: str) -> str:
+        self._buffer = self._buffer[cut:]
+        self._next_check = max(2 * self.window, len(self._buffer) + self.window)
+        return self._emit(head)
+
+    def _last_cut(self) -> int:
+        """Position before which a cut leaves the window and the look-ahead of profanity in the buffer."""
+        engine = self.sanitization_service.engine
+        cut = len(self._buffer) - self.window
+        if engine.max_combinations:
+            # Words followed by a separator: the last word of the buffer may continue in the next chunk
+            complete = [start for start, end in engine.word_spans(self._buffer) if end < len(self._buffer)]
+            cut = min(cut, complete[-engine.max_combinations] if len(complete) >= engine.max_combinations else 0)
+        return cut
+
+    def feed(self, chunk: str) -> str:
+        """
+        Add a chunk of text.
+        :param chunk: Next chunk
+        :return: Sanitized text that is final, possibly empty
+        """
+        self._buffer += chunk
+        # Sanitize at most once per `window` new characters
+        if len(self._buffer) < self._next_check:
+            return ""
+
+        sanitize = self.sanitization_service._sanitize
+        sanitized = sanitize(self._buffer)
+        cut = self._last_cut()
+        while cut > 0:
+            cut = max(self._buffer.rfind(" ", 0, cut), self._buffer.rfind("\n", 0, cut))
+            if cut <= 0:
+                break
+            head = sanitize(self._buffer[:cut])
+            if head + sanitize(self._buffer[cut:]) == sanitized:
+                return self._release(cut, head)
+
+        if len(self._buffer) >= self.max_buffer:
+            cut = len(self._buffer) - self.window
+            return self._release(cut, sanitize(self._buffer[:cut]))
+        self._next_check = len(self._buffer) + self.window
+        return ""
+
+    def flush(self) -> str:
+        """Sanitize and return the held-back text, at the end of the stream."""
+        text, self._buffer = self._buffer, ""
+        return self._emit(self.sanitization_service._sanitize(text))
@@ -0,0 +1,238 @@
+import asyncio
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+from app.models import SimilarityMetric
+from app.services.executors import ExecutorBusy, Result
+from app.services.minhash_service import LSHIndex, lsh_bands_for_threshold
+from app.services.similarity_service import TextSimilarityService
+from app.services.vector_index import IVFIndex, blocked_top_k
+
+
+@dataclass
+class SearchMatch:
+    id: str
+    text: str
+    score: float
+
+
+class CorpusSearchService:
+    """
+    A searchable corpus of known prompts.
+
+    Per-metric document features are built lazily on the first search after a change:
+    - Cosine: TF-IDF vectors from the corpus-fitted TF-IDF model, or with the IDF fitted on the documents
+    - Jaccard: binary word-incidence matrix
+    - MinHash: LSH index of the MinHash signatures, only documents sharing a band with the query are scored
+    - Semantic: L2-normalized embeddings, plus an optional approximate IVF index
+    Exact search scores the documents in blocks of rows and keeps the top-k with `argpartition`. Features are built and
+    documents scored on the lexical executor of the similarity service, off the event loop.
+    """
+
+    def __init__(self, similarity_service: TextSimilarityService, block_size: int = 8192,
+                 ivf_n_lists: Optional[int] = None, ivf_n_probe: int = 8, lsh_threshold: float = 0.5):
+        """
+        :param similarity_service: Service providing the semantic embeddings and MinHash signatures
+        :param block_size: Number of documents scored at once in exact search
+        :param ivf_n_lists: Number of clusters of the approximate index (square root of the corpus size if None)
+        :param ivf_n_probe: Number of clusters scanned per approximate query
+        :param lsh_threshold: Jaccard similarity around which the LSH index starts finding documents
+        """
+        self.similarity_service = similarity_service
+        self.block_size = block_size
+        self.ivf_n_lists = ivf_n_lists
+        self.ivf_n_probe = ivf_n_probe
+        self.lsh_threshold = lsh_threshold
+
+        self.documents: dict[str, str] = {}
+        self._lock = asyncio.Lock()
+        # Serializes the corpus changes, each comparing the documents before and after to update the TF-IDF model
+        self._update_lock = asyncio.Lock()
+        self._features: dict[str, object] = {}
+        self._version = 0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    async def add_documents(self, documents: list[tuple[Optional[str], str]]) -> list[str]:
+        """
+        Add or replace documents.
+        :param documents: (id, text) pairs, a random id is generated when the id is None
+        :return: Ids of the documents
+        :raises ExecutorBusy: If the lexical executor is busy, no document is added then
+        """
+        async with self._update_lock:
+            ids, texts = [], {}
+            for document_id, text in documents:
+                document_id = document_id or uuid.uuid4().hex
+                texts[document_id] = text
+                ids.append(document_id)
+            changed = {document_id: text for document_id, text in texts.items()
+                       if self.documents.get(document_id) != text}
+            if not changed:
+                return ids
+
+            # The documents also update the IDF of the corpus-fitted TF-IDF model, if any, by their net change:
+            # replaced texts are removed from it, and documents added again unchanged are left out
+            if self.similarity_service.tfidf_model is not None:
+                replaced = [self.documents[document_id] for document_id in changed if document_id in self.documents]
+                await self._run(self._refit_tfidf_model, replaced, list(changed.values()))
+
+            self.documents.update(changed)
+            self._version += 1
+            self._features.clear()
+            return ids
+
+    async def remove_document(self, document_id: str) -> bool:
+        """
+        Remove a document, returning whether it was present.
+        :raises ExecutorBusy: If the lexical executor is busy, the document is not removed then
+        """
+        async with self._update_lock:
+            text = self.documents.get(document_id)
+            if text is None:
+                return False
+            if self.similarity_service.tfidf_model is not None:
+                await self._run(self.similarity_service.tfidf_model.partial_unfit, [text])
+
+            del self.documents[document_id]
+            self._version += 1
+            self._features.clear()
+            return True
+
+    def _refit_tfidf_model(self, removed: list[str], added: list[str]):
+        self.similarity_service.tfidf_model.partial_unfit(removed).partial_fit(added)
+
+    async def _get_features(self, metric: SimilarityMetric, approximate: bool = False):
+        """Build (or reuse) the document features of a metric, invalidated by any corpus change."""
+        key = f"{metric.value}:ivf" if approximate else metric.value
+        async with self._lock:
+            if key in self._features:
+                return self._features[key]
+
+            version = self._version
+            ids, texts = list(self.documents), list(self.documents.values())
+            if metric != SimilarityMetric.SEMANTIC:
+                features = (ids, *await self._run(self._build_lexical_features, metric, texts))
+            elif approximate:
+                semantic = self._features.get(SimilarityMetric.SEMANTIC.value) or (ids, await self._embed(texts))
+                ids, embeddings = semantic
+                index = await self._run(
+                    IVFIndex(n_lists=self.ivf_n_lists, n_probe=self.ivf_n_probe).fit, embeddings) \
+                    if embeddings is not None else None
+                if version == self._version:
+                    self._features[SimilarityMetric.SEMANTIC.value] = semantic
+                features = (ids, index)
+            else:
+                features = (ids, await self._embed(texts))
+
+            # Features built while the corpus changed are used once but not kept
+            if version == self._version:
+                self._features[key] = features
+            return features
+
+    async def _run(self, function: Callable[..., Result], *args) -> Result:
+        """Run CPU-bound work on the lexical executor."""
+        return await self.similarity_service.lexical_executor.run(function, *args)
+
+    def _build_lexical_features(self, metric: SimilarityMetric, texts: list[str]) -> tuple:
+        """Build the document features of a lexical metric, without the ids."""
+        if metric == SimilarityMetric.COSINE and self.similarity_service.tfidf_model is not None:
+            tfidf_model = self.similarity_service.tfidf_model
+            return tfidf_model, tfidf_model.transform(texts)
+        if metric == SimilarityMetric.COSINE:
+            vectorizer = TfidfVectorizer()
+            return vectorizer, vectorizer.fit_transform(texts).tocsr()
+        if metric == SimilarityMetric.MINHASH:
+            minhasher = self.similarity_service.minhasher
+            index = LSHIndex(minhasher.num_perm, lsh_bands_for_threshold(minhasher.num_perm, self.lsh_threshold))
+            for row, signature in enumerate(minhasher.signatures(texts)):
+                index.add(row, signature)
+            return (index,)
+        vectorizer = CountVectorizer(tokenizer=str.split, token_pattern=None, binary=True)
+        words = vectorizer.fit_transform(texts).tocsr()
+        return vectorizer, words, np.asarray(words.sum(axis=1), dtype=np.float64).ravel()
+
+    async def _embed(self, texts: list[str]) -> Optional[np.ndarray]:
+        if not texts:
+            return None
+        return await self.similarity_service.embed(texts)
+
+    async def search(self, query: str, metric: SimilarityMetric, k: int = 10,
+                     approximate: bool = False) -> list[SearchMatch]:
+        """
+        Find the documents most similar to a query.
+        :param query: Query text
+        :param metric: Similarity metric to use
+        :param k: Number of results
+        :param approximate: Use the approximate index (semantic metric only)
+        :return: Matches, most similar first
+        """
+        if approximate and metric != SimilarityMetric.SEMANTIC:
+            raise ValueError("Approximate search is only available for the semantic metric")
+        if not self.documents:
+            return []
+
+        if metric == SimilarityMetric.SEMANTIC:
+            query_embedding = await self.similarity_service.embed([query])
+            if query_embedding is None:
+                print("Semantic model not available, falling back to cosine similarity")
+                return await self.search(query, SimilarityMetric.COSINE, k)
+
+            ids, index_or_embeddings = await self._get_features(metric, approximate)
+            if index_or_embeddings is None:
+                return await self.search(query, SimilarityMetric.COSINE, k)
+            if approximate:
+                rows, scores = await self._run(index_or_embeddings.search, query_embedding[0], k)
+            else:
+                rows, scores = await self._run(
+                    blocked_top_k, index_or_embeddings, query_embedding[0], k, self.block_size)
+        else:
+            try:
+                ids, rows, scores = await self._search_lexical(query, metric, k)
+            except ExecutorBusy:
+                raise
+            except Exception as e:
+                print(f"Error searching corpus: {e}")
+                return []
+
+        # Documents removed since the features were built are skipped
+        return [
+            SearchMatch(ids[row], self.documents[ids[row]], float(score))
+            for row, score in zip(rows, scores)
+            if ids[row] in self.documents
+        ]
+
+    async def _search_lexical(self, query: str, metric: SimilarityMetric, k: int):
+        """Top-k search with TF-IDF cosine, Jaccard, or MinHash similarity."""
+        if metric == SimilarityMetric.COSINE:
+            ids, vectorizer, tfidf = await self._get_features(metric)
+            return ids, *await self._run(
+                lambda: blocked_top_k(tfidf, vectorizer.transform([query]), k, self.block_size))
+
+        if metric == SimilarityMetric.MINHASH:
+            ids, index = await self._get_features(metric)
+            results = await self._run(
+                lambda: index.query(self.similarity_service.minhasher.signatures([query])[0], k=k))
+            return ids, [row for row, _ in results], [estimate for _, estimate in results]
+
+        ids, vectorizer, words, sizes = await self._get_features(metric)
+        query_size = len(set(query.lower().split()))
+
+        def jaccard(intersection: np.ndarray, start: int, stop: int) -> np.ndarray:
+            union = sizes[start:stop] + query_size - intersection
+            return np.divide(intersection, union, out=np.zeros_like(intersection, dtype=np.float64), where=union > 0)
+
+        return ids, *await self._run(
+            lambda: blocked_top_k(words, vectorizer.transform([query]), k, self.block_size, transform=jaccard))
+
+    def stats(self) -> dict:
+        """Get the corpus size and the metrics whose features are built."""
+        return {
+            "documents": len(self.documents),
+            "features": sorted(self._features)
+        }
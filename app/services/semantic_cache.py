@@ -0,0 +1,145 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from app.services.similarity_service import TextSimilarityService
+from app.services.vector_index import blocked_top_k
+from app.utils.hashing import text_digest
+
+
+def _closest_slot(arena: np.ndarray, slots: np.ndarray, query: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Score the used slots of the arena against a query: position in `slots` and score of the closest."""
+    return blocked_top_k(arena[slots], query, 1)
+
+
+@dataclass
+class SemanticCacheHit:
+    prompt: str
+    response: str
+    score: float
+
+
+class SemanticResponseCache:
+    """
+    A cache of LLM responses matched by prompt meaning rather than by exact prompt.
+
+    The embeddings of the answered prompts (from the semantic model of the similarity service) live in one
+    preallocated arena, whose used slots are scored against a new prompt with one matrix-vector product on the
+    lexical executor; the closest answered prompt is a hit when its cosine similarity reaches the threshold. Entries
+    are evicted least recently used first.
+    """
+
+    def __init__(self, similarity_service: TextSimilarityService, threshold: float = 0.95, max_entries: int = 10_000,
+                 ttl_seconds: Optional[float] = None):
+        """
+        :param similarity_service: Service providing the semantic embeddings
+        :param threshold: Minimum cosine similarity between a prompt and an answered prompt to reuse the answer
+        :param max_entries: Maximum number of answered prompts
+        :param ttl_seconds: Lifetime of an answer (no expiry if None)
+        """
+        self.similarity_service = similarity_service
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        # The arena is allocated with the first embedding, once the dimension is known
+        self._arena: Optional[np.ndarray] = None
+        self._expires_at = np.full(max_entries, np.inf)
+        self._entries: list[Optional[tuple[str, str]]] = [None] * max_entries
+        # Bumped when a slot is written or released, to detect slots changed while a lookup was scoring them
+        self._versions = np.zeros(max_entries, dtype=np.int64)
+        self._slots: OrderedDict[bytes, int] = OrderedDict()
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _release(self, slot: int):
+        prompt, _ = self._entries[slot]
+        del self._slots[text_digest(prompt)]
+        self._entries[slot] = None
+        self._arena[slot] = 0.0
+        self._expires_at[slot] = np.inf
+        self._versions[slot] += 1
+        self._free_slots.append(slot)
+
+    async def get(self, prompt: str) -> Optional[SemanticCacheHit]:
+        """
+        Find the answer of the answered prompt closest in meaning to a prompt.
+        :param prompt: Prompt to answer
+        :return: The hit, or None if no answered prompt is close enough or the semantic model is not available
+        """
+        if not self._slots:
+            self.misses += 1
+            return None
+
+        embeddings = await self.similarity_service.embed([prompt])
+        if embeddings is None:
+            self.misses += 1
+            return None
+
+        # Expired entries are released before scoring, and only the slots in use are scored
+        if self.ttl_seconds is not None:
+            for slot in np.flatnonzero(self._expires_at <= time.monotonic()):
+                self._release(int(slot))
+        if not self._slots:
+            self.misses += 1
+            return None
+        slots = np.fromiter(self._slots.values(), dtype=np.intp, count=len(self._slots))
+        versions = self._versions[slots]
+        rows, scores = await self.similarity_service.lexical_executor.run(
+            _closest_slot, self._arena, slots, embeddings[0])
+        # A slot written or released while scoring no longer holds the scored prompt
+        if not rows.size or scores[0] < self.threshold or self._versions[slots[rows[0]]] != versions[rows[0]]:
+            self.misses += 1
+            return None
+
+        slot = int(slots[rows[0]])
+        answered_prompt, response = self._entries[slot]
+        self._slots.move_to_end(text_digest(answered_prompt))
+        self.hits += 1
+        return SemanticCacheHit(answered_prompt, response, float(scores[0]))
+
+    async def set(self, prompt: str, response: str):
+        """Store the answer of a prompt, evicting the least recently used answer when full."""
+        embeddings = await self.similarity_service.embed([prompt])
+        if embeddings is None:
+            return
+        if self._arena is None:
+            self._arena = np.zeros((self.max_entries, embeddings.shape[1]), dtype=np.float32)
+
+        digest = text_digest(prompt)
+        slot = self._slots.get(digest)
+        if slot is None:
+            if not self._free_slots:
+                self._release(next(iter(self._slots.values())))
+                self.evictions += 1
+            slot = self._free_slots.pop()
+            self._slots[digest] = slot
+        else:
+            self._slots.move_to_end(digest)
+
+        self._arena[slot] = embeddings[0]
+        self._entries[slot] = (prompt, response)
+        self._versions[slot] += 1
+        self._expires_at[slot] = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else np.inf
+
+    def stats(self) -> dict:
+        """Get the entry count and hit / miss / eviction counters."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions
+        }
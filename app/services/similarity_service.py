@@ -1,86 +1,352 @@
 import asyncio
+from collections import Counter
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Callable, Optional
 
+import numpy as np
 from sentence_transformers import SentenceTransformer
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
 from app.models import SimilarityMetric
 from app.services.cache_service import CacheService
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_store import EmbeddingStore
+from app.services.executors import BoundedExecutor, ExecutorBusy, ThreadLayout
+from app.services.minhash_service import MinHasher
+from app.services.model_manager import ModelManager
+from app.services.text_features import (
+    PAIR_IDF_UNSHARED, TextFeatures, corpus_tfidf_cosine, jaccard, minhash_jaccard, pair_tfidf_cosine)
+from app.services.tfidf_model import TfidfModel
 from app.utils.config import settings
+from app.utils.hashing import text_digest
+from app.utils.lru_cache import LRUCache
+
+
+def _index_pairs(pairs: list[tuple[str, str]]) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """Deduplicate the texts of the pairs and return them with the row index of each side."""
+    positions: dict[str, int] = {}
+    rows1, rows2 = [], []
+    for text1, text2 in pairs:
+        rows1.append(positions.setdefault(text1, len(positions)))
+        rows2.append(positions.setdefault(text2, len(positions)))
+    return list(positions), np.asarray(rows1, dtype=np.intp), np.asarray(rows2, dtype=np.intp)
+
+
+def _pair_tfidf_cosine(counts, rows1: np.ndarray, rows2: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity of TF-IDF vectors, with the IDF of each pair fitted on that pair only.
+
+    This reproduces ``TfidfVectorizer().fit_transform([text1, text2])`` for every pair from a single
+    sparse term-count matrix: shared terms weigh 1, other terms weigh ``PAIR_IDF_UNSHARED``.
+    :param counts: Sparse term-count matrix of the deduplicated texts
+    :param rows1: Row of the first text of each pair
+    :param rows2: Row of the second text of each pair
+    :return: Similarity of each pair
+    """
+    counts1, counts2 = counts[rows1], counts[rows2]
+    squared_weight = PAIR_IDF_UNSHARED ** 2
+
+    dot = np.asarray(counts1.multiply(counts2).sum(axis=1)).ravel()
+    shared1 = np.asarray(counts1.power(2).multiply(counts2 > 0).sum(axis=1)).ravel()
+    shared2 = np.asarray(counts2.power(2).multiply(counts1 > 0).sum(axis=1)).ravel()
+    total1 = np.asarray(counts1.power(2).sum(axis=1)).ravel()
+    total2 = np.asarray(counts2.power(2).sum(axis=1)).ravel()
+    norm1 = squared_weight * total1 - (squared_weight - 1) * shared1
+    norm2 = squared_weight * total2 - (squared_weight - 1) * shared2
+
+    denominator = np.sqrt(norm1 * norm2)
+    similarity = np.divide(dot, denominator, out=np.zeros_like(dot), where=denominator > 0)
+    return np.minimum(similarity, 1.0)
+
+
+def _pair_tfidf_cosine_scorer(counts) -> Callable[[slice, slice], np.ndarray]:
+    """
+    All-pairs version of `_pair_tfidf_cosine`: score tiles of the similarity matrix with sparse matrix products.
+    :param counts: Sparse term-count matrix of the texts
+    :return: Function scoring the rows and columns slices of the matrix
+    """
+    counts = counts.tocsr()
+    squares = counts.power(2).tocsr()
+    present = (counts > 0).astype(np.float64).tocsr()
+    totals = np.asarray(squares.sum(axis=1)).ravel()
+    squared_weight = PAIR_IDF_UNSHARED ** 2
+
+    def score(rows: slice, columns: slice) -> np.ndarray:
+        dot = (counts[rows] @ counts[columns].T).toarray()
+        shared1 = (squares[rows] @ present[columns].T).toarray()
+        shared2 = (present[rows] @ squares[columns].T).toarray()
+        norm1 = squared_weight * totals[rows, None] - (squared_weight - 1) * shared1
+        norm2 = squared_weight * totals[None, columns] - (squared_weight - 1) * shared2
+
+        denominator = np.sqrt(norm1 * norm2)
+        similarity = np.divide(dot, denominator, out=np.zeros_like(dot), where=denominator > 0)
+        return np.minimum(similarity, 1.0)
+
+    return score
+
+
+def _tfidf_cosine(text1: str, text2: str) -> float:
+    """Cosine similarity of the TF-IDF vectors of two texts, with the IDF fitted on the pair."""
+    tfidf_matrix = TfidfVectorizer().fit_transform([text1, text2])
+    return float(cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0])
+
+
+def _jaccard(text1: str, text2: str) -> Optional[float]:
+    """Jaccard similarity of the lowercase word sets of two texts, None if neither has words."""
+    # Convert to lowercase and split into words
+    words1 = set(text1.lower().split())
+    words2 = set(text2.lower().split())
+
+    # Calculate Jaccard similarity
+    intersection = len(words1.intersection(words2))
+    union = len(words1.union(words2))
+
+    if union == 0.0:
+        return None
+
+    return float(intersection / union)
+
+
+def _validate_cascade(stages: list[SimilarityMetric], bands: list[tuple[float, float]]):
+    if not stages or SimilarityMetric.CASCADE in stages:
+        raise ValueError("The cascade needs at least one stage, and cannot be one of its stages")
+    if len(bands) != len(stages) - 1 or any(below < 0 or above < 0 for below, above in bands):
+        raise ValueError("The cascade needs one band of non-negative margins per stage but the last")
+
+
+def _normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """Scale each row to unit L2 norm (zero rows are kept as is), so that dot products are cosine similarities."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms > 0)
 
 
 class TextSimilarityService:
-    def __init__(self, cache_service: Optional[CacheService] = None):
-        self._semantic_model: Optional[SentenceTransformer] = None
+    def __init__(self, cache_service: Optional[CacheService] = None, tfidf_model: Optional[TfidfModel] = None,
+                 thread_layout: Optional[ThreadLayout] = None):
+        """
+        :param cache_service: Cache of the similarity scores
+        :param tfidf_model: Corpus-fitted TF-IDF model for cosine similarity (TF-IDF fitted on each pair if None)
+        :param thread_layout: Threads of the executors, derived from the settings and WEB_CONCURRENCY if None
+        """
+        self.model_manager: ModelManager[SentenceTransformer] = ModelManager(
+            f"semantic model {settings.SENTENCE_TRANSFORMER_MODEL}",
+            self._load_semantic_model,
+            self._warm_up_semantic_model
+        )
+        self._embedding_batcher: Optional[EmbeddingBatcher] = None
+        self._embedding_cache: Optional[EmbeddingCache] = None
+        self._embedding_store: Optional[EmbeddingStore] = None
+        self.embedding_store_path: Optional[str] = settings.EMBEDDING_STORE_PATH or None
         self.cache_service: Optional[CacheService] = cache_service
+        self.tfidf_model: Optional[TfidfModel] = tfidf_model
+        self.minhasher = MinHasher(
+            num_perm=settings.MINHASH_NUM_PERM,
+            shingle=settings.MINHASH_SHINGLE,
+            shingle_size=settings.MINHASH_SHINGLE_SIZE
+        )
+
+        # CPU-bound work runs off the event loop, on one bounded executor per class of metric: TF-IDF, Jaccard and
+        # MinHash, and the semantic model, so that a backlog of one does not delay the other
+        self.thread_layout = thread_layout or ThreadLayout.from_settings(settings.WEB_CONCURRENCY)
+        self.cascade_stages = [SimilarityMetric(stage) for stage in settings.CASCADE_STAGES]
+        self.cascade_bands = [(float(below), float(above)) for below, above in settings.CASCADE_BANDS]
+        _validate_cascade(self.cascade_stages, self.cascade_bands)
+        self.cascade_decisions: Counter[SimilarityMetric] = Counter()
+        # Features of the texts of multi-metric requests, computed once per text and shared by the metrics
+        self.text_features: Optional[LRUCache] = LRUCache(
+            settings.TEXT_FEATURES_CACHE_ENTRIES) if settings.TEXT_FEATURES_CACHE_ENTRIES else None
+
+        self.lexical_executor = BoundedExecutor(
+            "lexical", self.thread_layout.lexical_threads, settings.EXECUTOR_MAX_QUEUE)
+        self.semantic_executor = BoundedExecutor(
+            "semantic", self.thread_layout.semantic_threads, settings.EXECUTOR_MAX_QUEUE)
+
+    @staticmethod
+    def _load_semantic_model() -> SentenceTransformer:
+        return SentenceTransformer(
+            settings.SENTENCE_TRANSFORMER_MODEL,
+            cache_folder=f"{Path.home()}/.cache/sentence_transformers"
+        )
+
+    @staticmethod
+    def _warm_up_semantic_model(semantic_model: SentenceTransformer):
+        """Encode batches of the configured sizes, so that the first requests do not pay for lazy initializations."""
+        for batch_size in settings.SEMANTIC_MODEL_WARMUP_BATCH_SIZES:
+            semantic_model.encode(["How do I warm up the semantic similarity model?"] * batch_size)
 
     @property
     async def semantic_model(self) -> Optional[SentenceTransformer]:
-        """Get or create the semantic model."""
-        if self._semantic_model is not None:
-            return self._semantic_model
+        """Get the semantic model, loaded once in a worker thread."""
+        return await self.model_manager.get()
 
-        try:
-            # Initialize semantic similarity model
-            self._semantic_model = SentenceTransformer(
-                settings.SENTENCE_TRANSFORMER_MODEL,
-                cache_folder=f"{Path.home()}/.cache/sentence_transformers"
+    async def _encode(self, texts: list[str]) -> Optional[np.ndarray]:
+        """Embed texts through the micro-batching scheduler, or return None if the semantic model is not available."""
+        semantic_model = await self.semantic_model
+        if semantic_model is None:
+            return None
+
+        if self._embedding_batcher is None:
+            self._embedding_batcher = EmbeddingBatcher(
+                semantic_model.encode,
+                max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+                max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+                executor=self.semantic_executor
             )
-        except Exception as e:
-            print(f"Failed to load semantic model: {e}")
-            self._semantic_model = None
-        
-        return self._semantic_model
+        return await self._embedding_batcher.encode(texts)
+
+    def _get_embedding_store(self, dimension: Optional[int] = None) -> Optional[EmbeddingStore]:
+        """Open the on-disk embedding store of the semantic model, or create it once the dimension is known."""
+        if self._embedding_store is not None or not self.embedding_store_path:
+            return self._embedding_store
+
+        directory = Path(self.embedding_store_path) / settings.SENTENCE_TRANSFORMER_MODEL.replace("/", "__")
+        if dimension is not None or EmbeddingStore.exists(str(directory)):
+            try:
+                self._embedding_store = EmbeddingStore(str(directory), dimension)
+            except Exception as e:
+                print(f"Failed to open embedding store: {e}")
+                self.embedding_store_path = None
+        return self._embedding_store
+
+    def _remember_embeddings(self, digests: list[bytes], embeddings: np.ndarray):
+        """Memoize embeddings in process, creating the memo once the dimension is known."""
+        if self._embedding_cache is None and settings.EMBEDDING_CACHE_MAX_BYTES:
+            self._embedding_cache = EmbeddingCache(
+                embeddings.shape[1],
+                max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES,
+                dtype=settings.EMBEDDING_CACHE_DTYPE
+            )
+        if self._embedding_cache is not None:
+            self._embedding_cache.put_many(digests, embeddings)
+
+    async def embed(self, texts: list[str]) -> Optional[np.ndarray]:
+        """
+        Get the L2-normalized embeddings of texts, encoding only the texts not seen before.
+
+        Lookup order: in-process memo, on-disk store shared by the workers, then the semantic model.
+        :param texts: Texts to embed
+        :return: float32 embeddings, one row per text, or None if the semantic model is not available
+        """
+        digests = [text_digest(text) for text in texts]
+        if self._embedding_cache is not None:
+            embeddings, missing = self._embedding_cache.get_many(digests)
+        else:
+            embeddings, missing = None, list(range(len(texts)))
+
+        embedding_store = self._get_embedding_store()
+        if missing and embedding_store is not None:
+            # File reads under a lock shared with the writers of the other workers, off the event loop
+            stored, store_missing = await asyncio.to_thread(
+                embedding_store.get_many, [digests[index] for index in missing])
+            found = sorted(set(range(len(missing))) - set(store_missing))
+            if found:
+                if embeddings is None:
+                    embeddings = np.zeros((len(texts), embedding_store.dimension), dtype=np.float32)
+                embeddings[[missing[position] for position in found]] = stored[found]
+                self._remember_embeddings([digests[missing[position]] for position in found], stored[found])
+            missing = [missing[position] for position in store_missing]
+
+        if not missing:
+            return embeddings
+
+        encoded = await self._encode([texts[index] for index in missing])
+        if encoded is None:
+            return None
+        encoded = _normalize_rows(encoded)
+        encoded_digests = [digests[index] for index in missing]
+        self._remember_embeddings(encoded_digests, encoded)
+
+        embedding_store = self._get_embedding_store(encoded.shape[1])
+        if embedding_store is not None:
+            await asyncio.to_thread(embedding_store.append_many, encoded_digests, encoded)
+
+        if embeddings is None:
+            return encoded
+        embeddings[missing] = encoded
+        return embeddings
+
+    def _caches_scores(self, metric: SimilarityMetric) -> bool:
+        """
+        Whether scores of a metric go through the similarity cache.
+
+        Scores of the corpus-fitted TF-IDF model change with its IDF table, and its per-text vector cache
+        already makes them a sparse dot product, so they are not cached.
+        """
+        return self.cache_service is not None and not (metric == SimilarityMetric.COSINE and self.tfidf_model)
 
     async def cosine_similarity_tfidf(self, text1: str, text2: str) -> float:
         """Calculate cosine similarity using TF-IDF vectors."""
-        similarity = self.cache_service.get_similarity(
+        if self.tfidf_model is not None:
+            try:
+                return float((await self.lexical_executor.run(self.tfidf_model.similarity, [(text1, text2)]))[0])
+            except ExecutorBusy:
+                raise
+            except Exception as e:
+                print(f"Error calculating cosine similarity: {e}")
+                return 0.0
+
+        similarity = await self.cache_service.get_similarity_async(
             SimilarityMetric.COSINE.value, text1, text2) if self.cache_service else None
         if similarity is not None:
             return similarity
 
         try:
-            vectorizer = TfidfVectorizer()
-            tfidf_matrix = vectorizer.fit_transform([text1, text2])
-            similarity = float(cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0])
+            similarity = await self.lexical_executor.run(_tfidf_cosine, text1, text2)
 
             if self.cache_service:
-                self.cache_service.set_similarity(SimilarityMetric.COSINE.value, text1, text2, similarity)
+                await self.cache_service.set_similarity_async(SimilarityMetric.COSINE.value, text1, text2, similarity)
 
             return similarity
+        except ExecutorBusy:
+            raise
         except Exception as e:
             print(f"Error calculating cosine similarity: {e}")
             return 0.0
 
     async def jaccard_similarity(self, text1: str, text2: str) -> float:
         """Calculate Jaccard similarity based on word sets."""
-        similarity = self.cache_service.get_similarity(
+        similarity = await self.cache_service.get_similarity_async(
             SimilarityMetric.JACCARD.value, text1, text2) if self.cache_service else None
         if similarity is not None:
             return similarity
 
         try:
-            # Convert to lowercase and split into words
-            words1 = set(text1.lower().split())
-            words2 = set(text2.lower().split())
+            similarity = await self.lexical_executor.run(_jaccard, text1, text2)
+            if similarity is None:
+                return 0.0
 
-            # Calculate Jaccard similarity
-            intersection = len(words1.intersection(words2))
-            union = len(words1.union(words2))
+            if self.cache_service:
+                await self.cache_service.set_similarity_async(SimilarityMetric.JACCARD.value, text1, text2, similarity)
 
-            if union == 0.0:
-                return 0.0
+            return similarity
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            print(f"Error calculating Jaccard similarity: {e}")
+            return 0.0
 
-            similarity = float(intersection / union)
+    async def minhash_similarity(self, text1: str, text2: str) -> float:
+        """Estimate Jaccard similarity from MinHash signatures."""
+        similarity = await self.cache_service.get_similarity_async(
+            SimilarityMetric.MINHASH.value, text1, text2) if self.cache_service else None
+        if similarity is not None:
+            return similarity
+
+        try:
+            signatures = await self.lexical_executor.run(self.minhasher.signatures, [text1, text2])
+            similarity = float(MinHasher.estimate_jaccard(signatures[0], signatures[1])[0])
 
             if self.cache_service:
-                self.cache_service.set_similarity(SimilarityMetric.JACCARD.value, text1, text2, similarity)
+                await self.cache_service.set_similarity_async(SimilarityMetric.MINHASH.value, text1, text2, similarity)
 
             return similarity
+        except ExecutorBusy:
+            raise
         except Exception as e:
-            print(f"Error calculating Jaccard similarity: {e}")
+            print(f"Error calculating MinHash similarity: {e}")
             return 0.0
 
     async def semantic_similarity(self, text1: str, text2: str) -> float:
@@ -90,31 +356,414 @@ class TextSimilarityService:
             print("Semantic model not available, falling back to cosine similarity")
             return await self.cosine_similarity_tfidf(text1, text2)
 
-        similarity = self.cache_service.get_similarity(
+        similarity = await self.cache_service.get_similarity_async(
             SimilarityMetric.SEMANTIC.value, text1, text2) if self.cache_service else None
         if similarity is not None:
             return similarity
 
         try:
-            # Get embeddings
-            # embeddings = semantic_model.encode([text1, text2])
-            embeddings = await asyncio.to_thread(semantic_model.encode, [text1, text2])
+            # Get normalized embeddings, memoized per text and batched with those of concurrent requests
+            embeddings = await self.embed([text1, text2])
 
             # Calculate cosine similarity between embeddings
-            similarity = cosine_similarity([embeddings[0]], [embeddings[1]])[0][0]
+            similarity = float(np.dot(embeddings[0], embeddings[1]))
             if self.cache_service:
-                self.cache_service.set_similarity(SimilarityMetric.SEMANTIC.value, text1, text2, similarity)
+                await self.cache_service.set_similarity_async(SimilarityMetric.SEMANTIC.value, text1, text2, similarity)
 
             return float(similarity)
+        except ExecutorBusy:
+            raise
         except Exception as e:
             print(f"Error calculating semantic similarity: {e}")
             return await self.cosine_similarity_tfidf(text1, text2)
 
+    def _cosine_tfidf_batch(self, pairs: list[tuple[str, str]]) -> list[float]:
+        if self.tfidf_model is not None:
+            return self.tfidf_model.similarity(pairs).tolist()
+
+        texts, rows1, rows2 = _index_pairs(pairs)
+        counts = CountVectorizer().fit_transform(texts).astype(np.float64)
+        return _pair_tfidf_cosine(counts, rows1, rows2).tolist()
+
+    async def cosine_similarity_tfidf_batch(self, pairs: list[tuple[str, str]]) -> list[Optional[float]]:
+        """Calculate cosine similarity using TF-IDF vectors for many pairs at once."""
+        try:
+            return await self.lexical_executor.run(self._cosine_tfidf_batch, pairs)
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            print(f"Error calculating batch cosine similarity: {e}")
+            return [None] * len(pairs)
+
+    @staticmethod
+    def _jaccard_batch(pairs: list[tuple[str, str]]) -> list[float]:
+        texts, rows1, rows2 = _index_pairs(pairs)
+        # Binary word-incidence matrix: same tokens as `text.lower().split()`
+        vectorizer = CountVectorizer(tokenizer=str.split, token_pattern=None, binary=True)
+        words = vectorizer.fit_transform(texts)
+        words1, words2 = words[rows1], words[rows2]
+
+        intersection = np.asarray(words1.multiply(words2).sum(axis=1), dtype=np.float64).ravel()
+        union = np.asarray(words1.sum(axis=1) + words2.sum(axis=1), dtype=np.float64).ravel() - intersection
+        similarity = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+        return similarity.tolist()
+
+    async def jaccard_similarity_batch(self, pairs: list[tuple[str, str]]) -> list[Optional[float]]:
+        """Calculate Jaccard similarity based on word sets for many pairs at once."""
+        try:
+            return await self.lexical_executor.run(self._jaccard_batch, pairs)
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            print(f"Error calculating batch Jaccard similarity: {e}")
+            return [None] * len(pairs)
+
+    def _minhash_batch(self, pairs: list[tuple[str, str]]) -> list[float]:
+        texts, rows1, rows2 = _index_pairs(pairs)
+        signatures = self.minhasher.signatures(texts)
+        return MinHasher.estimate_jaccard(signatures[rows1], signatures[rows2]).tolist()
+
+    async def minhash_similarity_batch(self, pairs: list[tuple[str, str]]) -> list[Optional[float]]:
+        """Estimate Jaccard similarity from MinHash signatures for many pairs at once."""
+        try:
+            return await self.lexical_executor.run(self._minhash_batch, pairs)
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            print(f"Error calculating batch MinHash similarity: {e}")
+            return [None] * len(pairs)
+
+    async def _semantic_similarity_batch(self, pairs: list[tuple[str, str]]) -> tuple[list[Optional[float]], bool]:
+        """
+        Calculate semantic similarity for many pairs at once, and whether it fell back to cosine similarity, whose
+        scores must not be cached as semantic ones.
+        """
+        semantic_model = await self.semantic_model
+        if semantic_model is None:
+            print("Semantic model not available, falling back to cosine similarity")
+            return await self.cosine_similarity_tfidf_batch(pairs), True
+
+        try:
+            texts, rows1, rows2 = _index_pairs(pairs)
+            embeddings = await self.embed(texts)
+            similarity = np.einsum("ij,ij->i", embeddings[rows1], embeddings[rows2])
+            return similarity.tolist(), False
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            print(f"Error calculating batch semantic similarity: {e}")
+            return await self.cosine_similarity_tfidf_batch(pairs), True
+
+    async def semantic_similarity_batch(self, pairs: list[tuple[str, str]]) -> list[Optional[float]]:
+        """Calculate semantic similarity using sentence transformers for many pairs at once."""
+        return (await self._semantic_similarity_batch(pairs))[0]
+
+    async def calculate_similarity_batch(self, pairs: list[tuple[str, str]], metric: SimilarityMetric) -> list[float]:
+        """
+        Calculate similarity of many pairs using specified metric.
+
+        Cached pairs are served from the cache, the others are computed together in one pass.
+        :param pairs: (text1, text2) pairs to compare
+        :param metric: Similarity metric to use
+        :return: Similarity score of each pair, in the order of the pairs
+        """
+        if metric == SimilarityMetric.CASCADE:
+            raise ValueError("The cascade metric decides pairs against a threshold, see cascade_similarity_batch")
+        metric_map = {
+            SimilarityMetric.COSINE: self.cosine_similarity_tfidf_batch,
+            SimilarityMetric.JACCARD: self.jaccard_similarity_batch,
+            SimilarityMetric.MINHASH: self.minhash_similarity_batch
+        }
+
+        scores: list[Optional[float]] = await self.cache_service.get_similarities_async(metric.value, pairs) \
+            if self._caches_scores(metric) else [None] * len(pairs)
+        missing = [index for index, score in enumerate(scores) if score is None]
+        if not missing:
+            return scores
+
+        if metric == SimilarityMetric.SEMANTIC:
+            computed, fallback = await self._semantic_similarity_batch([pairs[index] for index in missing])
+        else:
+            computed, fallback = await metric_map[metric]([pairs[index] for index in missing]), False
+        for index, similarity in zip(missing, computed):
+            # Failed computations score 0.0 and are not cached, as in the single-pair path
+            scores[index] = 0.0 if similarity is None else float(similarity)
+
+        # Cosine scores standing in for semantic ones without the model are not cached as semantic scores
+        if self._caches_scores(metric) and not fallback:
+            await self.cache_service.set_similarities_async(metric.value, [
+                (*pairs[index], scores[index])
+                for index, similarity in zip(missing, computed)
+                if similarity is not None
+            ])
+
+        return scores
+
+    async def cascade_similarity_batch(
+            self, pairs: list[tuple[str, str]], threshold: float, stages: Optional[list[SimilarityMetric]] = None,
+            bands: Optional[list[tuple[float, float]]] = None) -> tuple[list[float], list[SimilarityMetric]]:
+        """
+        Calculate similarity of many pairs with the cascade metric, cheapest metrics first.
+
+        Each stage scores the pairs left undecided by the previous ones, and decides those whose score is outside its
+        band around the threshold, i.e. clearly similar or clearly not. The last stage decides the pairs left.
+        :param pairs: (text1, text2) pairs to compare
+        :param threshold: Similarity threshold the pairs are decided against
+        :param stages: Metrics scored in order (default: CASCADE_STAGES)
+        :param bands: (margin below, margin above) the threshold of each stage but the last: scores strictly within
+            the band are undecided (default: CASCADE_BANDS)
+        :return: Similarity score of each pair, from the stage that decided it, and that stage
+        """
+        stages = stages or self.cascade_stages
+        bands = self.cascade_bands if bands is None else bands
+        _validate_cascade(stages, bands)
+
+        scores: list[float] = [0.0] * len(pairs)
+        decided_by: list[Optional[SimilarityMetric]] = [None] * len(pairs)
+        undecided = list(range(len(pairs)))
+        scored_by: Optional[SimilarityMetric] = None
+        for position, stage in enumerate(stages):
+            if not undecided:
+                break
+            if stage == SimilarityMetric.SEMANTIC and scored_by is not None and await self.semantic_model is None:
+                # Without the model, semantic scores fall back to the cosine similarity: the stage is skipped
+                continue
+
+            below, above = bands[position] if position < len(stages) - 1 else (0.0, 0.0)
+            stage_scores = await self.calculate_similarity_batch([pairs[index] for index in undecided], stage)
+            scored_by, left = stage, []
+            for index, score in zip(undecided, stage_scores):
+                scores[index] = score
+                if not threshold - below < score < threshold + above:
+                    decided_by[index] = stage
+                else:
+                    left.append(index)
+            undecided = left
+
+        # Pairs left by a skipped last stage are decided by the last scored one
+        for index in undecided:
+            decided_by[index] = scored_by
+        self.cascade_decisions.update(decided_by)
+        return scores, decided_by
+
+    async def cascade_similarity(self, text1: str, text2: str, threshold: float) -> tuple[float, SimilarityMetric]:
+        """Calculate similarity with the cascade metric, see `cascade_similarity_batch`."""
+        scores, decided_by = await self.cascade_similarity_batch([(text1, text2)], threshold)
+        return scores[0], decided_by[0]
+
+    async def _matrix_scorer(self, texts: list[str], metric: SimilarityMetric) -> Callable[[slice, slice], np.ndarray]:
+        """
+        Vectorize or embed every text once, and return a function scoring tiles of their similarity matrix.
+
+        Tiles give the same scores as the batch methods for the corresponding pairs.
+        """
+        if metric == SimilarityMetric.SEMANTIC:
+            try:
+                embeddings = await self.embed(texts)
+            except ExecutorBusy:
+                raise
+            except Exception as e:
+                print(f"Error calculating semantic embeddings: {e}")
+                embeddings = None
+            if embeddings is not None:
+                return lambda rows, columns: embeddings[rows] @ embeddings[columns].T
+            print("Semantic model not available, falling back to cosine similarity")
+            metric = SimilarityMetric.COSINE
+
+        return await self.lexical_executor.run(self._lexical_matrix_scorer, texts, metric)
+
+    def _lexical_matrix_scorer(self, texts: list[str],
+                               metric: SimilarityMetric) -> Callable[[slice, slice], np.ndarray]:
+        if metric == SimilarityMetric.COSINE:
+            if self.tfidf_model is not None:
+                vectors = self.tfidf_model.transform(texts)
+                return lambda rows, columns: np.minimum((vectors[rows] @ vectors[columns].T).toarray(), 1.0)
+            return _pair_tfidf_cosine_scorer(CountVectorizer().fit_transform(texts).astype(np.float64))
+
+        if metric == SimilarityMetric.MINHASH:
+            signatures = self.minhasher.signatures(texts)
+
+            def score_minhash(rows: slice, columns: slice) -> np.ndarray:
+                # Count equal components one permutation at a time, to keep the memory to one tile
+                signatures1, signatures2 = signatures[rows], signatures[columns]
+                equal = np.zeros((signatures1.shape[0], signatures2.shape[0]), dtype=np.uint32)
+                for permutation in range(signatures.shape[1]):
+                    equal += signatures1[:, permutation, None] == signatures2[None, :, permutation]
+                empty1 = MinHasher.estimate_jaccard(signatures1, signatures1) == 0
+                empty2 = MinHasher.estimate_jaccard(signatures2, signatures2) == 0
+                similarity = equal / signatures.shape[1]
+                similarity[empty1] = 0.0
+                similarity[:, empty2] = 0.0
+                return similarity
+
+            return score_minhash
+
+        vectorizer = CountVectorizer(tokenizer=str.split, token_pattern=None, binary=True)
+        words = vectorizer.fit_transform(texts).astype(np.float64).tocsr()
+        sizes = np.asarray(words.sum(axis=1)).ravel()
+
+        def score_jaccard(rows: slice, columns: slice) -> np.ndarray:
+            intersection = (words[rows] @ words[columns].T).toarray()
+            union = sizes[rows, None] + sizes[None, columns] - intersection
+            return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+        return score_jaccard
+
+    async def similarity_matrix(self, texts: list[str], metric: SimilarityMetric, upper_triangular: bool = False,
+                                block_rows: int = 256, tile_size: int = 2048) -> AsyncIterator[tuple[int, np.ndarray]]:
+        """
+        Calculate the pairwise similarity matrix of texts, one block of rows at a time.
+
+        Each text is vectorized or embedded once; blocks are computed in `block_rows` x `tile_size` tiles in a
+        thread of the lexical executor, so the memory stays bounded by one block whatever the number of texts.
+        :param texts: Texts to compare
+        :param metric: Similarity metric to use
+        :param upper_triangular: Only compute the columns right of the diagonal
+        :param block_rows: Number of rows per block
+        :param tile_size: Number of columns scored at once
+        :return: Async iterator of (first row, float32 block) pairs. Only the first block can be refused with
+            `ExecutorBusy`, the next ones wait for the executor. A block holds every column, or in upper-triangular
+            mode the columns after the first row of the block, row `first_row + r` starting at column `r` of the block
+        """
+        score = await self._matrix_scorer(texts, metric)
+        size = len(texts)
+
+        def compute_block(start: int, stop: int) -> np.ndarray:
+            first_column = start + 1 if upper_triangular else 0
+            block = np.empty((stop - start, size - first_column), dtype=np.float32)
+            for column in range(first_column, size, tile_size):
+                columns = slice(column, min(column + tile_size, size))
+                block[:, columns.start - first_column:columns.stop - first_column] = score(slice(start, stop), columns)
+            return block
+
+        for start in range(0, size, block_rows):
+            stop = min(start + block_rows, size)
+            yield start, await self.lexical_executor.run(compute_block, start, stop, admitted=start > 0)
+
+    def _get_text_features(self, text: str) -> TextFeatures:
+        """Get the feature bundle of a text, shared with the previous requests scoring the same text."""
+        if self.text_features is None:
+            return TextFeatures(text)
+        key = text_digest(text, normalize=False)
+        features = self.text_features.get(key)
+        if features is None:
+            features = TextFeatures(text)
+            self.text_features.set(key, features)
+        return features
+
+    def _score_features(self, features1: TextFeatures, features2: TextFeatures,
+                        metrics: list[SimilarityMetric]) -> dict[SimilarityMetric, Optional[float]]:
+        """Score a pair with lexical metrics from the features of its texts, None for a Jaccard of no words."""
+        scores = {}
+        for metric in metrics:
+            if metric == SimilarityMetric.COSINE:
+                scores[metric] = corpus_tfidf_cosine(features1, features2, self.tfidf_model) \
+                    if self.tfidf_model is not None else pair_tfidf_cosine(features1, features2)
+            elif metric == SimilarityMetric.JACCARD:
+                scores[metric] = jaccard(features1, features2)
+            elif metric == SimilarityMetric.MINHASH:
+                scores[metric] = minhash_jaccard(features1, features2, self.minhasher)
+        return scores
+
+    async def calculate_similarities(self, text1: str, text2: str,
+                                     metrics: list[SimilarityMetric]) -> dict[SimilarityMetric, float]:
+        """
+        Score a pair with several metrics, processing each text once.
+
+        Each text gets a feature bundle whose features are computed only when a requested metric needs them, then all
+        scores come from the bundles: e.g. cosine, Jaccard and semantic scores tokenize each text twice (TF-IDF terms
+        and words) and encode it once, instead of once per metric in three requests.
+        :param text1: First text
+        :param text2: Second text
+        :param metrics: Metrics to score, other than cascade
+        :return: Score of each metric, the semantic score falling back to cosine if the model is not available
+        """
+        if SimilarityMetric.CASCADE in metrics:
+            raise ValueError("The cascade metric decides pairs against a threshold, see cascade_similarity")
+
+        scores: dict[SimilarityMetric, float] = {}
+        for metric in metrics:
+            if self._caches_scores(metric):
+                similarity = await self.cache_service.get_similarity_async(metric.value, text1, text2)
+                if similarity is not None:
+                    scores[metric] = similarity
+        missing = [metric for metric in metrics if metric not in scores]
+        if not missing:
+            return scores
+
+        features1, features2 = self._get_text_features(text1), self._get_text_features(text2)
+        lexical = [metric for metric in missing if metric != SimilarityMetric.SEMANTIC]
+        semantic_fallback = False
+        if SimilarityMetric.SEMANTIC in missing:
+            if features1.embedding is None or features2.embedding is None:
+                try:
+                    embeddings = await self.embed([text1, text2])
+                except ExecutorBusy:
+                    raise
+                except Exception as e:
+                    print(f"Error calculating semantic similarity: {e}")
+                    embeddings = None
+                if embeddings is not None:
+                    features1.embedding, features2.embedding = embeddings[0], embeddings[1]
+            if features1.embedding is not None and features2.embedding is not None:
+                scores[SimilarityMetric.SEMANTIC] = float(np.dot(features1.embedding, features2.embedding))
+            else:
+                print("Semantic model not available, falling back to cosine similarity")
+                semantic_fallback = True
+                if SimilarityMetric.COSINE not in lexical:
+                    lexical.append(SimilarityMetric.COSINE)
+
+        if lexical:
+            try:
+                lexical_scores = await self.lexical_executor.run(self._score_features, features1, features2, lexical)
+            except ExecutorBusy:
+                raise
+            except Exception as e:
+                print(f"Error calculating lexical similarities: {e}")
+                lexical_scores = dict.fromkeys(lexical)
+            scores.update(lexical_scores)
+        if semantic_fallback:
+            scores[SimilarityMetric.SEMANTIC] = scores[SimilarityMetric.COSINE]
+
+        # None scores, of a Jaccard of no words or of a failed metric, are 0.0 and not cached
+        for metric in missing:
+            similarity = scores[metric]
+            if similarity is None:
+                scores[metric] = 0.0
+            elif self._caches_scores(metric) and not (metric == SimilarityMetric.SEMANTIC and semantic_fallback):
+                await self.cache_service.set_similarity_async(metric.value, text1, text2, similarity)
+        # Only the requested metrics, in the requested order
+        return {metric: scores[metric] for metric in metrics}
+
+    def close(self):
+        """Stop the threads of the executors."""
+        self.lexical_executor.close()
+        self.semantic_executor.close()
+
+    def stats(self) -> dict:
+        """Get runtime statistics of the similarity service."""
+        return {
+            "embedding_batcher": self._embedding_batcher.stats() if self._embedding_batcher else None,
+            "embedding_cache": self._embedding_cache.stats() if self._embedding_cache else None,
+            "embedding_store": self._embedding_store.stats() if self._embedding_store else None,
+            "text_features": self.text_features.stats() if self.text_features else None,
+            "cascade_decisions": {stage.value: count for stage, count in self.cascade_decisions.items()},
+            "executors": {
+                "lexical": self.lexical_executor.stats(),
+                "semantic": self.semantic_executor.stats()
+            },
+            "semantic_model": self.model_manager.stats(),
+            "tfidf_model": self.tfidf_model.stats() if self.tfidf_model else None
+        }
+
     async def calculate_similarity(self, text1: str, text2: str, metric: SimilarityMetric) -> float:
         """Calculate similarity using specified metric."""
+        if metric == SimilarityMetric.CASCADE:
+            raise ValueError("The cascade metric decides pairs against a threshold, see cascade_similarity")
         metric_map = {
             SimilarityMetric.COSINE: self.cosine_similarity_tfidf,
             SimilarityMetric.JACCARD: self.jaccard_similarity,
+            SimilarityMetric.MINHASH: self.minhash_similarity,
             SimilarityMetric.SEMANTIC: self.semantic_similarity
         }
 
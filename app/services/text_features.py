@@ -0,0 +1,109 @@
+import math
+import re
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+
+from app.services.minhash_service import MinHasher
+from app.services.tfidf_model import TfidfModel
+
+# Terms of TfidfVectorizer: lowercase words of two or more characters
+_TERM_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+# IDF weight of a term that occurs in only one document of a two-document corpus,
+# using the smooth IDF of TfidfVectorizer: ln((1 + n) / (1 + df)) + 1 with n = 2, df = 1.
+# Terms shared by both documents get ln(3 / 3) + 1 = 1.
+PAIR_IDF_UNSHARED = math.log(3 / 2) + 1
+
+
+class TextFeatures:
+    """
+    The features of a text, each computed on first use and kept for the next metrics scoring the text.
+
+    A request scoring a pair with several metrics tokenizes and vectorizes each text once, whatever the metrics, and
+    only computes the features the metrics need: normalized tokens and token set (Jaccard), TF-IDF term counts or
+    corpus TF-IDF vector (cosine), MinHash signature, and embedding (semantic, set by the similarity service).
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self._tokens: Optional[list[str]] = None
+        self._token_set: Optional[frozenset[str]] = None
+        self._term_counts: Optional[Counter[str]] = None
+        self._tfidf_vector: Optional[sparse.csr_matrix] = None
+        self._tfidf_version: Optional[int] = None
+        self._signature: Optional[np.ndarray] = None
+        self.embedding: Optional[np.ndarray] = None
+
+    @property
+    def tokens(self) -> list[str]:
+        """Lowercase words, split on whitespace."""
+        if self._tokens is None:
+            self._tokens = self.text.lower().split()
+        return self._tokens
+
+    @property
+    def token_set(self) -> frozenset[str]:
+        if self._token_set is None:
+            self._token_set = frozenset(self.tokens)
+        return self._token_set
+
+    @property
+    def term_counts(self) -> Counter[str]:
+        """Counts of the TF-IDF terms, the sparse term-count vector of TfidfVectorizer."""
+        if self._term_counts is None:
+            self._term_counts = Counter(_TERM_PATTERN.findall(self.text.lower()))
+        return self._term_counts
+
+    def tfidf_vector(self, tfidf_model: TfidfModel) -> sparse.csr_matrix:
+        """L2-normalized TF-IDF vector of a corpus-fitted model, computed again once the model is updated."""
+        if self._tfidf_vector is None or self._tfidf_version != tfidf_model.document_count:
+            self._tfidf_version = tfidf_model.document_count
+            self._tfidf_vector = tfidf_model.transform([self.text])
+        return self._tfidf_vector
+
+    def signature(self, minhasher: MinHasher) -> np.ndarray:
+        if self._signature is None:
+            self._signature = minhasher.signatures([self.text])
+        return self._signature
+
+
+def jaccard(features1: TextFeatures, features2: TextFeatures) -> Optional[float]:
+    """Jaccard similarity of the token sets, None if neither text has tokens."""
+    union = len(features1.token_set | features2.token_set)
+    if union == 0:
+        return None
+    return len(features1.token_set & features2.token_set) / union
+
+
+def pair_tfidf_cosine(features1: TextFeatures, features2: TextFeatures) -> float:
+    """
+    Cosine similarity of TF-IDF vectors with the IDF fitted on the pair, from the term counts of each text.
+
+    Terms of both texts weigh 1, the others `PAIR_IDF_UNSHARED`, as in `TfidfVectorizer().fit_transform([t1, t2])`.
+    """
+    counts1, counts2 = features1.term_counts, features2.term_counts
+    squared_weight = PAIR_IDF_UNSHARED ** 2
+    dot = norm1 = norm2 = 0.0
+    for term, count in counts1.items():
+        other = counts2.get(term, 0)
+        dot += count * other
+        norm1 += count * count * (1.0 if other else squared_weight)
+    for term, count in counts2.items():
+        norm2 += count * count * (1.0 if term in counts1 else squared_weight)
+
+    denominator = math.sqrt(norm1 * norm2)
+    return min(dot / denominator, 1.0) if denominator > 0 else 0.0
+
+
+def corpus_tfidf_cosine(features1: TextFeatures, features2: TextFeatures, tfidf_model: TfidfModel) -> float:
+    """Cosine similarity of the TF-IDF vectors of a corpus-fitted model."""
+    vector1, vector2 = features1.tfidf_vector(tfidf_model), features2.tfidf_vector(tfidf_model)
+    return min(float(vector1.multiply(vector2).sum()), 1.0)
+
+
+def minhash_jaccard(features1: TextFeatures, features2: TextFeatures, minhasher: MinHasher) -> float:
+    """Jaccard similarity estimated from the MinHash signatures."""
+    return float(MinHasher.estimate_jaccard(features1.signature(minhasher), features2.signature(minhasher))[0])
@@ -0,0 +1,136 @@
+import threading
+from typing import Iterable, Optional
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from app.utils.config import settings
+from app.utils.hashing import text_digest
+from app.utils.lru_cache import LRUCache
+
+
+class TfidfModel:
+    """
+    A reusable TF-IDF model: hashed term counts weighted by an IDF table fitted on a corpus.
+
+    Unlike a `TfidfVectorizer` fitted per pair, nothing is fitted on the request path: the stateless
+    `HashingVectorizer` maps texts to term counts, and the IDF table can be updated incrementally with new documents.
+    Vectors are cached per text until the next IDF update, so a repeated pair costs one sparse dot product.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, vector_cache_entries: int = 10_000):
+        """
+        :param n_features: Number of hashed term features
+        :param vector_cache_entries: Maximum number of TF-IDF vectors cached per text
+        """
+        # Same tokens as TfidfVectorizer: lowercase, words of two or more characters
+        self._vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+        self._document_frequency = np.zeros(n_features, dtype=np.int64)
+        self._idf: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._vectors = LRUCache(max_entries=vector_cache_entries)
+        self.document_count = 0
+
+    @classmethod
+    def from_corpus_file(cls, path: str, chunk_size: int = 10_000, **kwargs) -> "TfidfModel":
+        """
+        Fit a model on a corpus file, one document per line, read in chunks.
+        :param path: Corpus file path
+        :param chunk_size: Number of documents counted at once
+        :return: The fitted model
+        """
+        model = cls(**kwargs)
+        with open(path, encoding="utf-8") as file:
+            chunk = []
+            for line in file:
+                if line.strip():
+                    chunk.append(line.strip())
+                if len(chunk) >= chunk_size:
+                    model.partial_fit(chunk)
+                    chunk = []
+            if chunk:
+                model.partial_fit(chunk)
+        return model
+
+    def partial_fit(self, texts: Iterable[str]) -> "TfidfModel":
+        """Update the IDF table with new documents, invalidating the cached vectors."""
+        return self._update(texts, 1)
+
+    def partial_unfit(self, texts: Iterable[str]) -> "TfidfModel":
+        """Remove documents fitted before from the IDF table, e.g. replaced or removed ones."""
+        return self._update(texts, -1)
+
+    def _update(self, texts: Iterable[str], sign: int) -> "TfidfModel":
+        texts = list(texts)
+        if not texts:
+            return self
+        counts = self._vectorizer.transform(texts)
+        document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+        with self._lock:
+            self._document_frequency += sign * document_frequency
+            self.document_count += sign * counts.shape[0]
+            self._idf = None
+            self._vectors.clear()
+        return self
+
+    @property
+    def idf(self) -> np.ndarray:
+        """Smooth IDF as in TfidfVectorizer: ln((1 + n) / (1 + df)) + 1."""
+        with self._lock:
+            if self._idf is None:
+                self._idf = np.log((1 + self.document_count) / (1 + self._document_frequency)) + 1
+            return self._idf
+
+    def transform(self, texts: list[str]) -> sparse.csr_matrix:
+        """
+        Get the L2-normalized TF-IDF vectors of texts, from the cache when possible.
+        :param texts: Texts to vectorize
+        :return: Sparse matrix, one row per text
+        """
+        digests = [text_digest(text) for text in texts]
+        rows = [self._vectors.get(digest, tag="tfidf") for digest in digests]
+        missing = [index for index, row in enumerate(rows) if row is None]
+        if missing:
+            counts = self._vectorizer.transform([texts[index] for index in missing])
+            vectors = normalize(counts.multiply(self.idf).tocsr())
+            for position, index in enumerate(missing):
+                rows[index] = vectors[position]
+                self._vectors.set(digests[index], rows[index], tag="tfidf")
+        return sparse.vstack(rows, format="csr")
+
+    def similarity(self, pairs: list[tuple[str, str]]) -> np.ndarray:
+        """
+        Cosine similarity of the TF-IDF vectors of many pairs.
+        :param pairs: (text1, text2) pairs
+        :return: Similarity of each pair
+        """
+        texts = list(dict.fromkeys(text for pair in pairs for text in pair))
+        positions = {text: position for position, text in enumerate(texts)}
+        vectors = self.transform(texts)
+        vectors1 = vectors[[positions[text1] for text1, _ in pairs]]
+        vectors2 = vectors[[positions[text2] for _, text2 in pairs]]
+        return np.minimum(np.asarray(vectors1.multiply(vectors2).sum(axis=1)).ravel(), 1.0)
+
+    def stats(self) -> dict:
+        """Get the corpus size and vector cache statistics."""
+        return {
+            "documents": self.document_count,
+            "n_features": self._document_frequency.shape[0],
+            "vector_cache": self._vectors.stats()
+        }
+
+
+def load_tfidf_model() -> Optional[TfidfModel]:
+    """Create the TF-IDF model of the settings: fitted on TFIDF_CORPUS_PATH in corpus mode, None in pair mode."""
+    if settings.TFIDF_MODE != "corpus":
+        return None
+    tfidf_options = {
+        "n_features": settings.TFIDF_N_FEATURES,
+        "vector_cache_entries": settings.TFIDF_VECTOR_CACHE_ENTRIES
+    }
+    tfidf_model = TfidfModel.from_corpus_file(settings.TFIDF_CORPUS_PATH, **tfidf_options) \
+        if settings.TFIDF_CORPUS_PATH else TfidfModel(**tfidf_options)
+    print(f"Loaded TF-IDF model fitted on {tfidf_model.document_count} documents")
+    return tfidf_model
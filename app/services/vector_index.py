@@ -0,0 +1,121 @@
+from typing import Callable, Optional
+
+import numpy as np
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Get the positions of the k highest scores, highest first, with `argpartition` instead of a full sort."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def blocked_top_k(matrix, query, k: int, block_size: int = 8192,
+                  transform: Optional[Callable[[np.ndarray, int, int], np.ndarray]] = None
+                  ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k inner-product search in memory-bounded blocks of rows.
+
+    Each block is scored with one matrix-vector product and reduced to its own top-k,
+    and the per-block winners are merged at the end.
+    :param matrix: Dense or sparse (CSR) matrix, one row per document
+    :param query: Query vector (dense), or query row (sparse, 1 x dimension)
+    :param k: Number of results
+    :param block_size: Number of rows scored at once
+    :param transform: Function turning the inner products of rows [start, stop) into scores, e.g. Jaccard
+    :return: Rows and scores of the results, highest score first
+    """
+    rows, scores = [], []
+    for start in range(0, matrix.shape[0], block_size):
+        block_scores = matrix[start:start + block_size] @ query.T
+        block_scores = np.asarray(block_scores.todense() if hasattr(block_scores, "todense") else block_scores)
+        block_scores = block_scores.ravel()
+        if transform is not None:
+            block_scores = transform(block_scores, start, start + block_scores.shape[0])
+        best = top_k(block_scores, k)
+        rows.append(best + start)
+        scores.append(block_scores[best])
+
+    if not rows:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+    rows, scores = np.concatenate(rows), np.concatenate(scores)
+    best = top_k(scores, k)
+    return rows[best], scores[best]
+
+
+class IVFIndex:
+    """
+    An approximate inner-product index over L2-normalized vectors (inverted file).
+
+    Vectors are clustered with spherical k-means; a query is only scored against the vectors
+    of the `n_probe` clusters whose centroids are closest to it.
+    """
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8, n_iterations: int = 10, seed: int = 0):
+        """
+        :param n_lists: Number of clusters (square root of the number of vectors if None)
+        :param n_probe: Number of clusters scanned per query, trades recall for latency
+        :param n_iterations: Number of k-means iterations
+        :param seed: Random seed of the centroid initialization
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iterations = n_iterations
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._list_rows: list[np.ndarray] = []
+
+    def _assign(self, vectors: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        """Get the closest centroid of each vector."""
+        return np.concatenate([
+            np.argmax(vectors[start:start + block_size] @ self.centroids.T, axis=1)
+            for start in range(0, vectors.shape[0], block_size)
+        ]) if vectors.shape[0] else np.empty(0, dtype=np.intp)
+
+    def fit(self, vectors: np.ndarray) -> "IVFIndex":
+        """
+        Cluster and index the vectors.
+        :param vectors: L2-normalized vectors, one row per document
+        :return: The index
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n_lists = self.n_lists or max(1, int(np.sqrt(vectors.shape[0])))
+        n_lists = min(n_lists, vectors.shape[0]) or 1
+
+        rng = np.random.default_rng(self.seed)
+        self.centroids = vectors[rng.choice(vectors.shape[0], n_lists, replace=False)].copy() \
+            if vectors.shape[0] else np.zeros((1, vectors.shape[1]), dtype=np.float32)
+        for _ in range(self.n_iterations):
+            assignment = self._assign(vectors)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignment, vectors)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid
+            self.centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), self.centroids)
+
+        assignment = self._assign(vectors)
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(self.centroids.shape[0] + 1))
+        self._list_rows = [order[bounds[i]:bounds[i + 1]] for i in range(self.centroids.shape[0])]
+        self._vectors = vectors
+        return self
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k inner-product search.
+        :param query: L2-normalized query vector
+        :param k: Number of results
+        :return: Rows and scores of the results, highest score first
+        """
+        if self.centroids is None:
+            raise ValueError("Index is not fitted")
+
+        probes = top_k(self.centroids @ query, self.n_probe)
+        candidates = np.concatenate([self._list_rows[probe] for probe in probes])
+        scores = self._vectors[candidates] @ query
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
@@ -17,6 +17,30 @@ class Settings(BaseSettings):
     LLM_TIMEOUT: float = os.environ.get("LLM_TIMEOUT", 30.0)
     LLM_MAX_RETRIES: int = os.environ.get("LLM_MAX_RETRIES", 3)
     LLM_TEMPERATURE: float = os.environ.get("LLM_TEMPERATURE", 0.7)
+    # Shared HTTP client of the LLM: connection pool, keep-alive, and maximum number of generations at once
+    LLM_MAX_CONNECTIONS: int = os.environ.get("LLM_MAX_CONNECTIONS", 10)
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", 10)
+    LLM_KEEPALIVE_EXPIRY: float = os.environ.get("LLM_KEEPALIVE_EXPIRY", 30.0)
+    LLM_MAX_CONCURRENT_GENERATIONS: int = os.environ.get("LLM_MAX_CONCURRENT_GENERATIONS", 4)
+    # Circuit breaker of the LLM generations, and interval of the background availability probe (0 disables it)
+    LLM_CIRCUIT_FAILURE_RATE: float = os.environ.get("LLM_CIRCUIT_FAILURE_RATE", 0.5)
+    LLM_CIRCUIT_MINIMUM_CALLS: int = os.environ.get("LLM_CIRCUIT_MINIMUM_CALLS", 5)
+    LLM_CIRCUIT_WINDOW: int = os.environ.get("LLM_CIRCUIT_WINDOW", 20)
+    LLM_CIRCUIT_OPEN_SECONDS: float = os.environ.get("LLM_CIRCUIT_OPEN_SECONDS", 30.0)
+    LLM_PROBE_INTERVAL_SECONDS: float = os.environ.get("LLM_PROBE_INTERVAL_SECONDS", 10.0)
+    # Queue of the LLM jobs of `llm_job` requests: workers, maximum number of waiting jobs, and result lifetime
+    LLM_JOB_WORKERS: int = os.environ.get("LLM_JOB_WORKERS", 4)
+    LLM_JOB_QUEUE_MAX_SIZE: int = os.environ.get("LLM_JOB_QUEUE_MAX_SIZE", 1000)
+    LLM_JOB_RESULT_TTL_SECONDS: float = os.environ.get("LLM_JOB_RESULT_TTL_SECONDS", 3600.0)
+    # Characters of a streamed LLM response held back by the incremental sanitizer (longest pattern caught across chunks)
+    LLM_STREAM_SANITIZE_WINDOW: int = os.environ.get("LLM_STREAM_SANITIZE_WINDOW", 128)
+    # Cache of the LLM responses, used by requests opting in with `cache_llm_response` (0 TTL disables expiry)
+    LLM_RESPONSE_CACHE_MAX_ENTRIES: int = os.environ.get("LLM_RESPONSE_CACHE_MAX_ENTRIES", 1000)
+    LLM_RESPONSE_CACHE_TTL_SECONDS: float = os.environ.get("LLM_RESPONSE_CACHE_TTL_SECONDS", 3600.0)
+    # Semantic response cache: reuse the response of an answered prompt whose embedding is within the cosine
+    # similarity threshold (0 entries disables it), for the same opted-in requests
+    LLM_SEMANTIC_CACHE_MAX_ENTRIES: int = os.environ.get("LLM_SEMANTIC_CACHE_MAX_ENTRIES", 10_000)
+    LLM_SEMANTIC_CACHE_THRESHOLD: float = os.environ.get("LLM_SEMANTIC_CACHE_THRESHOLD", 0.95)
 
     # Logging
     LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "INFO")
@@ -27,9 +51,80 @@ class Settings(BaseSettings):
 
     # Sentence Transformer Model
     SENTENCE_TRANSFORMER_MODEL: str = os.environ.get('SENTENCE_TRANSFORMER_MODEL', "all-MiniLM-L6-v2")
+    # Load the semantic model and encode warm-up batches of these sizes at startup, before accepting traffic
+    SEMANTIC_MODEL_PRELOAD: bool = os.environ.get('SEMANTIC_MODEL_PRELOAD', False)
+    SEMANTIC_MODEL_WARMUP_BATCH_SIZES: list[int] = os.environ.get('SEMANTIC_MODEL_WARMUP_BATCH_SIZES', [1, 8, 64])
+
+    # Cascade metric: stages scored in order (JSON list), each next stage only for the pairs whose score is within the
+    # band of the stage around the similarity threshold: [margin below, margin above] per stage but the last, which
+    # decides the pairs left. Lexical scores of paraphrases are low, so lexical stages only decide clear-cut pairs
+    CASCADE_STAGES: list[str] = os.environ.get('CASCADE_STAGES', ["jaccard", "cosine", "semantic"])
+    CASCADE_BANDS: list[tuple[float, float]] = os.environ.get('CASCADE_BANDS', [(0.6, 0.3), (0.5, 0.2)])
+
+    # Similarity cache (0 disables the size / time bound)
+    CACHE_MAX_ENTRIES: int = os.environ.get('CACHE_MAX_ENTRIES', 100_000)
+    CACHE_MAX_BYTES: int = os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024)
+    CACHE_TTL_SECONDS: float = os.environ.get('CACHE_TTL_SECONDS', 0)
+
+    # Similarity cache snapshot, loaded on startup and saved on shutdown (disabled if no path)
+    CACHE_SNAPSHOT_PATH: str = os.environ.get('CACHE_SNAPSHOT_PATH', "")
+
+    # Shared similarity cache tier (disabled if no URL), e.g. redis://redis:6379/0
+    CACHE_REDIS_URL: str = os.environ.get('CACHE_REDIS_URL', "")
+    CACHE_REDIS_TTL_SECONDS: float = os.environ.get('CACHE_REDIS_TTL_SECONDS', 0)
+    CACHE_REDIS_SOCKET_TIMEOUT: float = os.environ.get('CACHE_REDIS_SOCKET_TIMEOUT', 0.1)
+    CACHE_REDIS_RETRY_AFTER_SECONDS: float = os.environ.get('CACHE_REDIS_RETRY_AFTER_SECONDS', 30.0)
+
+    # Embedding micro-batching
+    EMBEDDING_BATCH_MAX_SIZE: int = os.environ.get('EMBEDDING_BATCH_MAX_SIZE', 64)
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = os.environ.get('EMBEDDING_BATCH_MAX_WAIT_MS', 5.0)
+
+    # Embedding memo per text (0 disables it), float32 or float16 storage
+    EMBEDDING_CACHE_MAX_BYTES: int = os.environ.get('EMBEDDING_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+    EMBEDDING_CACHE_DTYPE: str = os.environ.get('EMBEDDING_CACHE_DTYPE', "float32")
+
+    # On-disk embedding store shared by the workers of a host (disabled if no path)
+    EMBEDDING_STORE_PATH: str = os.environ.get('EMBEDDING_STORE_PATH', "")
+
+    # Memo of sanitized texts, repeated prompts being sanitized once (0 disables it)
+    SANITIZATION_MEMO_MAX_ENTRIES: int = os.environ.get('SANITIZATION_MEMO_MAX_ENTRIES', 10_000)
+
+    # TF-IDF for cosine similarity: "pair" fits it on each pair, "corpus" uses one model fitted at startup
+    # on the corpus file (one document per line, if any) and updated with the documents added to the search corpus
+    TFIDF_MODE: str = os.environ.get('TFIDF_MODE', "pair")
+    TFIDF_CORPUS_PATH: str = os.environ.get('TFIDF_CORPUS_PATH', "")
+    TFIDF_N_FEATURES: int = os.environ.get('TFIDF_N_FEATURES', 2 ** 18)
+    TFIDF_VECTOR_CACHE_ENTRIES: int = os.environ.get('TFIDF_VECTOR_CACHE_ENTRIES', 10_000)
+
+    # MinHash signatures for approximate Jaccard similarity ("word" or "char" shingles)
+    MINHASH_NUM_PERM: int = os.environ.get('MINHASH_NUM_PERM', 128)
+    MINHASH_SHINGLE: str = os.environ.get('MINHASH_SHINGLE', "word")
+    MINHASH_SHINGLE_SIZE: int = os.environ.get('MINHASH_SHINGLE_SIZE', 1)
+    MINHASH_LSH_THRESHOLD: float = os.environ.get('MINHASH_LSH_THRESHOLD', 0.5)
+
+    # Features of the texts of multi-metric requests (tokens, TF-IDF vector, MinHash signature, embedding), kept
+    # per text so that each metric reuses them (0 disables the cache)
+    TEXT_FEATURES_CACHE_ENTRIES: int = os.environ.get('TEXT_FEATURES_CACHE_ENTRIES', 10_000)
+
+    # Similarity matrix: rows per streamed block are sized so that a block stays under the byte budget
+    MATRIX_BLOCK_MAX_BYTES: int = os.environ.get('MATRIX_BLOCK_MAX_BYTES', 16 * 1024 * 1024)
+    MATRIX_TILE_SIZE: int = os.environ.get('MATRIX_TILE_SIZE', 2048)
+
+    # Corpus search (0 lists sizes the approximate index to the square root of the corpus)
+    SEARCH_BLOCK_SIZE: int = os.environ.get('SEARCH_BLOCK_SIZE', 8192)
+    SEARCH_IVF_N_LISTS: int = os.environ.get('SEARCH_IVF_N_LISTS', 0)
+    SEARCH_IVF_N_PROBE: int = os.environ.get('SEARCH_IVF_N_PROBE', 8)
 
     # Worker configuration
     WEB_CONCURRENCY: int = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count()))
 
+    # Threads of each worker (0 derives them from the cores per worker, the CPU count over WEB_CONCURRENCY), and
+    # tasks waiting per executor before new ones are refused
+    SIMILARITY_EXECUTOR_THREADS: int = os.environ.get('SIMILARITY_EXECUTOR_THREADS', 0)
+    SEMANTIC_EXECUTOR_THREADS: int = os.environ.get('SEMANTIC_EXECUTOR_THREADS', 1)
+    TORCH_NUM_THREADS: int = os.environ.get('TORCH_NUM_THREADS', 0)
+    BLAS_NUM_THREADS: int = os.environ.get('BLAS_NUM_THREADS', 0)
+    EXECUTOR_MAX_QUEUE: int = os.environ.get('EXECUTOR_MAX_QUEUE', 64)
+
 
 settings = Settings()
@@ -0,0 +1,23 @@
+import hashlib
+import unicodedata
+
+DIGEST_SIZE = 16
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing: NFC unicode composition and surrounding whitespace removed."""
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def text_digest(text: str, normalize: bool = True) -> bytes:
+    """
+    Get a stable content digest of a text.
+
+    Unlike the built-in `hash()`, the digest does not depend on the process (PYTHONHASHSEED),
+    so it can be shared between workers and persisted. 128 bits make collisions negligible.
+    :param text: Text to hash
+    :param normalize: Hash the normalized text, so that texts differing only by normalization share a digest
+    """
+    if normalize:
+        text = normalize_text(text)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
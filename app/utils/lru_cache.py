@@ -0,0 +1,146 @@
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, asdict
+from typing import Any, Hashable, Iterator, Optional
+
+# Approximate overhead of an entry besides its key and value: ordered dict node and entry record
+_ENTRY_OVERHEAD_BYTES = 120
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+
+@dataclass
+class _Entry:
+    value: Any
+    tag: str
+    size: int
+    expires_at: Optional[float]
+
+
+class LRUCache:
+    """
+    A thread-safe LRU cache bounded by entry count and approximate size, with optional TTL.
+
+    Each entry carries a tag (e.g. a similarity metric) under which hits, misses, evictions,
+    and resident size are accounted.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        """
+        :param max_entries: Maximum number of entries
+        :param max_bytes: Maximum approximate resident size in bytes (unbounded if None)
+        :param ttl_seconds: Time to live of an entry in seconds (no expiry if None)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats: defaultdict[str, CacheStats] = defaultdict(CacheStats)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _sizeof(key: Hashable, value: Any) -> int:
+        return sys.getsizeof(key) + sys.getsizeof(value) + _ENTRY_OVERHEAD_BYTES
+
+    def _remove(self, key: Hashable) -> _Entry:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        stats = self._stats[entry.tag]
+        stats.entries -= 1
+        stats.bytes -= entry.size
+        return entry
+
+    def get(self, key: Hashable, tag: str = "default") -> Optional[Any]:
+        """Retrieve a value and mark it as recently used, or return None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats[entry.tag].expirations += 1
+                entry = None
+
+            if entry is None:
+                self._stats[tag].misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats[entry.tag].hits += 1
+            return entry.value
+
+    def set(self, key: Hashable, value: Any, tag: str = "default"):
+        """Store a value, evicting the least recently used entries beyond the bounds."""
+        size = self._sizeof(key, value)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = _Entry(value, tag, size, expires_at)
+            self._bytes += size
+            stats = self._stats[tag]
+            stats.entries += 1
+            stats.bytes += size
+
+            while self._entries and (
+                    len(self._entries) > self.max_entries
+                    or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                evicted = self._remove(next(iter(self._entries)))
+                self._stats[evicted.tag].evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        """Remove a value, returning whether it was present."""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self):
+        """Remove all values, keeping the hit / miss / eviction counters."""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def items(self) -> Iterator[tuple[Hashable, Any, str]]:
+        """Iterate over a snapshot of the unexpired (key, value, tag) entries, least recently used first."""
+        now = time.monotonic()
+        with self._lock:
+            entries = [
+                (key, entry.value, entry.tag)
+                for key, entry in self._entries.items()
+                if entry.expires_at is None or entry.expires_at > now
+            ]
+        return iter(entries)
+
+    def stats(self) -> dict:
+        """Get the cache bounds, totals, and counters per tag."""
+        with self._lock:
+            per_tag = {tag: asdict(stats) for tag, stats in self._stats.items()}
+            hits = sum(stats["hits"] for stats in per_tag.values())
+            misses = sum(stats["misses"] for stats in per_tag.values())
+            return {
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_rate": hits / (hits + misses) if hits + misses else None,
+                "tags": per_tag
+            }
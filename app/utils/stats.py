@@ -0,0 +1,49 @@
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+
+class RollingStats:
+    """
+    Summary statistics over the most recent observations of a value.
+
+    Only the last `window` observations are kept, so percentiles follow the current load.
+    """
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def add(self, value: float):
+        """Record an observation."""
+        self.count += 1
+        self.total += value
+        self._samples.append(value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Get the q-th percentile of the recent observations or None if there are none."""
+        if not self._samples:
+            return None
+        return float(np.percentile(np.fromiter(self._samples, dtype=np.float64), q))
+
+    def summary(self, scale: float = 1.0) -> dict:
+        """
+        Summarize the observations.
+        :param scale: Factor applied to the values, e.g. 1000 to report seconds as milliseconds
+        :return: Count, mean, and recent p50 / p95 / p99 / max
+        """
+        if not self._samples:
+            return {"count": self.count, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+
+        samples = np.fromiter(self._samples, dtype=np.float64) * scale
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {
+            "count": self.count,
+            "mean": self.total * scale / self.count,
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(samples.max())
+        }
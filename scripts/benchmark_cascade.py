@@ -0,0 +1,118 @@
+"""
+Compute saved by the cascade metric, and its agreement with pure semantic scoring, on a labelled set of pairs.
+
+Pairs are read from a JSONL file of `{"prompt1": ..., "prompt2": ..., "label": 0 or 1}` objects, or built from a small
+set of paraphrase groups: pairs within a group are similar, pairs across groups are not, including pairs sharing most
+of their words. Both the cascade and the semantic metric score the pairs in fresh services, without caches:
+
+    python -m scripts.benchmark_cascade --threshold 0.7
+    python -m scripts.benchmark_cascade --pairs labelled.jsonl --stages jaccard cosine semantic --bands 0.6,0.3 0.5,0.2
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from app.models import SimilarityMetric
+from app.services.similarity_service import TextSimilarityService
+from app.utils.config import settings
+
+PARAPHRASE_GROUPS = [
+    ["How do I cook pasta?", "What is the best way to cook pasta?", "How should pasta be cooked?",
+     "how do i cook pasta"],
+    ["How do I cook rice?", "What is the best way to cook rice?", "How should rice be cooked?"],
+    ["How can I reset my password?", "I forgot my password, how do I change it?", "Steps to reset a password"],
+    ["How can I reset my router?", "My router is stuck, how do I restart it?", "Steps to reset a router"],
+    ["What is the capital of France?", "Which city is the capital of France?", "France's capital city is what?"],
+    ["What is the capital of Spain?", "Which city is the capital of Spain?", "Spain's capital city is what?"],
+    ["How do I learn Python quickly?", "What is the fastest way to learn Python?", "Tips to learn Python fast"],
+    ["How do I learn to swim quickly?", "What is the fastest way to learn swimming?", "Tips to learn to swim fast"],
+    ["Is it going to rain tomorrow?", "Will there be rain tomorrow?", "Tomorrow's weather: rain or not?"],
+    ["How much does a new car cost?", "What is the price of a new car?", "New car prices"],
+    ["How do I write a cover letter?", "Tips for writing a cover letter", "What goes into a good cover letter?"],
+    ["Why is the sky blue?", "What makes the sky look blue?", "Reason the sky is blue"],
+]
+
+
+def make_labelled_pairs(rng: random.Random) -> list[tuple[str, str, int]]:
+    """Similar pairs within each paraphrase group, and as many dissimilar pairs across groups."""
+    similar = [(text1, text2, 1) for group in PARAPHRASE_GROUPS for text1, text2 in itertools.combinations(group, 2)]
+    dissimilar = [(text1, text2, 0)
+                  for group1, group2 in itertools.combinations(PARAPHRASE_GROUPS, 2)
+                  for text1, text2 in zip(group1, group2)]
+    return similar + rng.sample(dissimilar, min(len(similar), len(dissimilar)))
+
+
+def read_labelled_pairs(path: str) -> list[tuple[str, str, int]]:
+    with open(path) as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    return [(record["prompt1"], record["prompt2"], int(record["label"])) for record in records]
+
+
+async def score(pairs: list[tuple[str, str]], threshold: float, stages: list[SimilarityMetric],
+                bands: list[tuple[float, float]],
+                cascade: bool) -> tuple[list[float], list[SimilarityMetric], float, int]:
+    """Score pairs in a fresh service, returning the scores, deciding stages, seconds and texts encoded."""
+    service = TextSimilarityService()
+    if await service.semantic_model is None:
+        raise SystemExit("The semantic model is not available")
+
+    started = time.perf_counter()
+    if cascade:
+        scores, decided_by = await service.cascade_similarity_batch(pairs, threshold, stages, bands)
+    else:
+        scores = await service.calculate_similarity_batch(pairs, SimilarityMetric.SEMANTIC)
+        decided_by = [SimilarityMetric.SEMANTIC] * len(pairs)
+    elapsed = time.perf_counter() - started
+    encoded = int(service._embedding_batcher.batch_sizes.total) if service._embedding_batcher else 0
+    service.close()
+    return scores, decided_by, elapsed, encoded
+
+
+async def run(args: argparse.Namespace):
+    labelled = read_labelled_pairs(args.pairs) if args.pairs else make_labelled_pairs(random.Random(0))
+    pairs = [(text1, text2) for text1, text2, _ in labelled]
+    labels = [label for _, _, label in labelled]
+    stages = args.stages or [SimilarityMetric(stage) for stage in settings.CASCADE_STAGES]
+    bands = args.bands if args.bands is not None else [tuple(band) for band in settings.CASCADE_BANDS]
+
+    semantic_scores, _, semantic_seconds, semantic_encoded = await score(
+        pairs, args.threshold, stages, bands, cascade=False)
+    cascade_scores, decided_by, cascade_seconds, cascade_encoded = await score(
+        pairs, args.threshold, stages, bands, cascade=True)
+
+    semantic_decisions = [value >= args.threshold for value in semantic_scores]
+    cascade_decisions = [value >= args.threshold for value in cascade_scores]
+    agreement = sum(a == b for a, b in zip(semantic_decisions, cascade_decisions)) / len(pairs)
+
+    def accuracy(decisions: list[bool]) -> float:
+        return sum(decision == bool(label) for decision, label in zip(decisions, labels)) / len(pairs)
+
+    print(f"{len(pairs)} pairs ({sum(labels)} similar), threshold {args.threshold}, "
+          f"stages {' > '.join(stage.value for stage in stages)}, bands {bands}")
+    for stage in stages:
+        count = decided_by.count(stage)
+        print(f"  decided by {stage.value}: {count} ({count / len(pairs):.0%})")
+    # Pairs left to the semantic stage are those it decides
+    semantic_pairs = decided_by.count(SimilarityMetric.SEMANTIC)
+    print(f"semantic: {semantic_seconds * 1000:.0f} ms, {len(pairs)} pairs scored by the model, "
+          f"{semantic_encoded} texts encoded, accuracy {accuracy(semantic_decisions):.1%}")
+    print(f"cascade:  {cascade_seconds * 1000:.0f} ms, {semantic_pairs} pairs scored by the model "
+          f"({1 - semantic_pairs / len(pairs):.0%} saved), {cascade_encoded} texts encoded, "
+          f"accuracy {accuracy(cascade_decisions):.1%}, agreement with semantic {agreement:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", help="JSONL file of labelled pairs (default: built-in paraphrase groups)")
+    parser.add_argument("--threshold", type=float, default=0.7, help="Similarity threshold")
+    parser.add_argument("--stages", type=SimilarityMetric, nargs="+", help="Cascade stages (default: CASCADE_STAGES)")
+    parser.add_argument("--bands", type=lambda band: tuple(float(margin) for margin in band.split(",")), nargs="*",
+                        help="Cascade bands, `below,above` per stage but the last (default: CASCADE_BANDS)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
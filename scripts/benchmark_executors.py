@@ -0,0 +1,113 @@
+"""
+Throughput benchmark of worker process x executor thread layouts.
+
+Each layout `WxT` runs W worker processes, each scoring random prompt pairs with T executor threads, and torch / BLAS
+threads derived from the cores left per thread (or, with `--oversubscribe`, as many as there are cores in every
+worker, as when each library sizes its pool on its own). Concurrent requests beyond the queue bound are refused and
+counted:
+
+    python -m scripts.benchmark_executors --metric cosine --layouts 1x1 1x4 2x2 4x1
+    python -m scripts.benchmark_executors --metric semantic --layouts 1x1 2x1 4x1 --oversubscribe
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
+from app.models import SimilarityMetric
+from app.services.executors import ExecutorBusy, ThreadLayout
+from app.services.similarity_service import TextSimilarityService
+
+
+def make_pairs(count: int, rng: random.Random) -> list[tuple[str, str]]:
+    """Random pairs of sentences of common words."""
+    vocabulary = ("the a of to and in is it you that he was for on are with as I his they be at one have this from "
+                  "or had by hot word but what some we can out other were all there when up use your how said an "
+                  "each she which do their time if will way about many then them write would like so these").split()
+    return [tuple(" ".join(rng.choices(vocabulary, k=rng.randint(10, 60))) for _ in range(2)) for _ in range(count)]
+
+
+def _worker(layout: ThreadLayout, metric: SimilarityMetric, concurrency: int, duration: float, seed: int,
+            results: multiprocessing.Queue):
+    layout.apply()
+    service = TextSimilarityService(thread_layout=layout)
+    pairs = make_pairs(1000, random.Random(seed))
+    latencies, rejected = [], 0
+
+    async def client(index: int):
+        nonlocal rejected
+        position = index
+        while time.perf_counter() < deadline:
+            text1, text2 = pairs[position % len(pairs)]
+            position += concurrency
+            started = time.perf_counter()
+            try:
+                await service.calculate_similarity(text1, text2, metric)
+                latencies.append(time.perf_counter() - started)
+            except ExecutorBusy:
+                rejected += 1
+                await asyncio.sleep(0.001)
+
+    async def run():
+        # Load the model, if any, before measuring
+        if metric == SimilarityMetric.SEMANTIC:
+            await service.model_manager.preload()
+        nonlocal deadline
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(client(index) for index in range(concurrency)))
+
+    deadline = 0.0
+    asyncio.run(run())
+    service.close()
+    results.put((latencies, rejected))
+
+
+def measure(workers: int, layout: ThreadLayout, metric: SimilarityMetric, concurrency: int,
+            duration: float) -> tuple[float, float, int]:
+    """Run the workers, and return the requests per second, p95 latency in ms and refused requests."""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(layout, metric, concurrency, duration, seed, results))
+                 for seed in range(workers)]
+    for process in processes:
+        process.start()
+    latencies, rejected = [], 0
+    for _ in processes:
+        worker_latencies, worker_rejected = results.get()
+        latencies += worker_latencies
+        rejected += worker_rejected
+    for process in processes:
+        process.join()
+    p95 = float(np.percentile(latencies, 95)) * 1000 if latencies else float("nan")
+    return len(latencies) / duration, p95, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--metric", type=SimilarityMetric, default=SimilarityMetric.COSINE)
+    parser.add_argument("--layouts", nargs="+", default=["1x1", "1x2", "2x1", "2x2"],
+                        help="Worker processes x executor threads")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent requests per worker")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds measured per layout")
+    parser.add_argument("--oversubscribe", action="store_true",
+                        help="Give torch and BLAS as many threads as there are cores, in every worker")
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    print(f"{cpu_count} cores, metric {args.metric.value}, {args.concurrency} concurrent requests per worker")
+    for spec in args.layouts:
+        workers, threads = (int(part) for part in spec.split("x"))
+        layout = ThreadLayout.for_workers(workers, lexical_threads=threads, semantic_threads=threads,
+                                          torch_threads=cpu_count if args.oversubscribe else 0,
+                                          blas_threads=cpu_count if args.oversubscribe else 0)
+        rate, p95, rejected = measure(workers, layout, args.metric, args.concurrency, args.duration)
+        print(f"{workers} workers x {threads} threads (torch {layout.torch_threads}, BLAS {layout.blas_threads}): "
+              f"{rate:.0f} requests/s, p95 {p95:.1f} ms, {rejected} refused")
+
+
+if __name__ == "__main__":
+    main()
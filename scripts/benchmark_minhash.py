@@ -0,0 +1,96 @@
+"""
+Accuracy / latency benchmark of MinHash similarity against exact Jaccard similarity, and of the LSH index against
+scoring every document.
+
+Runs on synthetic texts with near-duplicates, no model needed:
+
+    python -m scripts.benchmark_minhash --size 20000 --num-perm 128
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.services.minhash_service import LSHIndex, MinHasher, lsh_bands_for_threshold
+from app.services.similarity_service import TextSimilarityService
+
+
+def make_texts(size: int, rng: np.random.Generator, vocabulary_size: int = 5000, length: int = 30) -> list[str]:
+    """Random texts where about half are edited copies of an earlier text."""
+    vocabulary = np.array([f"w{index}" for index in range(vocabulary_size)])
+    texts = []
+    for _ in range(size):
+        if texts and rng.random() < 0.5:
+            words = texts[rng.integers(len(texts))].split()
+            for position in rng.integers(0, len(words), size=rng.integers(1, 6)):
+                words[position] = vocabulary[rng.integers(vocabulary_size)]
+            texts.append(" ".join(words))
+        else:
+            texts.append(" ".join(rng.choice(vocabulary, size=length)))
+    return texts
+
+
+async def compare_pairs(texts: list[str], pairs: int, rng: np.random.Generator):
+    service = TextSimilarityService()
+    indices = rng.integers(0, len(texts), size=(pairs, 2))
+    # Pair each text with a near-duplicate candidate half of the time, so that the scores span [0, 1]
+    indices[::2, 1] = np.minimum(indices[::2, 0] + 1, len(texts) - 1)
+    batch = [(texts[i], texts[j]) for i, j in indices]
+
+    started = time.perf_counter()
+    exact = np.array(await service.jaccard_similarity_batch(batch))
+    exact_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    estimate = np.array(await service.minhash_similarity_batch(batch))
+    minhash_ms = (time.perf_counter() - started) * 1000
+    print(f"{pairs} pairs: jaccard {exact_ms:.1f} ms, minhash {minhash_ms:.1f} ms (signatures computed), "
+          f"MAE={np.abs(exact - estimate).mean():.4f}, max error={np.abs(exact - estimate).max():.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20_000, help="Number of indexed texts")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--pairs", type=int, default=5000, help="Number of pairs compared for accuracy")
+    parser.add_argument("--num-perm", type=int, default=128, help="MinHash signature length")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Jaccard similarity of near-duplicates")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    texts = make_texts(args.size, rng)
+    asyncio.run(compare_pairs(texts, args.pairs, rng))
+
+    minhasher = MinHasher(num_perm=args.num_perm, cache_entries=args.size + args.queries)
+    started = time.perf_counter()
+    signatures = minhasher.signatures(texts)
+    print(f"signatures: {args.size} texts in {time.perf_counter() - started:.2f} s")
+
+    index = LSHIndex(args.num_perm, lsh_bands_for_threshold(args.num_perm, args.threshold))
+    for row, signature in enumerate(signatures):
+        index.add(row, signature)
+
+    word_sets = [set(text.split()) for text in texts]
+    queries = rng.integers(0, args.size, size=args.queries)
+
+    started = time.perf_counter()
+    brute_force = []
+    for query in queries:
+        query_set = word_sets[query]
+        brute_force.append({
+            row for row, words in enumerate(word_sets)
+            if len(query_set & words) / len(query_set | words) >= args.threshold
+        })
+    brute_force_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    print(f"brute force: {brute_force_ms:.3f} ms/query")
+
+    started = time.perf_counter()
+    found = [{row for row, _ in index.query(signatures[query], args.threshold)} for query in queries]
+    lsh_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    recall = np.mean([len(f & e) / len(e) for f, e in zip(found, brute_force)])
+    print(f"lsh ({index.bands} bands): {lsh_ms:.3f} ms/query ({brute_force_ms / lsh_ms:.1f}x), "
+          f"recall of pairs above {args.threshold}={recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
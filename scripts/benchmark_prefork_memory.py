@@ -0,0 +1,92 @@
+"""
+Memory benchmark of pre-fork serving against independently started workers.
+
+Independent workers each load the services (sanitization engine, TF-IDF model, semantic model). Pre-forked workers
+are forked from a process that loaded them once and froze them with `gc.freeze()`. Both kinds of workers then handle
+the same traffic, and their RSS and PSS (proportional set size, shared pages divided among the processes sharing them)
+are reported. Linux only:
+
+    python -m scripts.benchmark_prefork_memory --workers 4
+"""
+import argparse
+import asyncio
+import gc
+import multiprocessing
+import os
+import random
+import time
+
+from app import main as api
+from app.models import SimilarityMetric
+from app.prefork import memory_report
+
+
+def handle_traffic(requests: int, seed: int = 0):
+    """Sanitize and score random prompt pairs with every metric, as a worker serving requests would."""
+    rng = random.Random(seed)
+    vocabulary = ("the a of to and in is it you that he was for on are with as I his they be at one have this from "
+                  "or had by hot word but what some we can out other were all there when up use your how said an "
+                  "each she which do their time if will way about many then them write would like so these").split()
+
+    async def run():
+        for _ in range(requests):
+            text1, text2 = (" ".join(rng.choices(vocabulary, k=rng.randint(5, 40))) for _ in range(2))
+            text1, text2 = api.sanitization_service.sanitize_many([text1, text2])
+            for metric in SimilarityMetric:
+                if metric == SimilarityMetric.CASCADE:
+                    await api.similarity_service.cascade_similarity(text1, text2, 0.7)
+                else:
+                    await api.similarity_service.calculate_similarity_batch([(text1, text2)], metric)
+
+    asyncio.run(run())
+
+
+def _worker(preload: bool, requests: int, ready, stop):
+    if preload:
+        api.preload_services()
+    handle_traffic(requests)
+    ready.set()
+    stop.wait()
+
+
+def measure(context: multiprocessing.context.BaseContext, workers: int, preload: bool, requests: int) -> str:
+    """Start the workers, wait until they handled the traffic, and report their memory usage."""
+    stop = context.Event()
+    readies = [context.Event() for _ in range(workers)]
+    processes = [context.Process(target=_worker, args=(preload, requests, ready, stop)) for ready in readies]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    for ready in readies:
+        ready.wait()
+    elapsed = time.perf_counter() - started
+
+    # The pre-fork master shares the services with its workers, its PSS counts
+    pids = {} if preload else {"master": os.getpid()}
+    pids |= {f"worker {index}": process.pid for index, process in enumerate(processes)}
+    report = memory_report(pids)
+    stop.set()
+    for process in processes:
+        process.join()
+    return f"{report}\n(workers up and {requests} requests handled in {elapsed:.1f} s)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker processes")
+    parser.add_argument("--requests", type=int, default=200, help="Requests handled by each worker")
+    args = parser.parse_args()
+
+    print("Independent workers, each loading the services:")
+    print(measure(multiprocessing.get_context("spawn"), args.workers, True, args.requests))
+
+    started = time.perf_counter()
+    api.preload_services()
+    gc.collect()
+    gc.freeze()
+    print(f"\nPre-forked workers, the services loaded once in {time.perf_counter() - started:.1f} s:")
+    print(measure(multiprocessing.get_context("fork"), args.workers, False, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Throughput benchmark of the sanitization engine against the sequential sanitization (better_profanity, then one
+`str.replace` per disallowed phrase and one `re.sub` per pattern), at growing censored word list sizes.
+
+The default better_profanity word list is extended with random words, and as many random disallowed phrases are
+added. Both implementations must give the same output:
+
+    python -m scripts.benchmark_sanitization --sizes 1000 5000 20000 --texts 200
+"""
+import argparse
+import random
+import re
+import string
+import time
+
+from better_profanity import Profanity
+
+from app.services.sanitization_engine import SanitizationEngine
+from app.services.sanitization_service import TextSanitizationService
+
+
+def make_texts(count: int, words: list[str], rng: random.Random, length: int = 60) -> list[str]:
+    """Random sentences of common words, with a few censored words, phrases, emails and leetspeak."""
+    vocabulary = ("the a of to and in is it you that he was for on are with as I his they be at one have this from "
+                  "or had by hot word but what some we can out other were all there when up use your how said an "
+                  "each she which do their time if will way about many then them write would like so these").split()
+    extras = ["damn", "sh1t", "@ss", "hack into systems", "test@example.com", "<script>alert(1)</script>"]
+    texts = []
+    for _ in range(count):
+        parts = [rng.choice(vocabulary) for _ in range(length)]
+        for _ in range(rng.randint(0, 3)):
+            parts[rng.randrange(length)] = rng.choice(extras + words[:50])
+        texts.append(" ".join(parts) + ".")
+    return texts
+
+
+def sanitize_sequential(text: str, profanity: Profanity, phrases: list[str], patterns: list[tuple]) -> str:
+    text = profanity.censor(text)
+    for phrase in phrases:
+        text = text.replace(phrase, "[*FORBIDDEN*]")
+    for pattern, replacement in patterns:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def measure(function, texts: list[str], budget: float) -> tuple[list[str], float]:
+    """Sanitize texts until the time budget is spent, returning the outputs and the throughput."""
+    outputs = []
+    started = time.perf_counter()
+    for text in texts:
+        outputs.append(function(text))
+        if time.perf_counter() - started > budget:
+            break
+    return outputs, len(outputs) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20_000],
+                        help="Numbers of random words added to the default word list")
+    parser.add_argument("--texts", type=int, default=200, help="Number of texts of 60 words")
+    parser.add_argument("--budget", type=float, default=20.0, help="Seconds spent at most per measure")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    service = TextSanitizationService()
+    default_words = [str(word) for word in Profanity().CENSOR_WORDSET]
+    patterns = [(re.compile(pattern), "[*HARMFUL*]") for pattern in service.harmful_patterns] + \
+        [(re.compile(pattern), "[*SENSITIVE*]") for pattern in service.sensitive_patterns]
+
+    for size in [0] + args.sizes:
+        extra_words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+                       for _ in range(size)]
+        phrases = service.disallowed_phases + [f"{extra_words[index]} {extra_words[index + 1]}"
+                                               for index in range(0, size - 1, 2)]
+        profanity = Profanity(default_words + extra_words)
+        texts = make_texts(args.texts, extra_words, rng)
+
+        started = time.perf_counter()
+        engine = SanitizationEngine.from_profanity(profanity, phrases, service.harmful_patterns,
+                                                   service.sensitive_patterns)
+        build_ms = (time.perf_counter() - started) * 1000
+        engine_outputs, engine_rate = measure(engine.sanitize, texts, args.budget)
+        reference_outputs, reference_rate = measure(
+            lambda text: sanitize_sequential(text, profanity, phrases, patterns), texts, args.budget)
+        assert engine_outputs[:len(reference_outputs)] == reference_outputs, "The outputs differ"
+
+        print(f"{len(default_words) + size} words, {len(phrases)} phrases: sequential {reference_rate:.1f} texts/s "
+              f"({len(reference_outputs)} texts), engine {engine_rate:.0f} texts/s (built in {build_ms:.0f} ms), "
+              f"x{engine_rate / reference_rate:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Recall / latency benchmark of the approximate (IVF) corpus index against exact blocked search.
+
+Runs on synthetic clustered unit vectors shaped like sentence embeddings, no model needed:
+
+    python -m scripts.benchmark_search --size 100000 --dimension 384
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.vector_index import IVFIndex, blocked_top_k
+
+
+def make_vectors(size: int, dimension: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dimension))
+    vectors = centers[rng.integers(0, clusters, size=size)] + 0.5 * rng.normal(size=(size, dimension))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100_000, help="Number of indexed vectors")
+    parser.add_argument("--dimension", type=int, default=384, help="Vector dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--k", type=int, default=10, help="Number of results per query")
+    parser.add_argument("--n-lists", type=int, default=None, help="Number of IVF clusters (sqrt(size) if unset)")
+    parser.add_argument("--n-probes", type=int, nargs="+", default=[1, 4, 8, 16, 32], help="Clusters scanned")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(args.size, args.dimension, clusters=max(1, args.size // 500), rng=rng)
+    queries = make_vectors(args.queries, args.dimension, clusters=max(1, args.size // 500), rng=rng)
+
+    started = time.perf_counter()
+    exact = [set(blocked_top_k(vectors, query, args.k)[0].tolist()) for query in queries]
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    print(f"exact: {exact_ms:.3f} ms/query, recall@{args.k}=1.000")
+
+    started = time.perf_counter()
+    index = IVFIndex(n_lists=args.n_lists).fit(vectors)
+    print(f"ivf: {index.centroids.shape[0]} lists, built in {time.perf_counter() - started:.1f} s")
+
+    for n_probe in args.n_probes:
+        index.n_probe = n_probe
+        started = time.perf_counter()
+        approximate = [set(index.search(query, args.k)[0].tolist()) for query in queries]
+        latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        recall = np.mean([len(a & e) / len(e) for a, e in zip(approximate, exact)])
+        print(f"ivf n_probe={n_probe}: {latency_ms:.3f} ms/query ({exact_ms / latency_ms:.1f}x), "
+              f"recall@{args.k}={recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
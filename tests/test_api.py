@@ -1,26 +1,59 @@
+import asyncio
+import json
 from unittest.mock import patch, AsyncMock
 
+import numpy as np
+import pytest
+
 from starlette.testclient import TestClient
 
-from app.main import app
-from app.models import SimilarityMetric
+from app.main import app, get_job_queue, get_optional_job_queue
+from app.models import CircuitState, LLMResponseSource, ModelState, SimilarityMetric
+from app.services.executors import ExecutorBusy
+from app.services.search_service import SearchMatch
+from app.services.job_queue import LLMJobQueue
+from app.services.llm_service import LLMStreamInterrupted
+from app.services.sanitization_service import TextSanitizationService
+from app.services.semantic_cache import SemanticCacheHit
+from app.services.similarity_service import TextSimilarityService
 from app.utils.config import settings
 
 client = TestClient(app)
 
 
+async def run_queued_jobs(job_queue: LLMJobQueue):
+    """Start the workers of a job queue, run the queued jobs, and stop them."""
+    await job_queue.start()
+    await job_queue._queue.join()
+    await job_queue.close()
+
+
 class TestAPI:
     def test_endpoint_health(self):
         with patch("app.main.llm_service") as mock_llm:
             mock_llm.is_available = AsyncMock(return_value=True)
+            mock_llm.circuit_state = CircuitState.CLOSED
             response = client.get("/health")
             assert response.status_code == 200
             data = response.json()
             assert data["is_llm_available"] == True
+            assert data["llm_circuit_state"] == "closed"
             assert data["service"] == settings.SERVICE_NAME
             assert data["status"] == "healthy"
             assert data["version"] == settings.VERSION
 
+    def test_endpoint_ready(self):
+        assert client.get("/ready").status_code == 503
+
+        service = TextSimilarityService()
+        with patch("app.main.similarity_service", service), patch.object(settings, "SEMANTIC_MODEL_PRELOAD", True):
+            response = client.get("/ready")
+            assert response.status_code == 503
+            assert response.json() == {"ready": False, "semantic_model_state": "not_loaded"}
+
+            service.model_manager.state = ModelState.READY
+            assert client.get("/ready").json() == {"ready": True, "semantic_model_state": "ready"}
+
     def test_endpoint_metrics(self):
         response = client.get("/metrics")
         assert response.status_code == 200
@@ -49,6 +82,8 @@ class TestAPI:
 
             # Mock sanitization service
             mock_san.sanitize_text = lambda x: x.strip()
+            mock_san.contains_violations = lambda x: False
+            mock_san.sanitize_many = lambda texts: [text.strip() for text in texts]
 
             # Mock similarity service
             mock_sim.calculate_similarity = AsyncMock(return_value=0.8)
@@ -60,6 +95,213 @@ class TestAPI:
             assert data["are_similar"] is True
             assert data["similarity_score"] == 0.8
             assert "llm_response" in data
+            assert data["llm_response_source"] == "llm"
+
+            # Opt in to the response cache
+            mock_llm.generate_response_cached = AsyncMock(
+                return_value=("This is a test response", LLMResponseSource.CACHE))
+            response = client.post("/similarity", json={**payload, "cache_llm_response": True})
+            assert response.json()["llm_response_source"] == "cache"
+            mock_llm.generate_response_cached.assert_awaited_once_with(payload["prompt1"])
+
+    def test_endpoint_similarity_semantic_cache(self):
+        payload = {
+            "prompt1": "How to cook pasta?",
+            "prompt2": "How do I cook pasta?",
+            "similarity_threshold": 0.1,
+            "use_llm": True,
+            "cache_llm_response": True
+        }
+
+        with (
+            patch("app.main.llm_service") as mock_llm,
+            patch("app.main.sanitization_service") as mock_san,
+            patch("app.main.semantic_cache") as mock_cache,
+            patch("app.main.similarity_service") as mock_sim
+        ):
+            mock_san.sanitize_text = lambda x: x.strip()
+            mock_san.contains_violations = lambda x: False
+            mock_san.sanitize_many = lambda texts: [text.strip() for text in texts]
+            mock_sim.calculate_similarity = AsyncMock(return_value=0.8)
+            mock_cache.get = AsyncMock(return_value=None)
+            mock_cache.set = AsyncMock()
+            mock_llm.generate_response_cached = AsyncMock(return_value=("Boil water.", LLMResponseSource.LLM))
+
+            # Miss: the generated response is stored
+            response = client.post("/similarity", json=payload)
+            assert response.json()["llm_response_source"] == "llm"
+            mock_cache.set.assert_awaited_once_with("How to cook pasta?", "Boil water.")
+
+            # Hit: the LLM is not called
+            mock_cache.get = AsyncMock(return_value=SemanticCacheHit("How do I cook pasta?", "Boil water.", 0.97))
+            response = client.post("/similarity", json=payload)
+            data = response.json()
+            assert data["llm_response"] == "Boil water."
+            assert data["llm_response_source"] == "semantic_cache"
+            mock_llm.generate_response_cached.assert_awaited_once()
+
+    def test_endpoint_similarity_stream(self):
+        payload = {
+            "prompt1": "How to cook pasta?",
+            "prompt2": "How do I cook pasta?",
+            "similarity_threshold": 0.1,
+            "use_llm": True,
+            "stream": True
+        }
+
+        async def generate_response_stream(prompt):
+            for chunk in ["Boil water, ", "then contact test@", "example.com."]:
+                yield chunk
+
+        with (
+            patch("app.main.llm_service") as mock_llm,
+            patch("app.main.sanitization_service", TextSanitizationService()),
+            patch("app.main.similarity_service") as mock_sim
+        ):
+            mock_sim.calculate_similarity = AsyncMock(return_value=0.8)
+            mock_llm.generate_response_stream = generate_response_stream
+
+            response = client.post("/similarity", json=payload)
+            assert response.status_code == 200
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            assert lines[0]["similarity_score"] == 0.8
+            assert lines[0]["llm_response_source"] == "llm"
+            assert "".join(line["llm_response_chunk"] for line in lines[1:-1]) == \
+                   "Boil water, then contact [*SENSITIVE*]."
+            assert lines[-1] == {"done": True}
+
+            assert client.post("/similarity", json={**payload, "cache_llm_response": True}).status_code == 422
+
+    def test_endpoint_similarity_stream_interrupted(self):
+        payload = {
+            "prompt1": "How to cook pasta?",
+            "prompt2": "How do I cook pasta?",
+            "similarity_threshold": 0.1,
+            "use_llm": True,
+            "stream": True
+        }
+
+        async def generate_response_stream(prompt):
+            yield "Boil water, then"
+            raise LLMStreamInterrupted("LLM request timeout")
+
+        with (
+            patch("app.main.llm_service") as mock_llm,
+            patch("app.main.sanitization_service", TextSanitizationService()),
+            patch("app.main.similarity_service") as mock_sim
+        ):
+            mock_sim.calculate_similarity = AsyncMock(return_value=0.8)
+            mock_llm.generate_response_stream = generate_response_stream
+
+            response = client.post("/similarity", json=payload)
+            assert response.status_code == 200
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            assert "".join(line["llm_response_chunk"] for line in lines[1:-1]) == "Boil water, then"
+            assert lines[-1] == {"error": "LLM response interrupted"}
+
+    def test_endpoint_similarity_llm_job(self):
+        payload = {
+            "prompt1": "How to cook pasta?",
+            "prompt2": "How do I cook pasta?",
+            "similarity_threshold": 0.1,
+            "use_llm": True,
+            "llm_job": True
+        }
+
+        job_queue = LLMJobQueue(max_size=1)
+        app.dependency_overrides[get_job_queue] = app.dependency_overrides[get_optional_job_queue] = lambda: job_queue
+        with (
+            patch("app.main.llm_service") as mock_llm,
+            patch("app.main.sanitization_service") as mock_san,
+            patch("app.main.similarity_service") as mock_sim
+        ):
+            mock_san.sanitize_text = lambda x: x.strip()
+            mock_san.contains_violations = lambda x: False
+            mock_san.sanitize_many = lambda texts: [text.strip() for text in texts]
+            mock_sim.calculate_similarity = AsyncMock(return_value=0.8)
+            mock_llm.generate_response_with_retry = AsyncMock(return_value="Boil water.")
+
+            response = client.post("/similarity", json=payload)
+            assert response.status_code == 200
+            data = response.json()
+            assert data["llm_response"] is None
+            job_id = data["llm_job_id"]
+
+            # The workers are not started: the job stays queued, and the queue is full
+            assert client.get(f"/jobs/{job_id}").json()["status"] == "queued"
+            assert client.post("/similarity", json=payload).status_code == 429
+
+            asyncio.run(run_queued_jobs(job_queue))
+            data = client.get(f"/jobs/{job_id}").json()
+            assert data["status"] == "succeeded"
+            assert data["llm_response"] == "Boil water."
+            assert data["llm_response_source"] == "llm"
+
+            assert client.get("/jobs/missing").status_code == 404
+        app.dependency_overrides.clear()
+
+    def test_endpoint_similarity_cascade(self):
+        with (
+            patch("app.main.llm_service"),
+            patch("app.main.sanitization_service") as mock_san,
+            patch("app.main.similarity_service", TextSimilarityService())
+        ):
+            mock_san.contains_violations = lambda x: False
+            mock_san.sanitize_many = lambda texts: [text for text in texts]
+
+            payload = {"prompt1": "How to cook pasta?", "prompt2": "How to cook pasta?", "similarity_metric": "cascade"}
+            data = client.post("/similarity", json=payload).json()
+            assert data["are_similar"] and data["similarity_score"] == 1.0
+            assert data["similarity_metric"] == "cascade" and data["decided_by"] == "jaccard"
+
+            payload = {"query": "cook pasta", "candidates": ["cook pasta", "python tutorial"],
+                       "similarity_metric": "cascade"}
+            results = client.post("/similarity/batch", json=payload).json()["results"]
+            assert [result["decided_by"] for result in results] == ["jaccard", "jaccard"]
+            assert [result["are_similar"] for result in results] == [True, False]
+
+    def test_endpoint_similarity_multiple_metrics(self):
+        with (
+            patch("app.main.llm_service"),
+            patch("app.main.sanitization_service") as mock_san,
+            patch("app.main.similarity_service", TextSimilarityService())
+        ):
+            mock_san.contains_violations = lambda x: False
+
+            payload = {"prompt1": "How to cook pasta?", "prompt2": "how to cook pasta",
+                       "similarity_metrics": ["jaccard", "cosine", "minhash"]}
+            data = client.post("/similarity", json=payload).json()
+            assert list(data["similarity_scores"]) == ["jaccard", "cosine", "minhash"]
+            assert data["similarity_metric"] == "jaccard"
+            assert data["similarity_score"] == data["similarity_scores"]["jaccard"] == 0.6
+            assert data["similarity_scores"]["cosine"] == pytest.approx(1.0)
+            assert not data["are_similar"]
+
+            # An explicit similarity metric must be the first of the metrics
+            payload["similarity_metric"] = "jaccard"
+            assert client.post("/similarity", json=payload).json()["similarity_metric"] == "jaccard"
+            payload["similarity_metric"] = "cosine"
+            assert client.post("/similarity", json=payload).status_code == 422
+            del payload["similarity_metric"]
+
+            for metrics in ([], ["cosine", "cosine"], ["cosine", "cascade"]):
+                payload["similarity_metrics"] = metrics
+                assert client.post("/similarity", json=payload).status_code == 422
+
+    def test_endpoint_similarity_executor_busy(self):
+        payload = {"prompt1": "How to cook pasta?", "prompt2": "How do I cook pasta?"}
+
+        with (
+            patch("app.main.llm_service"),
+            patch("app.main.sanitization_service") as mock_san,
+            patch("app.main.similarity_service") as mock_sim
+        ):
+            mock_san.contains_violations = lambda x: False
+            mock_sim.calculate_similarity = AsyncMock(side_effect=ExecutorBusy("The lexical executor is busy"))
+
+            response = client.post("/similarity", json=payload)
+            assert response.status_code == 429
+            assert response.json()["detail"] == "The lexical executor is busy"
 
     def test_endpoint_similarity_validation_errors(self):
         with (
@@ -94,3 +336,121 @@ class TestAPI:
             }
             response = client.post("/similarity", json=payload)
             assert response.status_code == 422
+
+    def test_endpoint_similarity_batch(self):
+        payload = {
+            "query": "This is a test sentence.",
+            "candidates": ["This is another test sentence.", "Something else entirely."],
+            "similarity_metric": "jaccard",
+            "similarity_threshold": 0.5
+        }
+
+        with (
+            patch("app.main.sanitization_service") as mock_san,
+            patch("app.main.similarity_service") as mock_sim
+        ):
+            mock_san.sanitize_text = lambda x: x.strip()
+            mock_san.contains_violations = lambda x: False
+            mock_san.sanitize_many = lambda texts: [text.strip() for text in texts]
+            mock_sim.calculate_similarity_batch = AsyncMock(return_value=[0.8, 0.1])
+
+            response = client.post("/similarity/batch", json=payload)
+            assert response.status_code == 200
+            data = response.json()
+
+            mock_sim.calculate_similarity_batch.assert_awaited_once_with(
+                [("This is a test sentence.", "This is another test sentence."),
+                 ("This is a test sentence.", "Something else entirely.")],
+                SimilarityMetric.JACCARD
+            )
+            assert [result["are_similar"] for result in data["results"]] == [True, False]
+            assert [result["similarity_score"] for result in data["results"]] == [0.8, 0.1]
+
+    def test_endpoint_similarity_batch_validation_errors(self):
+        with (
+            patch("app.main.sanitization_service"),
+            patch("app.main.similarity_service")
+        ):
+            # Test neither pairs nor query
+            response = client.post("/similarity/batch", json={"similarity_metric": "cosine"})
+            assert response.status_code == 422
+
+            # Test both pairs and query
+            payload = {
+                "pairs": [{"prompt1": "Valid prompt", "prompt2": "Another valid prompt"}],
+                "query": "Valid prompt",
+                "candidates": ["Another valid prompt"]
+            }
+            response = client.post("/similarity/batch", json=payload)
+            assert response.status_code == 422
+
+            # Test empty candidate
+            payload = {"query": "Valid prompt", "candidates": ["   "]}
+            response = client.post("/similarity/batch", json=payload)
+            assert response.status_code == 422
+
+    def test_endpoint_search(self):
+        with (
+            patch("app.main.sanitization_service") as mock_san,
+            patch("app.main.search_service") as mock_search
+        ):
+            mock_san.sanitize_text = lambda x: x.strip()
+            mock_san.contains_violations = lambda x: False
+            mock_san.sanitize_many = lambda texts: [text.strip() for text in texts]
+            mock_search.search = AsyncMock(return_value=[SearchMatch("doc-1", "How to cook pasta?", 0.9)])
+
+            response = client.post("/search", json={"query": "pasta recipe", "top_k": 1})
+            assert response.status_code == 200
+            data = response.json()
+
+            mock_search.search.assert_awaited_once_with("pasta recipe", SimilarityMetric.SEMANTIC, 1, False)
+            assert data["results"] == [{"id": "doc-1", "text": "How to cook pasta?", "similarity_score": 0.9}]
+
+    def test_endpoint_remove_missing_corpus_document(self):
+        with patch("app.main.search_service") as mock_search:
+            mock_search.remove_document = AsyncMock(return_value=False)
+            response = client.delete("/corpus/documents/missing")
+            assert response.status_code == 404
+
+    def test_endpoint_dedup(self):
+        similarity_service = TextSimilarityService()
+        with (
+            patch("app.main.sanitization_service") as mock_san,
+            patch("app.main.similarity_service", similarity_service)
+        ):
+            mock_san.sanitize_text = lambda x: x
+            mock_san.contains_violations = lambda x: False
+            mock_san.sanitize_many = lambda texts: [text for text in texts]
+            texts = ["How to cook pasta?", "Python programming tutorial", "how to cook pasta?"]
+            response = client.post("/dedup", json={"texts": texts, "threshold": 0.9})
+            assert response.status_code == 200
+            assert response.json() == {"groups": [[0, 2]], "unique_count": 2}
+            # Signed and banded on the lexical executor, off the event loop
+            assert similarity_service.lexical_executor.stats()["submitted"] == 1
+
+    def test_endpoint_similarity_matrix(self):
+        with (
+            patch("app.main.sanitization_service") as mock_san,
+            patch("app.main.similarity_service", TextSimilarityService())
+        ):
+            mock_san.sanitize_text = lambda x: x
+            mock_san.contains_violations = lambda x: False
+            mock_san.sanitize_many = lambda texts: [text for text in texts]
+            texts = ["cook pasta", "cook pasta now", "python tutorial"]
+            payload = {"texts": texts, "similarity_metric": "jaccard", "upper_triangular": True, "threshold": 0.5}
+            response = client.post("/similarity/matrix", json=payload)
+            assert response.status_code == 200
+            assert response.headers["x-matrix-size"] == "3"
+            rows = [json.loads(line) for line in response.text.splitlines()]
+            assert rows == [{"row": 0, "columns": [1], "scores": [pytest.approx(2 / 3)]}]
+
+            payload = {"texts": texts, "similarity_metric": "jaccard", "format": "binary"}
+            response = client.post("/similarity/matrix", json=payload)
+            matrix = np.frombuffer(response.content, dtype="<f4").reshape(3, 3)
+            np.testing.assert_allclose(np.diag(matrix), 1.0)
+            assert matrix[0, 2] == 0.0
+
+            payload = {"texts": texts, "format": "binary", "threshold": 0.5}
+            assert client.post("/similarity/matrix", json=payload).status_code == 422
+            payload = {"texts": texts, "similarity_metric": "cascade"}
+            assert client.post("/similarity/matrix", json=payload).status_code == 422
@@ -0,0 +1,84 @@
+import csv
+import json
+
+import pytest
+
+from app.bulk import read_records, run
+from app.models import SimilarityMetric
+from app.services.similarity_service import TextSimilarityService
+
+PAIRS = [
+    {"id": index, "prompt1": f"cook pasta number {index}", "prompt2": "cook pasta"}
+    for index in range(7)
+]
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records), encoding="utf-8")
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+class TestBulk:
+    def test_read_records_from_offset(self, tmp_path):
+        path = tmp_path / "pairs.csv"
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["prompt1", "prompt2"])
+            writer.writerows([["multi\nline", "b"], ["c", "d"]])
+
+        records = list(read_records(str(path), "csv"))
+        assert [record for record, _ in records] == [
+            {"prompt1": "multi\nline", "prompt2": "b"}, {"prompt1": "c", "prompt2": "d"}]
+        assert [record for record, _ in read_records(str(path), "csv", records[0][1])] == [
+            {"prompt1": "c", "prompt2": "d"}]
+
+    def test_malformed_lines_are_reported_and_skipped(self, tmp_path, capsys):
+        input_path, output_path = tmp_path / "pairs.jsonl", tmp_path / "scores.jsonl"
+        lines = [json.dumps(PAIRS[0]), '{"prompt1": "cook', "", '["not", "an", "object"]', json.dumps(PAIRS[1])]
+        input_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        assert run(str(input_path), str(output_path), SimilarityMetric.JACCARD, chunk_size=2) == 4
+        results = read_jsonl(output_path)
+        assert [result.get("id") for result in results] == [0, None, None, 1]
+        assert [result.get("line") for result in results] == [None, 2, 4, None]
+        assert results[1]["error"].startswith("Malformed record") and "similarity_score" in results[3]
+        output = capsys.readouterr().out
+        assert "line 2 of" in output and "line 4 of" in output
+
+        # Line numbers count from the start of the file when reading from an offset
+        offset = len(lines[0]) + len(lines[1]) + 2
+        assert [record for record, _ in read_records(str(input_path), "jsonl", offset)][0]["line"] == 4
+
+    @pytest.mark.asyncio
+    async def test_run_scores_in_input_order(self, tmp_path):
+        input_path, output_path = tmp_path / "pairs.jsonl", tmp_path / "scores.jsonl"
+        write_jsonl(input_path, PAIRS + [{"id": 7, "prompt1": "", "prompt2": "cook pasta"}])
+
+        assert run(str(input_path), str(output_path), SimilarityMetric.JACCARD, workers=2, chunk_size=3) == 8
+        results = read_jsonl(output_path)
+        assert [result["id"] for result in results] == list(range(8))
+
+        service = TextSimilarityService()
+        for pair, result in zip(PAIRS, results):
+            assert result["similarity_score"] == await service.jaccard_similarity(pair["prompt1"], pair["prompt2"])
+            assert result["sanitized"] is False
+        assert "error" in results[-1]
+
+    def test_resume_after_crash(self, tmp_path):
+        input_path, output_path = tmp_path / "pairs.jsonl", tmp_path / "scores.jsonl"
+        write_jsonl(input_path, PAIRS)
+        run(str(input_path), str(output_path), SimilarityMetric.JACCARD, chunk_size=3)
+        expected = output_path.read_text(encoding="utf-8")
+
+        # Crash after the first chunk was checkpointed, while a partial second chunk was being written
+        first_chunk = "".join(expected.splitlines(keepends=True)[:3])
+        output_path.write_text(first_chunk + '{"id": 3, "prom', encoding="utf-8")
+        input_offset = sum(len(json.dumps(pair)) + 1 for pair in PAIRS[:3])
+        (tmp_path / "scores.jsonl.checkpoint").write_text(json.dumps(
+            {"input_offset": input_offset, "output_size": len(first_chunk.encode("utf-8")), "records": 3}))
+
+        assert run(str(input_path), str(output_path), SimilarityMetric.JACCARD, chunk_size=3, resume=True) == 7
+        assert output_path.read_text(encoding="utf-8") == expected
@@ -0,0 +1,166 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fakeredis
+import pytest
+import redis
+
+from app.models import SimilarityMetric
+from app.services.cache_backends import RedisCacheBackend
+from app.services.cache_service import CacheService
+
+
+class TestCacheService:
+    def setup_method(self):
+        self.service = CacheService(max_entries=3)
+
+    def test_similarity_is_order_insensitive(self):
+        self.service.set_similarity(SimilarityMetric.COSINE.value, "a", "b", 0.5)
+        assert self.service.get_similarity(SimilarityMetric.COSINE.value, "b", "a") == 0.5
+        assert self.service.get_similarity(SimilarityMetric.JACCARD.value, "a", "b") is None
+
+    def test_least_recently_used_is_evicted(self):
+        for i in range(3):
+            self.service.set_similarity("cosine", "a", str(i), i / 10)
+        self.service.get_similarity("cosine", "a", "0")  # 1 becomes the least recently used
+        self.service.set_similarity("cosine", "a", "3", 0.3)
+
+        assert self.service.get_similarity("cosine", "a", "1") is None
+        assert self.service.get_similarity("cosine", "a", "0") == 0.0
+        assert self.service.get_similarity("cosine", "a", "3") == 0.3
+        assert self.service.stats()["tags"]["cosine"]["evictions"] == 1
+
+    def test_byte_budget_bounds_resident_size(self):
+        service = CacheService(max_entries=1000, max_bytes=2000)
+        for i in range(100):
+            service.set_similarity("jaccard", "a", str(i), 0.1)
+
+        stats = service.stats()
+        assert 0 < stats["bytes"] <= 2000
+        assert stats["entries"] < 100
+        assert stats["tags"]["jaccard"]["evictions"] == 100 - stats["entries"]
+
+    def test_entries_expire_after_ttl(self):
+        service = CacheService(ttl_seconds=0.01)
+        service.set_similarity("semantic", "a", "b", 0.9)
+        assert service.get_similarity("semantic", "a", "b") == 0.9
+        time.sleep(0.02)
+        assert service.get_similarity("semantic", "a", "b") is None
+        assert service.stats()["tags"]["semantic"]["expirations"] == 1
+
+    def test_stats_per_metric(self):
+        self.service.set_similarity("cosine", "a", "b", 0.5)
+        self.service.get_similarity("cosine", "a", "b")
+        self.service.get_similarity("jaccard", "a", "b")
+
+        stats = self.service.stats()
+        assert stats["tags"]["cosine"]["hits"] == 1
+        assert stats["tags"]["cosine"]["entries"] == 1
+        assert stats["tags"]["jaccard"]["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_keys_are_stable_across_processes(self):
+        command = ("from app.services.cache_service import CacheService; "
+                   "print(CacheService._generate_similarity_key('cosine', 'hello', 'world'))")
+        keys = {
+            subprocess.run([sys.executable, "-c", command], env={**os.environ, "PYTHONHASHSEED": seed},
+                           capture_output=True, text=True, check=True).stdout.strip()
+            for seed in ("1", "2")
+        }
+        assert keys == {CacheService._generate_similarity_key("cosine", "world", "hello")}
+
+    def test_snapshot_round_trip(self, tmp_path):
+        self.service.set_similarity("cosine", "a", "b", 0.5)
+        self.service.set_similarity("semantic", "a", "c", 0.25)
+        path = tmp_path / "cache.bin"
+        assert self.service.save_snapshot(str(path)) == 2
+
+        restored = CacheService(max_entries=3)
+        assert restored.load_snapshot(str(path)) == 2
+        assert restored.get_similarity("cosine", "b", "a") == 0.5
+        assert restored.get_similarity("semantic", "a", "c") == 0.25
+        assert restored.stats()["tags"]["semantic"]["entries"] == 1
+
+    def test_snapshot_rejects_unknown_format(self, tmp_path):
+        path = tmp_path / "cache.bin"
+        path.write_bytes(b"not a snapshot")
+        with pytest.raises(ValueError):
+            self.service.load_snapshot(str(path))
+
+    def test_concurrent_access_from_threads(self):
+        service = CacheService(max_entries=50)
+
+        def worker(offset: int):
+            for i in range(200):
+                service.set_similarity("cosine", "a", str(offset + i), 0.5)
+                service.get_similarity("cosine", "a", str(offset + i // 2))
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(worker, range(0, 8000, 1000)))
+
+        stats = service.stats()
+        assert stats["entries"] == 50
+        assert stats["tags"]["cosine"]["entries"] == 50
+
+
+class TestRedisCacheBackend:
+    def setup_method(self):
+        self.server = fakeredis.FakeServer()
+
+    def create_service(self) -> CacheService:
+        """Create a worker-local cache sharing the fake Redis server."""
+        return CacheService(backend=RedisCacheBackend(fakeredis.FakeRedis(server=self.server)))
+
+    def test_similarity_is_shared_across_workers(self):
+        worker1, worker2 = self.create_service(), self.create_service()
+        worker1.set_similarity("cosine", "a", "b", 0.5)
+
+        assert worker2.get_similarity("cosine", "b", "a") == 0.5
+        assert worker2.stats()["backend"]["hits"] == 1
+        # Promoted to the local tier
+        assert worker2.similarity_cache.stats()["entries"] == 1
+
+    def test_batched_calls(self):
+        worker1, worker2 = self.create_service(), self.create_service()
+        worker1.set_similarities("jaccard", [("a", "b", 0.1), ("a", "c", 0.2)])
+
+        scores = worker2.get_similarities("jaccard", [("a", "b"), ("a", "d"), ("c", "a")])
+        assert scores == [0.1, None, 0.2]
+
+    @pytest.mark.asyncio
+    async def test_async_calls_reach_the_backend_off_the_event_loop(self):
+        worker1, worker2 = self.create_service(), self.create_service()
+        threads = []
+        get_many, set_many = worker2.backend.get_many, worker1.backend.set_many
+        worker1.backend.set_many = lambda items: threads.append(threading.current_thread()) or set_many(items)
+        worker2.backend.get_many = lambda keys: threads.append(threading.current_thread()) or get_many(keys)
+
+        await worker1.set_similarities_async("jaccard", [("a", "b", 0.1), ("a", "c", 0.2)])
+        assert await worker2.get_similarities_async("jaccard", [("a", "b"), ("a", "d"), ("c", "a")]) == [0.1, None, 0.2]
+        assert len(threads) == 2 and threading.main_thread() not in threads
+
+        # L1 hits make no round-trip
+        assert await worker2.get_similarity_async("jaccard", "b", "a") == 0.1
+        assert len(threads) == 2
+
+    def test_ttl_is_applied_on_the_server(self):
+        client = fakeredis.FakeRedis(server=self.server)
+        CacheService(backend=RedisCacheBackend(client, ttl_seconds=60)).set_similarity("cosine", "a", "b", 0.5)
+        (key,) = client.keys()
+        assert 0 < client.pttl(key) <= 60_000
+
+    def test_fallback_to_local_tier_when_unreachable(self):
+        client = redis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.05, socket_timeout=0.05)
+        service = CacheService(backend=RedisCacheBackend(client, retry_after_seconds=60))
+
+        service.set_similarity("semantic", "a", "b", 0.9)
+        assert service.get_similarity("semantic", "a", "b") == 0.9
+        assert service.get_similarity("semantic", "a", "c") is None
+
+        stats = service.stats()["backend"]
+        assert stats["available"] is False
+        assert stats["errors"] == 1  # No further calls while the backend is marked unavailable
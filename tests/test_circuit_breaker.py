@@ -0,0 +1,40 @@
+import time
+
+from app.models import CircuitState
+from app.services.circuit_breaker import CircuitBreaker
+
+
+class TestCircuitBreaker:
+    def test_opens_at_failure_rate(self):
+        breaker = CircuitBreaker(failure_rate=0.5, minimum_calls=4, window=10)
+        for _ in range(2):
+            breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == CircuitState.CLOSED
+
+        breaker.record_failure()
+        assert breaker.state == CircuitState.OPEN
+        assert not breaker.allow_request()
+        assert breaker.stats()["rejected"] == 1
+
+    def test_half_open_trial_closes_or_reopens(self):
+        breaker = CircuitBreaker(minimum_calls=1, open_seconds=0.0)
+        breaker.record_failure()
+        assert breaker.state == CircuitState.HALF_OPEN
+
+        assert breaker.allow_request()
+        assert breaker.allow_request()  # The previous trial is older than open_seconds
+        breaker.record_failure()
+        assert breaker._state == CircuitState.OPEN
+
+        assert breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == CircuitState.CLOSED
+        assert breaker.stats()["opened"] == 2
+
+    def test_half_open_limits_trials(self):
+        breaker = CircuitBreaker(minimum_calls=1, open_seconds=60.0)
+        breaker.record_failure()
+        breaker._opened_at = time.monotonic() - 60.0
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
@@ -0,0 +1,47 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from app.services.embedding_batcher import EmbeddingBatcher
+
+
+def fake_encode(texts):
+    return np.array([[len(text), text.count(" ")] for text in texts], dtype=np.float32)
+
+
+class TestEmbeddingBatcher:
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_one_encode(self):
+        encode = MagicMock(side_effect=fake_encode)
+        batcher = EmbeddingBatcher(encode, max_batch_size=100, max_wait_ms=20)
+
+        results = await asyncio.gather(*(batcher.encode([f"text {i}", "shared"]) for i in range(10)))
+
+        assert encode.call_count == 1
+        assert len(encode.call_args.args[0]) == 11  # Shared text is encoded once
+        for i, embeddings in enumerate(results):
+            np.testing.assert_array_equal(embeddings, fake_encode([f"text {i}", "shared"]))
+
+    @pytest.mark.asyncio
+    async def test_flush_on_max_batch_size(self):
+        encode = MagicMock(side_effect=fake_encode)
+        batcher = EmbeddingBatcher(encode, max_batch_size=4, max_wait_ms=10_000)
+
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.encode([f"a {i}", f"b {i}"]) for i in range(4))), timeout=5)
+
+        assert encode.call_count == 2
+        assert all(embeddings.shape == (2, 2) for embeddings in results)
+        stats = batcher.stats()
+        assert stats["batch_size"]["count"] == 2
+        assert stats["batch_size"]["max"] == 4
+        assert stats["queue_wait_ms"]["count"] == 4
+
+    @pytest.mark.asyncio
+    async def test_encode_failure_propagates_to_every_waiter(self):
+        batcher = EmbeddingBatcher(MagicMock(side_effect=RuntimeError("encode failed")), max_wait_ms=1)
+
+        results = await asyncio.gather(batcher.encode(["a"]), batcher.encode(["b"]), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,38 @@
+import numpy as np
+
+from app.services.embedding_cache import EmbeddingCache
+
+
+class TestEmbeddingCache:
+    def setup_method(self):
+        # Room for 3 vectors of 4 float32 values
+        self.cache = EmbeddingCache(dimension=4, max_bytes=3 * 4 * 4)
+
+    def test_get_many_returns_hits_and_misses(self):
+        self.cache.put_many([b"a", b"b"], np.eye(4, dtype=np.float32)[:2])
+
+        embeddings, missing = self.cache.get_many([b"b", b"c", b"a"])
+        assert missing == [1]
+        np.testing.assert_array_equal(embeddings[0], [0, 1, 0, 0])
+        np.testing.assert_array_equal(embeddings[2], [1, 0, 0, 0])
+
+    def test_least_recently_used_slot_is_reused(self):
+        self.cache.put_many([b"a", b"b", b"c"], np.eye(4, dtype=np.float32)[:3])
+        self.cache.get_many([b"a"])  # b becomes the least recently used
+        self.cache.put_many([b"d"], np.full((1, 4), 0.5, dtype=np.float32))
+
+        _, missing = self.cache.get_many([b"a", b"b", b"c", b"d"])
+        assert missing == [1]
+        stats = self.cache.stats()
+        assert stats["entries"] == 3
+        assert stats["evictions"] == 1
+        assert stats["bytes"] == 3 * 4 * 4
+
+    def test_float16_storage(self):
+        cache = EmbeddingCache(dimension=4, max_bytes=1024, dtype="float16")
+        assert cache.capacity == 128
+        cache.put_many([b"a"], np.full((1, 4), 0.1, dtype=np.float32))
+
+        embeddings, _ = cache.get_many([b"a"])
+        assert embeddings.dtype == np.float32
+        np.testing.assert_allclose(embeddings[0], 0.1, rtol=1e-3)
@@ -0,0 +1,65 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from app.services.embedding_store import EmbeddingStore
+from app.utils.hashing import text_digest
+
+DIGESTS = {text: text_digest(text) for text in "abcxz"}
+
+
+def append_from_other_process(directory: str, digest: bytes):
+    EmbeddingStore(directory).append_many([digest], np.full((1, 4), 7, dtype=np.float32))
+
+
+class TestEmbeddingStore:
+    def test_append_and_get(self, tmp_path):
+        store = EmbeddingStore(str(tmp_path), dimension=4)
+        assert store.append_many([DIGESTS["a"], DIGESTS["b"], DIGESTS["a"]], np.eye(4, dtype=np.float32)[:3]) == 2
+
+        embeddings, missing = store.get_many([DIGESTS["b"], DIGESTS["c"], DIGESTS["a"]])
+        assert missing == [1]
+        np.testing.assert_array_equal(embeddings[0], [0, 1, 0, 0])
+        np.testing.assert_array_equal(embeddings[2], [1, 0, 0, 0])
+
+    def test_reopen_persists_and_checks_dimension(self, tmp_path):
+        EmbeddingStore(str(tmp_path), dimension=4).append_many([DIGESTS["a"]], np.ones((1, 4), dtype=np.float32))
+
+        reopened = EmbeddingStore(str(tmp_path))
+        assert reopened.dimension == 4
+        assert reopened.get_many([DIGESTS["a"]])[1] == []
+        with pytest.raises(ValueError):
+            EmbeddingStore(str(tmp_path), dimension=8)
+
+    def test_sees_rows_appended_by_other_processes(self, tmp_path):
+        store = EmbeddingStore(str(tmp_path), dimension=4)
+        assert store.get_many([DIGESTS["x"]])[1] == [0]
+
+        process = multiprocessing.get_context("spawn").Process(
+            target=append_from_other_process, args=(str(tmp_path), DIGESTS["x"]))
+        process.start()
+        process.join()
+
+        embeddings, missing = store.get_many([DIGESTS["x"]])
+        assert missing == []
+        np.testing.assert_array_equal(embeddings[0], [7, 7, 7, 7])
+
+    def test_compact_keeps_most_recent_rows(self, tmp_path):
+        store = EmbeddingStore(str(tmp_path), dimension=4)
+        store.append_many([DIGESTS["a"], DIGESTS["b"], DIGESTS["c"]], np.eye(4, dtype=np.float32)[:3])
+        reader = EmbeddingStore(str(tmp_path))
+
+        assert store.compact(max_rows=2) == 1
+        assert store.stats()["rows"] == 2
+        assert store.get_many([DIGESTS["a"], DIGESTS["b"], DIGESTS["c"]])[1] == [0]
+
+        # Other handles keep reading their mapping, and pick up the rewritten files on the next miss
+        store.append_many([DIGESTS["x"]], np.full((1, 4), 7, dtype=np.float32))
+        embeddings, missing = reader.get_many([DIGESTS["c"], DIGESTS["x"]])
+        assert missing == []
+        np.testing.assert_array_equal(embeddings, [[0, 0, 1, 0], [7, 7, 7, 7]])
+        assert reader.stats()["rows"] == 3
+
+        assert store.compact(max_rows=1) == 2
+        assert store.get_many([DIGESTS["b"], DIGESTS["c"], DIGESTS["x"]])[1] == [0, 1]
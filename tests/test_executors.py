@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.executors import BoundedExecutor, ExecutorBusy, ThreadLayout
+
+
+class TestThreadLayout:
+    def test_cores_divided_among_workers_and_threads(self):
+        assert ThreadLayout.for_workers(4, cpu_count=16) == ThreadLayout(
+            lexical_threads=2, semantic_threads=1, torch_threads=2, blas_threads=1)
+        assert ThreadLayout.for_workers(2, lexical_threads=2, semantic_threads=2, cpu_count=16) == ThreadLayout(
+            lexical_threads=2, semantic_threads=2, torch_threads=2, blas_threads=2)
+        # More workers than cores: one thread of each
+        assert ThreadLayout.for_workers(8, cpu_count=2) == ThreadLayout(1, 1, 1, 1)
+        assert ThreadLayout.for_workers(1, torch_threads=3, blas_threads=2, cpu_count=8).torch_threads == 3
+
+    @pytest.mark.parametrize("workers, cpu_count, semantic_threads", [
+        (1, 8, 1), (1, 7, 1), (2, 16, 2), (4, 16, 1), (3, 32, 4), (1, 2, 1)
+    ])
+    def test_busy_pools_run_one_thread_per_core(self, workers, cpu_count, semantic_threads):
+        layout = ThreadLayout.for_workers(workers, semantic_threads=semantic_threads, cpu_count=cpu_count)
+        threads = layout.lexical_threads * layout.blas_threads + layout.semantic_threads * layout.torch_threads
+        assert threads <= cpu_count // workers
+
+class TestBoundedExecutor:
+    @pytest.mark.asyncio
+    async def test_runs_off_the_event_loop(self):
+        executor = BoundedExecutor("test", threads=2)
+        try:
+            thread = await executor.run(threading.current_thread)
+            assert thread is not threading.main_thread() and thread.name.startswith("test-executor")
+            assert executor.stats()["run_ms"]["count"] == 1
+        finally:
+            executor.close()
+
+    @pytest.mark.asyncio
+    async def test_excess_tasks_are_refused(self):
+        executor = BoundedExecutor("test", threads=1, max_queue=1)
+        release = threading.Event()
+        try:
+            running = asyncio.ensure_future(executor.run(release.wait))
+            waiting = asyncio.ensure_future(executor.run(lambda: "waited"))
+            await asyncio.sleep(0.01)
+
+            with pytest.raises(ExecutorBusy):
+                await executor.run(lambda: "refused")
+            # Work already admitted is queued anyway
+            admitted = asyncio.ensure_future(executor.run(lambda: "admitted", admitted=True))
+
+            release.set()
+            assert await asyncio.gather(running, waiting, admitted) == [True, "waited", "admitted"]
+            stats = executor.stats()
+            assert stats["submitted"] == 3 and stats["rejected"] == 1 and stats["pending"] == 0
+        finally:
+            release.set()
+            executor.close()
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.models import JobStatus, LLMResponseSource
+from app.services.job_queue import LLMJobQueue
+
+
+def respond(text: str, delay: float = 0.0, order: list = None):
+    async def function():
+        await asyncio.sleep(delay)
+        if order is not None:
+            order.append(text)
+        return text, LLMResponseSource.LLM
+    return function
+
+
+class TestLLMJobQueue:
+    @pytest.mark.asyncio
+    async def test_jobs_run_by_priority(self):
+        queue = LLMJobQueue(workers=1)
+        order = []
+        # Submitted before the worker starts, so that they are all waiting
+        jobs = [queue.submit(respond(text, order=order), priority)
+                for text, priority in [("low", 0), ("high", 9), ("low again", 0), ("medium", 5)]]
+        await queue.start()
+        await queue._queue.join()
+
+        assert order == ["high", "medium", "low", "low again"]
+        assert all(queue.get(job.id).status == JobStatus.SUCCEEDED for job in jobs)
+        assert queue.get(jobs[1].id).result == "high"
+        stats = queue.stats()
+        assert stats["queue_wait_ms"]["count"] == 4
+        assert stats["depth"] == 0
+        await queue.close()
+
+    @pytest.mark.asyncio
+    async def test_full_queue_refuses_jobs(self):
+        queue = LLMJobQueue(workers=1, max_size=2)
+        queue.submit(respond("a"))
+        queue.submit(respond("b"))
+        with pytest.raises(asyncio.QueueFull):
+            queue.submit(respond("c"))
+        assert queue.stats()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_and_expired_jobs(self):
+        queue = LLMJobQueue(workers=2, result_ttl_seconds=0.05)
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        await queue.start()
+        job = queue.submit(fail)
+        await queue._queue.join()
+        assert queue.get(job.id).status == JobStatus.FAILED
+        assert queue.get(job.id).error == "boom"
+
+        await asyncio.sleep(0.05)
+        assert queue.get(job.id) is None
+        await queue.close()
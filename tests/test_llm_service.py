@@ -0,0 +1,186 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from app.models import CircuitState, LLMResponseSource
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.llm_service import LLMService, LLMStreamInterrupted
+
+
+def make_service(handler, **kwargs) -> LLMService:
+    service = LLMService("http://llm", "model", timeout=5.0, max_retries=1, temperature=0.0, **kwargs)
+    service._client = httpx.AsyncClient(base_url=service.base_url, transport=httpx.MockTransport(handler))
+    return service
+
+
+class TestLLMService:
+    @pytest.mark.asyncio
+    async def test_generations_share_one_client(self):
+        requests = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, json={"response": " hello "})
+
+        service = make_service(handler)
+        client = service._client
+        assert await service.generate_response("hi") == "hello"
+        assert await service.is_available()
+        assert service._client is client
+        assert [request.url.path for request in requests] == ["/api/generate", "/api/tags"]
+
+        await service.close()
+        assert service._client is None
+
+    @pytest.mark.asyncio
+    async def test_concurrent_generations_are_limited(self):
+        in_flight, peak = 0, 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return httpx.Response(200, json={"response": "ok"})
+
+        service = make_service(handler, max_concurrent_generations=2)
+        responses = await asyncio.gather(*(service.generate_response(f"prompt {index}") for index in range(6)))
+
+        assert responses == ["ok"] * 6
+        assert peak == 2
+        stats = service.stats()
+        assert stats["in_flight"] == 0 and stats["waiting"] == 0
+        assert stats["slot_wait_ms"]["count"] == 6
+        assert stats["slot_wait_ms"]["max"] > 0
+
+    @pytest.mark.asyncio
+    async def test_error_status_returns_none(self):
+        service = make_service(lambda request: httpx.Response(500, text="boom"))
+        assert await service.generate_response("hi") is None
+        assert service.stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_cached_generation_is_coalesced_and_cached(self):
+        requests = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"response": "pasta"})
+
+        service = make_service(handler)
+        results = await asyncio.gather(*(service.generate_response_cached("cook pasta") for _ in range(3)))
+        assert [response for response, _ in results] == ["pasta"] * 3
+        assert sorted(source for _, source in results) == [
+            LLMResponseSource.COALESCED, LLMResponseSource.COALESCED, LLMResponseSource.LLM]
+        assert len(requests) == 1
+
+        assert await service.generate_response_cached("cook pasta") == ("pasta", LLMResponseSource.CACHE)
+        assert len(requests) == 1
+        assert service.stats()["coalesced"] == 2
+
+        # The temperature is part of the key
+        service.temperature = 0.5
+        assert (await service.generate_response_cached("cook pasta"))[1] == LLMResponseSource.LLM
+
+    @pytest.mark.asyncio
+    async def test_failed_generation_is_not_cached(self):
+        service = make_service(lambda request: httpx.Response(500, text="boom"))
+        assert await service.generate_response_cached("hi") == (None, LLMResponseSource.LLM)
+        assert len(service.response_cache) == 0
+        assert not service._generations
+
+    @pytest.mark.asyncio
+    async def test_streamed_generation_yields_chunks(self):
+        async def handler(request: httpx.Request) -> httpx.Response:
+            assert json.loads(request.content)["stream"] is True
+            lines = [{"response": "Boil "}, {"response": "water."}, {"response": "", "done": True}]
+            return httpx.Response(200, content="\n".join(json.dumps(line) for line in lines).encode())
+
+        service = make_service(handler)
+        assert [chunk async for chunk in service.generate_response_stream("cook pasta")] == ["Boil ", "water."]
+        assert service.stats()["in_flight"] == 0
+
+        failing = make_service(lambda request: httpx.Response(500, text="boom"))
+        assert [chunk async for chunk in failing.generate_response_stream("cook pasta")] == []
+
+    @pytest.mark.asyncio
+    async def test_streamed_generation_failing_after_a_chunk_is_interrupted(self):
+        async def content():
+            yield json.dumps({"response": "Boil "}).encode() + b"\n"
+            raise httpx.ReadTimeout("timed out")
+
+        service = make_service(lambda request: httpx.Response(200, content=content()))
+        chunks = []
+        with pytest.raises(LLMStreamInterrupted):
+            async for chunk in service.generate_response_stream("cook pasta"):
+                chunks.append(chunk)
+        assert chunks == ["Boil "]
+        assert service.stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_fast(self):
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(503, text="down")
+
+        service = make_service(handler, circuit_breaker=CircuitBreaker(minimum_calls=2, open_seconds=60.0))
+        service.max_retries = 5
+        started = time.monotonic()
+        assert await service.generate_response_with_retry("hi") is None
+        # Two failures open the circuit, and no backoff sleep follows
+        assert len(requests) == 2
+        assert time.monotonic() - started < 1.5
+        assert service.circuit_state == CircuitState.OPEN
+
+        assert await service.generate_response("hi") is None
+        assert len(requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_refused_half_open_call_fails_fast(self):
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, json={"response": "hello"})
+
+        circuit_breaker = CircuitBreaker(open_seconds=60.0)
+        service = make_service(handler, circuit_breaker=circuit_breaker)
+        service.max_retries = 5
+        circuit_breaker._open()
+        circuit_breaker.half_open()
+        # Another request holds the only trial call
+        assert circuit_breaker.allow_request()
+
+        started = time.monotonic()
+        assert await service.generate_response_with_retry("hi") is None
+        assert time.monotonic() - started < 0.5
+        assert requests == []
+        assert service.circuit_state == CircuitState.HALF_OPEN
+
+    @pytest.mark.asyncio
+    async def test_availability_is_probed_in_background(self):
+        available = True
+        probes = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            probes.append(request)
+            return httpx.Response(200 if available else 503)
+
+        service = make_service(handler, probe_interval_seconds=0.01)
+        await service.start()
+        await asyncio.sleep(0.05)
+        assert await service.is_available()
+        count = len(probes)
+        assert count >= 2
+
+        available = False
+        await asyncio.sleep(0.05)
+        assert not await service.is_available()
+        await service.close()
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from app.services.minhash_service import LSHIndex, MinHasher, find_near_duplicates, lsh_bands_for_threshold
+from app.services.similarity_service import TextSimilarityService
+
+
+def exact_jaccard(set1: set, set2: set) -> float:
+    return len(set1 & set2) / len(set1 | set2)
+
+
+class TestMinHasher:
+    def setup_method(self):
+        self.minhasher = MinHasher(num_perm=256)
+
+    def test_estimate_is_close_to_exact_jaccard(self):
+        rng = np.random.default_rng(0)
+        vocabulary = [f"word{index}" for index in range(200)]
+        errors = []
+        for _ in range(50):
+            text1 = " ".join(rng.choice(vocabulary, size=60))
+            text2 = " ".join(rng.choice(vocabulary, size=60))
+            signatures = self.minhasher.signatures([text1, text2])
+            estimate = MinHasher.estimate_jaccard(signatures[0], signatures[1])[0]
+            errors.append(abs(estimate - exact_jaccard(set(text1.split()), set(text2.split()))))
+        assert np.mean(errors) < 0.05
+
+    def test_identical_and_empty_texts(self):
+        signatures = self.minhasher.signatures(["Hello World", "hello world", "", "   "])
+        assert MinHasher.estimate_jaccard(signatures[0], signatures[1])[0] == 1.0
+        assert MinHasher.estimate_jaccard(signatures[0], signatures[2])[0] == 0.0
+        assert MinHasher.estimate_jaccard(signatures[2], signatures[3])[0] == 0.0
+
+    def test_char_shingles(self):
+        minhasher = MinHasher(shingle="char", shingle_size=3)
+        assert minhasher.shingles("Abc  d") == {"abc", "bc ", "c d"}
+        assert minhasher.shingles("ab") == {"ab"}
+
+    def test_signatures_are_cached(self):
+        first = self.minhasher.signatures(["cook pasta"])
+        second = self.minhasher.signatures(["cook pasta"])
+        np.testing.assert_array_equal(first, second)
+        assert self.minhasher._signatures.stats()["tags"]["minhash"]["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_similarity_service_matches_exact_on_identical_sets(self):
+        service = TextSimilarityService()
+        assert await service.minhash_similarity("a b c", "c b a") == 1.0
+        assert await service.minhash_similarity("a b c", "") == 0.0
+
+
+class TestLSHIndex:
+    def test_bands_for_threshold(self):
+        assert lsh_bands_for_threshold(128, 0.5) in (16, 32)
+        assert lsh_bands_for_threshold(128, 0.9) < lsh_bands_for_threshold(128, 0.3)
+
+    def test_query_finds_near_duplicates_only(self):
+        minhasher = MinHasher()
+        texts = [
+            "the quick brown fox jumps over the lazy dog",
+            "the quick brown fox jumped over the lazy dog",
+            "python programming tutorial for beginners",
+        ]
+        index = LSHIndex(minhasher.num_perm, bands=32)
+        for key, signature in zip(["fox", "fox2", "python"], minhasher.signatures(texts)):
+            index.add(key, signature)
+
+        results = index.query(minhasher.signatures([texts[0]])[0], threshold=0.5)
+        assert [key for key, _ in results] == ["fox", "fox2"]
+        assert results[0][1] == 1.0
+
+        assert index.remove("fox2")
+        assert not index.remove("fox2")
+        assert [key for key, _ in index.query(minhasher.signatures([texts[0]])[0])] == ["fox"]
+        assert len(index) == 2
+
+    def test_bands_must_divide_signature(self):
+        with pytest.raises(ValueError):
+            LSHIndex(num_perm=128, bands=3)
+
+
+class TestFindNearDuplicates:
+    def test_groups_are_transitive(self):
+        texts = [
+            "how to cook pasta at home quickly and easily",
+            "python programming tutorial",
+            "how to cook pasta at home quickly and simply",
+            "how to cook pasta at home quickly and easily",
+            "the weather is nice today",
+        ]
+        assert find_near_duplicates(MinHasher(), texts, threshold=0.7) == [[0, 2, 3]]
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.models import ModelState
+from app.services.model_manager import ModelManager
+
+
+class TestModelManager:
+    @pytest.mark.asyncio
+    async def test_concurrent_first_uses_load_once_off_the_event_loop(self):
+        loads = []
+
+        def load():
+            loads.append(threading.current_thread())
+            time.sleep(0.1)
+            return "model"
+
+        manager = ModelManager("test model", load)
+        ticks = 0
+
+        async def tick():
+            # The event loop keeps running while the model loads
+            nonlocal ticks
+            while manager.state != ModelState.READY:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        results = await asyncio.gather(*(manager.get() for _ in range(5)), tick())
+        assert results[:5] == ["model"] * 5
+        assert len(loads) == 1 and loads[0] is not threading.main_thread()
+        assert ticks >= 5
+        assert manager.stats()["load_seconds"] >= 0.1
+
+    @pytest.mark.asyncio
+    async def test_uses_wait_for_the_preload_warm_up(self):
+        warmed_up = []
+
+        def warm_up(model):
+            time.sleep(0.1)
+            warmed_up.append(model)
+
+        manager = ModelManager("test model", lambda: "model", warm_up)
+        preload = asyncio.create_task(manager.preload())
+        await asyncio.sleep(0.05)
+        assert manager.state == ModelState.WARMING_UP
+        assert not manager.is_ready
+
+        assert await manager.get() == "model"
+        assert warmed_up == ["model"]
+        assert await preload and manager.is_ready
+
+    @pytest.mark.asyncio
+    async def test_failed_load_is_tried_again(self):
+        attempts = []
+
+        def load():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OSError("Model not found")
+            return "model"
+
+        manager = ModelManager("test model", load)
+        assert not await manager.preload()
+        assert manager.state == ModelState.FAILED
+        assert manager.stats()["error"] == "Model not found"
+
+        assert await manager.get() == "model"
+        assert manager.state == ModelState.READY
+
+    @pytest.mark.asyncio
+    async def test_preload_without_warm_up(self):
+        warmed_up = []
+        manager = ModelManager("test model", lambda: "model", warmed_up.append)
+        assert await manager.preload(warm_up=False)
+        assert manager.state == ModelState.LOADED and not warmed_up
+
+        # A later preload warms the loaded model up, without loading it again
+        assert await manager.preload()
+        assert manager.is_ready and warmed_up == ["model"]
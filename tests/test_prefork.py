@@ -0,0 +1,44 @@
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+from app import main as api
+from app.models import ModelState
+from app.prefork import memory_report, memory_usage
+from app.services.executors import ThreadLayout
+from app.services.similarity_service import TextSimilarityService
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Pre-fork serving needs Linux")
+
+
+class TestPrefork:
+    def test_memory_usage(self):
+        usage = memory_usage(os.getpid())
+        assert usage["rss"] >= usage["pss"] > 0
+        assert usage["shared"] + usage["private"] == usage["rss"]
+
+    def test_memory_report_skips_exited_processes(self):
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        report = memory_report({"test": os.getpid(), "exited": pid}).splitlines()
+        assert len(report) == 3
+        assert report[1].split()[:2] == ["test", str(os.getpid())]
+        assert report[2].startswith("total")
+
+    def test_preload_services_loads_the_model_without_warm_up(self, monkeypatch):
+        model = MagicMock()
+        monkeypatch.setattr(TextSimilarityService, "_load_semantic_model", staticmethod(lambda: model))
+        for name in ("sanitization_service", "similarity_service", "preloaded"):
+            monkeypatch.setattr(api, name, getattr(api, name))
+
+        api.preload_services(workers=3)
+        assert api.preloaded and api.sanitization_service is not None
+        assert api.similarity_service.thread_layout == ThreadLayout.from_settings(3)
+        assert api.similarity_service.model_manager.state == ModelState.LOADED
+        assert api.similarity_service.cache_service is None
+        model.encode.assert_not_called()
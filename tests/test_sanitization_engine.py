@@ -0,0 +1,59 @@
+import random
+
+from better_profanity import Profanity
+
+from app.services.sanitization_engine import AhoCorasick, SanitizationEngine
+from app.services.sanitization_service import TextSanitizationService
+
+
+class TestAhoCorasick:
+    def test_finditer_overlapping_occurrences(self):
+        automaton = AhoCorasick(["he", "she", "his", "hers"])
+        assert sorted(automaton.finditer("ushers")) == [(1, 4, 1), (2, 4, 0), (2, 6, 3)]
+
+    def test_anchored_match_with_variants(self):
+        automaton = AhoCorasick(["shit", "ass"], variants={"i": ("i", "1", "*"), "a": ("a", "@"), "s": ("s", "$")},
+                                anchored=True)
+        assert automaton.match("sh1t") and automaton.match("@$s") and automaton.match("shit")
+        assert not automaton.match("shi") and not automaton.match("shits") and not automaton.match("sh!t")
+
+
+class TestSanitizationEngine:
+    def setup_method(self):
+        self.service = TextSanitizationService()
+
+    def test_same_output_as_sequential_sanitization(self):
+        texts = [
+            "", "!", "a", " x", "This is a damn test.", "What the SH1T, you @ss!", "bull shit and bull-shit",
+            "son of a bitch", "s.o.b. is rude", "He said f u c k", "I want to hack into systems now",
+            "Contact me at test@example.com.", "<script>alert('hack');</script> javascript:void(0)",
+            "My SSN is 1 23 45 67 890 123 45.", "  leading and trailing damn  ", "İstanbul ΣΑΣ shit",
+            "how to make bombs and illegal activities, damn it", "x@b.javascript: is odd",
+        ]
+        rng = random.Random(0)
+        words = [str(word) for word in Profanity().CENSOR_WORDSET]
+        separators = [" ", "-", ".", ", ", "_", "\n", "'", "@", "*", "  "]
+        for _ in range(500):
+            texts.append("".join(rng.choice(words + ["the", "a", "I", "cook", "pasta"]) + rng.choice(separators)
+                                 for _ in range(rng.randint(1, 8))))
+
+        for text in texts:
+            sanitized = self.service._sanitize(text)
+            assert sanitized == self.service._sanitize_sequential(text), text
+            assert self.service.engine.contains_violations(text) == (sanitized != text), text
+
+    def test_custom_word_list(self):
+        # One non-letter character per word: better_profanity then looks one word ahead, every other word
+        profanity = Profanity(["bad", "bad-word", "so.bad"])
+        engine = SanitizationEngine.from_profanity(profanity)
+        for text in ["so bad word", "a bad word here", "bad word bad word bad word", "so.bad b@d", "bad"]:
+            assert engine.censor(text) == profanity.censor(text), text
+
+    def test_overlapping_phrases_replaced_in_order(self):
+        phrases = ["into sys", "hack into systems", "sys"]
+        engine = SanitizationEngine([], phrases)
+        for text in ["hack into systems", "systems hack into systems sys", "into sysinto sys"]:
+            expected = text
+            for phrase in phrases:
+                expected = expected.replace(phrase, "[*FORBIDDEN*]")
+            assert engine.replace_phrases(text) == expected
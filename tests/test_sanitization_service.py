@@ -1,3 +1,5 @@
+import random
+
 from app.services.sanitization_service import TextSanitizationService
 
 
@@ -34,3 +36,60 @@ class TestTextSanitizationService:
         text = "My SSN is 1 23 45 67 890 123 45."
         sanitized = self.service.sanitize_text(text)
         assert "[*SENSITIVE*]" in sanitized
+
+    def test_contains_violations(self):
+        for text in ["This is a damn test.", "I want to hack into systems.", "Contact me at test@example.com.",
+                     "<script>alert('hack');</script>", "How to cook pasta?", "bull shit", "Nothing to see here"]:
+            assert self.service.contains_violations(text) == (self.service.sanitize_text(text) != text)
+
+    def test_memo_and_sanitize_many(self):
+        texts = ["How to cook pasta?", "This is a damn test.", "How to cook pasta?", "  padded text  "]
+        assert self.service.sanitize_many(texts) == [self.service._sanitize_sequential(text).strip() for text in texts]
+        assert self.service.sanitize_text("This is a damn test.") == "This is a **** test."
+
+        stats = self.service.stats()
+        # Each distinct text is sanitized once, then found in the memo
+        assert stats["memo"]["entries"] == 3
+        assert stats["memo"]["tags"]["default"]["hits"] == 1
+        assert stats["stages_ms"]["detection"]["count"] == 3
+        assert stats["stages_ms"]["profanity"]["count"] == 1
+
+        service = TextSanitizationService(memo_max_entries=0)
+        assert service.sanitize_many(texts) == self.service.sanitize_many(texts)
+        assert service.stats()["memo"] is None
+
+    def test_streaming_matches_whole_text(self):
+        text = ("Here is a damn long answer. " * 6 + "Never hack into systems or run <script>alert('x')</script>, "
+                "and write to test@example.com about my SSN 1 23 45 67 890 123 45. " + "Thanks for asking. " * 8)
+        for chunk_size in (1, 3, 7, 50):
+            sanitizer = self.service.streaming(window=64)
+            output = "".join(sanitizer.feed(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size))
+            assert output
+            assert output + sanitizer.flush() == self.service.sanitize_text(text)
+
+    def test_streaming_matches_whole_text_for_random_chunks(self):
+        # Runs of words censored together, e.g. "fuck face", must not be split between two releases
+        words = "the fuck face ass hole bull shit damn a of is hello world hack into systems test@example.com".split()
+        rng = random.Random(0)
+        for _ in range(200):
+            text = " ".join(rng.choice(words) for _ in range(rng.randint(50, 300)))
+            sanitizer = self.service.streaming()
+            output, position = "", 0
+            while position < len(text):
+                size = rng.randint(1, 40)
+                output += sanitizer.feed(text[position:position + size])
+                position += size
+            assert output + sanitizer.flush() == self.service.sanitize_text(text)
+
+    def test_streaming_caps_the_buffer_without_whitespace(self):
+        sanitizer = self.service.streaming(window=16)
+        released = "".join(sanitizer.feed("x" * 10) for _ in range(100))
+        assert released and len(sanitizer._buffer) <= sanitizer.max_buffer
+        assert released + sanitizer.flush() == "x" * 1000
+
+    def test_streaming_holds_back_split_patterns(self):
+        sanitizer = self.service.streaming(window=32)
+        released = sanitizer.feed("word " * 20 + "hack into ")
+        released += sanitizer.feed("systems " + "word " * 20)
+        assert "hack" not in released
+        assert "[*FORBIDDEN*]" in released + sanitizer.flush()
@@ -0,0 +1,124 @@
+import asyncio
+from unittest.mock import patch, MagicMock
+
+import numpy as np
+import pytest
+
+from app.models import SimilarityMetric
+from app.services.search_service import CorpusSearchService
+from app.services.similarity_service import TextSimilarityService
+from app.services.tfidf_model import TfidfModel
+from app.services.vector_index import IVFIndex, blocked_top_k, top_k
+from tests.test_similarity_service import fake_encode
+
+DOCUMENTS = [
+    ("pasta", "How to cook pasta?"),
+    ("python", "Python programming tutorial"),
+    ("weather", "The weather is nice today"),
+    ("spaghetti", "What is the recipe for spaghetti pasta?"),
+]
+
+
+class TestCorpusSearchService:
+    def setup_method(self):
+        self.similarity_service = TextSimilarityService()
+        self.service = CorpusSearchService(self.similarity_service, block_size=2)
+        asyncio.run(self.service.add_documents(DOCUMENTS))
+
+    @pytest.mark.asyncio
+    async def test_cosine_search_ranks_by_similarity(self):
+        matches = await self.service.search("how to cook pasta", SimilarityMetric.COSINE, k=2)
+        assert [match.id for match in matches] == ["pasta", "spaghetti"]
+        assert matches[0].score >= matches[1].score > 0
+        # Features are built and documents scored off the event loop
+        assert self.similarity_service.lexical_executor.stats()["submitted"] == 2
+
+    @pytest.mark.asyncio
+    async def test_jaccard_search_matches_pair_scores(self):
+        query = "python programming"
+        matches = await self.service.search(query, SimilarityMetric.JACCARD, k=len(DOCUMENTS))
+        for match in matches:
+            assert abs(match.score - await self.similarity_service.jaccard_similarity(query, match.text)) <= 1e-9
+        assert matches[0].id == "python"
+
+    @pytest.mark.asyncio
+    async def test_minhash_search_finds_near_duplicates(self):
+        matches = await self.service.search("how to cook pasta?", SimilarityMetric.MINHASH, k=2)
+        assert matches[0].id == "pasta"
+        assert matches[0].score == 1.0
+
+    @pytest.mark.asyncio
+    @patch('app.services.similarity_service.SentenceTransformer')
+    async def test_semantic_search_exact_and_approximate(self, mock_transformer):
+        mock_transformer.return_value.encode = MagicMock(side_effect=fake_encode)
+        service = CorpusSearchService(TextSimilarityService(), ivf_n_lists=1)
+        await service.add_documents(DOCUMENTS)
+
+        exact = await service.search("Python programming tutorial", SimilarityMetric.SEMANTIC, k=3)
+        approximate = await service.search(
+            "Python programming tutorial", SimilarityMetric.SEMANTIC, k=3, approximate=True)
+        assert exact[0].id == "python"
+        assert abs(exact[0].score - 1.0) <= 1e-6
+        assert [match.id for match in approximate] == [match.id for match in exact]
+
+    @pytest.mark.asyncio
+    async def test_approximate_search_requires_semantic_metric(self):
+        with pytest.raises(ValueError):
+            await self.service.search("pasta", SimilarityMetric.COSINE, approximate=True)
+
+    @pytest.mark.asyncio
+    async def test_removed_documents_are_not_returned(self):
+        assert await self.service.remove_document("pasta")
+        assert not await self.service.remove_document("pasta")
+        matches = await self.service.search("how to cook pasta", SimilarityMetric.COSINE, k=4)
+        assert "pasta" not in [match.id for match in matches]
+        assert len(self.service) == 3
+
+    @pytest.mark.asyncio
+    async def test_corpus_changes_update_the_tfidf_model_by_their_net_change(self):
+        tfidf_model = TfidfModel(n_features=2 ** 20).partial_fit(["How to bake bread?"])
+        service = CorpusSearchService(TextSimilarityService(tfidf_model=tfidf_model))
+        idf = tfidf_model.idf.copy()
+
+        await service.add_documents(DOCUMENTS)
+        fitted = tfidf_model.idf.copy()
+        assert tfidf_model.document_count == 1 + len(DOCUMENTS)
+        await service.add_documents(DOCUMENTS[:2])
+        np.testing.assert_array_equal(tfidf_model.idf, fitted)
+
+        await service.add_documents([("pasta", "How to cook rice?")])
+        await service.add_documents([("pasta", "How to cook pasta?")])
+        np.testing.assert_allclose(tfidf_model.idf, fitted)
+
+        for document_id, _ in DOCUMENTS:
+            assert await service.remove_document(document_id)
+        assert tfidf_model.document_count == 1
+        np.testing.assert_allclose(tfidf_model.idf, idf)
+
+
+class TestVectorIndex:
+    def test_top_k_is_sorted(self):
+        scores = np.array([0.1, 0.9, 0.5, 0.7])
+        assert top_k(scores, 3).tolist() == [1, 3, 2]
+        assert top_k(scores, 10).tolist() == [1, 3, 2, 0]
+
+    def test_blocked_top_k_matches_full_sort(self):
+        rng = np.random.default_rng(0)
+        vectors, query = rng.normal(size=(1000, 16)), rng.normal(size=16)
+        rows, scores = blocked_top_k(vectors, query, k=10, block_size=64)
+        assert rows.tolist() == np.argsort(-(vectors @ query))[:10].tolist()
+        np.testing.assert_allclose(scores, (vectors @ query)[rows])
+
+    def test_ivf_recall(self):
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(20, 32))
+        vectors = centers[rng.integers(0, 20, size=2000)] + 0.1 * rng.normal(size=(2000, 32))
+        vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+        index = IVFIndex(n_lists=20, n_probe=4).fit(vectors)
+
+        recalls = []
+        for query in vectors[:50]:
+            exact, _ = blocked_top_k(vectors, query, k=10)
+            approximate, _ = index.search(query, k=10)
+            recalls.append(len(set(exact) & set(approximate)) / 10)
+        assert np.mean(recalls) >= 0.9
@@ -0,0 +1,79 @@
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from app.services import semantic_cache
+from app.services.semantic_cache import SemanticResponseCache
+from app.services.similarity_service import TextSimilarityService
+from tests.test_similarity_service import fake_encode
+
+
+@pytest.fixture
+def similarity_service():
+    with patch('app.services.similarity_service.SentenceTransformer') as mock_transformer:
+        mock_transformer.return_value.encode = MagicMock(side_effect=fake_encode)
+        yield TextSimilarityService()
+
+
+class TestSemanticResponseCache:
+    @pytest.mark.asyncio
+    async def test_close_prompt_reuses_answer(self, similarity_service):
+        cache = SemanticResponseCache(similarity_service, threshold=0.99)
+        assert await cache.get("how to cook pasta") is None
+
+        await cache.set("how to cook pasta", "Boil water.")
+        hit = await cache.get("pasta: how to cook")
+        assert hit.prompt == "how to cook pasta"
+        assert hit.response == "Boil water."
+        assert hit.score >= 0.99
+        assert await cache.get("python programming tutorial") is None
+
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 1)
+
+    @pytest.mark.asyncio
+    async def test_lookup_scores_the_used_slots_on_the_lexical_executor(self, similarity_service):
+        cache = SemanticResponseCache(similarity_service, threshold=0.99, max_entries=1000)
+        await cache.set("how to cook pasta", "Boil water.")
+        await cache.set("python tutorial", "Read the docs.")
+
+        scored = []
+        closest_slot = semantic_cache._closest_slot
+
+        def record_closest_slot(arena, slots, query):
+            scored.append(len(slots))
+            return closest_slot(arena, slots, query)
+
+        with patch.object(semantic_cache, "_closest_slot", record_closest_slot):
+            assert (await cache.get("pasta: how to cook")).response == "Boil water."
+        assert scored == [2]
+        assert similarity_service.lexical_executor.stats()["submitted"] == 1
+
+    @pytest.mark.asyncio
+    async def test_least_recently_used_answer_is_evicted(self, similarity_service):
+        cache = SemanticResponseCache(similarity_service, threshold=0.99, max_entries=2)
+        await cache.set("cook pasta", "pasta")
+        await cache.set("python tutorial", "python")
+        assert (await cache.get("cook pasta")).response == "pasta"
+
+        await cache.set("weather today", "sunny")
+        assert len(cache) == 2
+        assert cache.evictions == 1
+        assert await cache.get("python tutorial") is None
+        assert (await cache.get("weather today")).response == "sunny"
+
+    @pytest.mark.asyncio
+    async def test_expired_answer_is_a_miss(self, similarity_service):
+        cache = SemanticResponseCache(similarity_service, ttl_seconds=0.0)
+        await cache.set("cook pasta", "pasta")
+        assert await cache.get("cook pasta") is None
+        assert len(cache) == 0
+
+    @pytest.mark.asyncio
+    @patch('app.services.similarity_service.SentenceTransformer')
+    async def test_without_semantic_model_nothing_is_cached(self, mock_transformer):
+        mock_transformer.side_effect = Exception("Model not found")
+        cache = SemanticResponseCache(TextSimilarityService())
+        await cache.set("cook pasta", "pasta")
+        assert await cache.get("cook pasta") is None
+        assert len(cache) == 0
@@ -1,10 +1,25 @@
 import sys
-from unittest.mock import patch
+import threading
+from unittest.mock import patch, MagicMock
 
+import numpy as np
 import pytest
 
 from app.models import SimilarityMetric
+from app.services.cache_service import CacheService
+from app.services.embedding_store import EmbeddingStore
 from app.services.similarity_service import TextSimilarityService
+from app.services.tfidf_model import TfidfModel
+
+
+# Metrics scoring a pair on their own, the cascade metric combines them
+PAIR_METRICS = [metric for metric in SimilarityMetric if metric != SimilarityMetric.CASCADE]
+
+
+def fake_encode(texts, **kwargs):
+    """Deterministic bag-of-letters embeddings standing in for the sentence transformer."""
+    return np.array([[text.count(letter) for letter in "abcdefghijklmnopqrstuvwxyz"] for text in texts],
+                    dtype=np.float32)
 
 
 class TestTextSimilarityService:
@@ -56,7 +71,7 @@ class TestTextSimilarityService:
     async def test_calculate_similarity_with_all_metrics(self):
         text1 = "This is a test"
         text2 = "This is another test"
-        for metric in SimilarityMetric:
+        for metric in PAIR_METRICS:
             similarity = await self.service.calculate_similarity(text1, text2, metric)
             assert 0.0 <= similarity <= 1.0
 
@@ -109,3 +124,214 @@ class TestTextSimilarityService:
 
             similarity = await self.service.cosine_similarity_tfidf("hello", "world")
             assert similarity == 0.0  # Should return default value
+
+    # Batch tests
+
+    @pytest.mark.asyncio
+    async def test_batch_matches_single_pair_path(self):
+        pairs = [
+            ("This is a cats.", "This is a dog."),
+            ("The weather is nice today", "it's a beautiful sunny day"),
+            ("cat dog bird", "cat fish horse"),
+            ("This is a test sentence.", "This is a test sentence."),
+            ("a", "b"),
+        ]
+        for metric in PAIR_METRICS:
+            scores = await self.service.calculate_similarity_batch(pairs, metric)
+            assert len(scores) == len(pairs)
+            for (text1, text2), score in zip(pairs, scores):
+                expected = await self.service.calculate_similarity(text1, text2, metric)
+                assert abs(score - expected) <= 1e-6
+
+    @pytest.mark.asyncio
+    async def test_batch_uses_cache(self):
+        cache = CacheService()
+        service = TextSimilarityService(cache)
+        cache.set_similarity(SimilarityMetric.JACCARD.value, "cat dog", "bird fish", 0.42)
+
+        scores = await service.calculate_similarity_batch(
+            [("cat dog", "bird fish"), ("cat dog", "cat fish")], SimilarityMetric.JACCARD)
+        assert scores[0] == 0.42
+        assert abs(scores[1] - 1 / 3) <= sys.float_info.epsilon
+        assert cache.get_similarity(SimilarityMetric.JACCARD.value, "cat fish", "cat dog") == scores[1]
+
+    @pytest.mark.asyncio
+    @patch('app.services.similarity_service.SentenceTransformer')
+    async def test_batch_semantic_fallback_is_not_cached(self, mock_transformer):
+        mock_transformer.side_effect = Exception("Model loading failed")
+        cache = CacheService()
+        service = TextSimilarityService(cache)
+        pairs = [("how to cook pasta", "how to cook rice"), ("cat dog", "cat fish")]
+
+        scores = await service.calculate_similarity_batch(pairs, SimilarityMetric.SEMANTIC)
+        assert scores == pytest.approx(await service.cosine_similarity_tfidf_batch(pairs))
+        assert await cache.get_similarities_async(SimilarityMetric.SEMANTIC.value, pairs) == [None, None]
+
+    @pytest.mark.asyncio
+    @patch('app.services.similarity_service.SentenceTransformer')
+    async def test_batch_semantic_encodes_once(self, mock_transformer):
+        mock_transformer.return_value.encode = MagicMock(side_effect=fake_encode)
+        service = TextSimilarityService()
+        pairs = [("a query", "candidate one"), ("a query", "candidate two")]
+
+        scores = await service.semantic_similarity_batch(pairs)
+        mock_transformer.return_value.encode.assert_called_once_with(["a query", "candidate one", "candidate two"])
+        for (text1, text2), score in zip(pairs, scores):
+            assert abs(score - await service.semantic_similarity(text1, text2)) <= 1e-6
+
+    @pytest.mark.asyncio
+    @patch('app.services.similarity_service.SentenceTransformer')
+    async def test_cascade_scores_undecided_pairs_with_the_next_stage(self, mock_transformer):
+        mock_transformer.return_value.encode = MagicMock(side_effect=fake_encode)
+        service = TextSimilarityService()
+        pairs = [
+            ("How to cook pasta?", "How to cook pasta?"),  # Jaccard 1.0: similar
+            ("cat dog bird", "fish horse cow"),  # Jaccard 0.0: not similar
+            ("how to cook pasta", "how to cook rice")  # Jaccard 0.6, cosine 0.6: within the bands around 0.7
+        ]
+        stages = [SimilarityMetric.JACCARD, SimilarityMetric.COSINE, SimilarityMetric.SEMANTIC]
+
+        scores, decided_by = await service.cascade_similarity_batch(pairs, 0.7, stages, [(0.6, 0.3), (0.5, 0.2)])
+        assert decided_by == [SimilarityMetric.JACCARD, SimilarityMetric.JACCARD, SimilarityMetric.SEMANTIC]
+        assert scores[:2] == [1.0, 0.0]
+        # Only the undecided pair reaches the semantic model
+        mock_transformer.return_value.encode.assert_called_once_with(["how to cook pasta", "how to cook rice"])
+        assert scores[2] == pytest.approx(await service.semantic_similarity(*pairs[2]))
+        assert service.stats()["cascade_decisions"] == {"jaccard": 2, "semantic": 1}
+
+        # Narrower bands decide earlier
+        _, decided_by = await service.cascade_similarity_batch(pairs[2:], 0.7, stages, [(0.05, 0.05), (0.05, 0.05)])
+        assert decided_by == [SimilarityMetric.JACCARD]
+
+    @pytest.mark.asyncio
+    @patch('app.services.similarity_service.SentenceTransformer')
+    async def test_cascade_skips_the_semantic_stage_without_the_model(self, mock_transformer):
+        mock_transformer.side_effect = Exception("Model loading failed")
+        service = TextSimilarityService()
+
+        score, decided_by = await service.cascade_similarity("how to cook pasta", "how to cook rice", 0.7)
+        assert decided_by == SimilarityMetric.COSINE
+        assert score == pytest.approx(await service.cosine_similarity_tfidf("how to cook pasta", "how to cook rice"))
+
+        with pytest.raises(ValueError):
+            await service.cascade_similarity_batch([("a", "b")], 0.7, [SimilarityMetric.JACCARD], [(0.1, 0.1)])
+
+    @pytest.mark.asyncio
+    @patch('app.services.similarity_service.SentenceTransformer')
+    async def test_similarities_from_shared_features_match_each_metric(self, mock_transformer):
+        mock_transformer.return_value.encode = MagicMock(side_effect=fake_encode)
+        pairs = [
+            ("How do I cook pasta?", "What is the best way to cook pasta, pasta?"),
+            ("The cat sat on the mat", "the CAT sat on a mat"),
+            ("a b c", "x y z"),
+            ("!!!", "???")
+        ]
+        corpus = ["how to cook pasta", "how to cook rice", "the cat sat on the mat"]
+
+        for tfidf_model in (None, TfidfModel(n_features=2 ** 20).partial_fit(corpus)):
+            service = TextSimilarityService(tfidf_model=tfidf_model)
+            reference = TextSimilarityService(tfidf_model=tfidf_model)
+            for text1, text2 in pairs:
+                scores = await service.calculate_similarities(text1, text2, PAIR_METRICS)
+                assert list(scores) == PAIR_METRICS
+                for metric in PAIR_METRICS:
+                    expected = await reference.calculate_similarity(text1, text2, metric)
+                    assert scores[metric] == pytest.approx(expected, abs=1e-6)
+
+        # Corpus TF-IDF vectors of the bundles follow the updates of the model
+        features = service._get_text_features("cook pasta")
+        before = features.tfidf_vector(tfidf_model).toarray()
+        tfidf_model.partial_fit(["pasta pasta pasta"] * 10)
+        assert not np.allclose(features.tfidf_vector(tfidf_model).toarray(), before)
+
+        with pytest.raises(ValueError):
+            await service.calculate_similarities("a", "b", [SimilarityMetric.CASCADE])
+
+    @pytest.mark.asyncio
+    @patch('app.services.similarity_service.SentenceTransformer')
+    async def test_similarities_compute_only_the_features_they_need(self, mock_transformer):
+        mock_transformer.return_value.encode = MagicMock(side_effect=fake_encode)
+        service = TextSimilarityService(cache_service=CacheService())
+        metrics = [SimilarityMetric.JACCARD, SimilarityMetric.COSINE]
+
+        await service.calculate_similarities("how to cook pasta", "how to cook rice", metrics)
+        features = service._get_text_features("how to cook pasta")
+        assert features._token_set is not None and features._term_counts is not None
+        assert features._signature is None and features.embedding is None
+        mock_transformer.return_value.encode.assert_not_called()
+
+        # Each text is encoded once, then its embedding is reused by the other pairs
+        await service.calculate_similarities("how to cook pasta", "how to cook rice", [SimilarityMetric.SEMANTIC])
+        await service.calculate_similarities("how to cook pasta", "pasta recipe", [SimilarityMetric.SEMANTIC])
+        encoded = [call.args[0] for call in mock_transformer.return_value.encode.call_args_list]
+        assert encoded == [["how to cook pasta", "how to cook rice"], ["pasta recipe"]]
+        assert features.embedding is not None
+
+    @pytest.mark.asyncio
+    @patch('app.services.similarity_service.SentenceTransformer')
+    async def test_similarities_fall_back_to_cosine_without_the_model(self, mock_transformer):
+        mock_transformer.side_effect = Exception("Model loading failed")
+        service = TextSimilarityService()
+
+        scores = await service.calculate_similarities(
+            "how to cook pasta", "how to cook rice", [SimilarityMetric.SEMANTIC, SimilarityMetric.JACCARD])
+        assert list(scores) == [SimilarityMetric.SEMANTIC, SimilarityMetric.JACCARD]
+        assert scores[SimilarityMetric.SEMANTIC] == pytest.approx(
+            await service.cosine_similarity_tfidf("how to cook pasta", "how to cook rice"))
+
+    @pytest.mark.asyncio
+    @patch('app.services.similarity_service.SentenceTransformer')
+    async def test_semantic_embeddings_are_memoized_per_text(self, mock_transformer):
+        mock_transformer.return_value.encode = MagicMock(side_effect=fake_encode)
+        service = TextSimilarityService()
+
+        await service.semantic_similarity("popular prompt", "first prompt")
+        await service.semantic_similarity("popular prompt", "second prompt")
+        await service.semantic_similarity("first prompt", "second prompt")
+
+        encoded = [call.args[0] for call in mock_transformer.return_value.encode.call_args_list]
+        assert encoded == [["popular prompt", "first prompt"], ["second prompt"]]
+        assert service.stats()["embedding_cache"]["hits"] == 3
+
+    @pytest.mark.asyncio
+    @patch('app.services.similarity_service.SentenceTransformer')
+    async def test_semantic_embeddings_are_shared_through_the_store(self, mock_transformer, tmp_path):
+        mock_transformer.return_value.encode = MagicMock(side_effect=fake_encode)
+        worker1, worker2 = TextSimilarityService(), TextSimilarityService()
+        worker1.embedding_store_path = worker2.embedding_store_path = str(tmp_path)
+
+        threads = []
+        get_many = EmbeddingStore.get_many
+
+        def record_get_many(store, digests):
+            threads.append(threading.current_thread())
+            return get_many(store, digests)
+
+        similarity1 = await worker1.semantic_similarity("stored prompt", "other prompt")
+        with patch.object(EmbeddingStore, "get_many", record_get_many):
+            similarity2 = await worker2.semantic_similarity("other prompt", "stored prompt")
+
+        assert mock_transformer.return_value.encode.call_count == 1
+        # The store is read off the event loop
+        assert threads and threading.main_thread() not in threads
+        assert abs(similarity1 - similarity2) <= 1e-6
+        assert worker2.stats()["embedding_store"]["entries"] == 2
+
+    @pytest.mark.asyncio
+    @patch('app.services.similarity_service.SentenceTransformer')
+    async def test_similarity_matrix_matches_batch(self, mock_transformer):
+        mock_transformer.return_value.encode = MagicMock(side_effect=fake_encode)
+        service = TextSimilarityService()
+        texts = ["How to cook pasta?", "What is the recipe for pasta?", "Python tutorial", "cook pasta", "pasta"]
+        pairs = [(text1, text2) for text1 in texts for text2 in texts]
+
+        for metric in PAIR_METRICS:
+            expected = np.array(await service.calculate_similarity_batch(pairs, metric)).reshape(len(texts), -1)
+            full = np.vstack([block async for _, block in service.similarity_matrix(
+                texts, metric, block_rows=2, tile_size=3)])
+            np.testing.assert_allclose(full, expected, atol=1e-6)
+
+            async for start, block in service.similarity_matrix(
+                    texts, metric, upper_triangular=True, block_rows=2, tile_size=3):
+                for r, scores in enumerate(block):
+                    np.testing.assert_allclose(scores[r:], expected[start + r, start + r + 1:], atol=1e-6)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.services.similarity_service import TextSimilarityService
+from app.services.tfidf_model import TfidfModel
+
+CORPUS = [
+    "How to cook pasta?",
+    "What is the recipe for spaghetti?",
+    "Python programming tutorial",
+    "The weather is nice today",
+]
+
+
+class TestTfidfModel:
+    def setup_method(self):
+        self.model = TfidfModel(n_features=2 ** 20).partial_fit(CORPUS)
+
+    def test_matches_fitted_vectorizer_on_corpus_vocabulary(self):
+        vectorizer = TfidfVectorizer().fit(CORPUS)
+        expected = vectorizer.transform(["pasta recipe for python"]) @ vectorizer.transform(["cook pasta"]).T
+        actual = self.model.similarity([("pasta recipe for python", "cook pasta")])
+        np.testing.assert_allclose(actual, expected.toarray().ravel(), rtol=1e-6)
+
+    def test_incremental_fit_matches_full_fit(self):
+        incremental = TfidfModel(n_features=2 ** 20).partial_fit(CORPUS[:2]).partial_fit(CORPUS[2:])
+        np.testing.assert_allclose(incremental.idf, self.model.idf)
+        assert incremental.document_count == len(CORPUS)
+
+    def test_unfit_reverts_fit(self):
+        model = TfidfModel(n_features=2 ** 20).partial_fit(CORPUS[:2])
+        self.model.partial_unfit(CORPUS[2:])
+        np.testing.assert_allclose(self.model.idf, model.idf)
+        assert self.model.document_count == 2
+
+    def test_vectors_are_cached_until_idf_update(self):
+        self.model.similarity([("cook pasta", "pasta recipe")])
+        self.model.similarity([("pasta recipe", "cook pasta")])
+        assert self.model.stats()["vector_cache"]["tags"]["tfidf"]["hits"] == 2
+
+        self.model.partial_fit(["pasta pasta pasta"])
+        assert self.model.stats()["vector_cache"]["entries"] == 0
+
+    def test_from_corpus_file(self, tmp_path):
+        path = tmp_path / "corpus.txt"
+        path.write_text("\n".join(CORPUS) + "\n\n", encoding="utf-8")
+        model = TfidfModel.from_corpus_file(str(path), chunk_size=3, n_features=2 ** 20)
+        assert model.document_count == len(CORPUS)
+        np.testing.assert_allclose(model.idf, self.model.idf)
+
+    @pytest.mark.asyncio
+    async def test_similarity_service_uses_model(self):
+        service = TextSimilarityService(tfidf_model=self.model)
+        text = "This is a test sentence."
+        assert abs(await service.cosine_similarity_tfidf(text, text) - 1.0) <= 1e-9
+        scores = await service.cosine_similarity_tfidf_batch([("cook pasta", "pasta recipe")])
+        assert abs(scores[0] - await service.cosine_similarity_tfidf("cook pasta", "pasta recipe")) <= 1e-12